@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Benchmark por endpoint da API contra um banco local.
+
+Sobe o `main:app` em processo (lifespan completo, httpx + ASGITransport) sobre
+SQLite ou um PostgreSQL local, popula uma massa de dados escalável (benchmarks/seed.py)
+e mede vazão e latência p50/p95/p99 de cada rota registrada a partir de routers/.
+Nos streams (/bus/stream e o WebSocket /bus/ws) a latência é a do primeiro
+evento (o estado atual), e a conexão é encerrada em seguida.
+
+Uso (dentro de fretotvs-api/, com requirements-dev.txt instalado: aiosqlite e httpx):
+    python benchmarks/bench_api.py                                  # SQLite temporário
+    python benchmarks/bench_api.py --database-url postgresql+asyncpg://postgres@localhost/bench --reset
+    python benchmarks/bench_api.py --save-baseline                  # grava benchmarks/results/baseline.json
+    python benchmarks/bench_api.py --compare                        # compara com o baseline salvo
+    python benchmarks/bench_api.py --only "GET /lines/" --requests 1000
+    python benchmarks/bench_api.py --baseline ~/fretotvs-baseline.json --compare
+
+Os números dependem da máquina, então o baseline não vai para o git:
+benchmarks/results/ está no .gitignore. Guarde-o fora do repositório com
+--baseline (ex: no home ou como artefato do CI) e compare sempre na mesma
+máquina em que foi gravado.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+sys.path.insert(0, str(API_DIR))
+
+# Rotas que passam pelo bcrypt rodam menos vezes
+SLOW_ROUTES = {"POST /login", "POST /user/", "PATCH /user/"}
+# Prazo do primeiro evento nos streams; estourado, a requisição conta como 504
+STREAM_TIMEOUT = 5.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark por endpoint da Fretotvs API")
+    parser.add_argument("--database-url", help="DSN assíncrono; padrão: SQLite temporário")
+    parser.add_argument("--reset", action="store_true", help="Apaga e recria as tabelas (obrigatório fora do SQLite)")
+    parser.add_argument("--cities", type=int, default=4)
+    parser.add_argument("--lines-per-city", type=int, default=5)
+    parser.add_argument("--schedules-per-line", type=int, default=40)
+    parser.add_argument("--buses", type=int, default=50)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="Requisições medidas por rota")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--only", action="append", help="Roda só estas rotas (ex: 'GET /lines/')")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "baseline.json",
+                        help="Arquivo do baseline (fora do git); padrão: benchmarks/results/baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava o resultado em --baseline")
+    parser.add_argument("--compare", nargs="?", const=True, type=Path,
+                        help="Compara com um resultado salvo (padrão: --baseline)")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Piora relativa aceita no p95 e na vazão")
+    return parser.parse_args()
+
+
+args = parse_args()
+
+if args.database_url is None:
+    db_path = Path(tempfile.gettempdir()) / "fretotvs-bench.db"
+    db_path.unlink(missing_ok=True)
+    args.database_url = f"sqlite+aiosqlite:///{db_path}"
+elif not args.reset:
+    sys.exit("Use --reset para confirmar que as tabelas deste banco podem ser apagadas.")
+
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("SECRET_KEY", "ZmDfcTF7_60GrrY167zsiPd67pEvs0aGOv2oasOM1Pg=")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+# Os limites de /login e /interest distorceriam a medição
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# O usuário do benchmark precisa ser admin para medir /audit
+os.environ.setdefault("ADMIN_USERS", "bench-user")
+
+import httpx
+from sqlmodel import SQLModel
+from fastapi import APIRouter
+from starlette.routing import WebSocketRoute
+from config import ACCESS_TOKEN_EXPIRE_MINUTES
+from core import database
+from repository import jwt_repo
+import main
+import routers
+from benchmarks.seed import SeedConfig, SeedData, seed_database, BENCH_USER_ID, BENCH_USER_NAME, BENCH_USER_PASSWORD
+
+
+def build_scenarios(data: SeedData, token: str) -> dict:
+    """
+    Um construtor de requisição por rota: recebe o índice da iteração e devolve
+    os argumentos do httpx. Rotas novas sem cenário aparecem como "sem cenário".
+    Nos streams, {"url": ..., "stream": "sse" | "ws"} (ver first_event).
+    """
+    auth = {"Authorization": f"Bearer {token}"}
+    line = itertools.cycle(data.line_ids).__next__
+    city = itertools.cycle(data.city_ids).__next__
+    schedule = itertools.cycle(data.schedule_ids).__next__
+    bus = itertools.cycle(data.bus_prefixes).__next__
+    user = itertools.cycle(data.user_ids).__next__
+    disposable = {
+        "city": iter(data.disposable_city_ids),
+        "line": iter(data.disposable_line_ids),
+        "schedule": iter(data.disposable_schedule_ids),
+        "bus": iter(data.disposable_bus_prefixes),
+        "user": iter(data.disposable_user_ids),
+    }
+    run_id = int(time.time())
+
+    return {
+        # Linhas
+        "GET /lines/": lambda i: {"url": "/lines/"},
+        "POST /lines/": lambda i: {"url": "/lines/", "json": {"name": f"bench-{run_id}-{i}", "active_bus": 1, "active": True, "city_id": data.city_ids[0]}},
+        "GET /lines/{line_id}": lambda i: {"url": f"/lines/{line()}"},
+        "PUT /lines/{line_id}": lambda i: (lambda line_id: {"url": f"/lines/{line_id}", "json": {"name": f"Descartável put {run_id}-{i}", "active_bus": 2, "active": True}})(line()),
+        "DELETE /lines/{line_id}": lambda i: {"url": f"/lines/{next(disposable['line'])}"},
+        "GET /lines/{line_id}/schedules": lambda i: {"url": f"/lines/{line()}/schedules"},
+        "GET /lines/{line_id}/status": lambda i: {"url": f"/lines/{line()}/status"},
+        "PATCH /lines/{line_id}/status": lambda i: {"url": f"/lines/{line()}/status", "json": {"active": True}},
+        "GET /lines/{line_id}/buses": lambda i: {"url": f"/lines/{line()}/buses"},
+        # Cidades
+        "GET /city/": lambda i: {"url": "/city/"},
+        "POST /city/": lambda i: {"url": "/city/", "json": {"state": "SP", "country": "Brasil"}},
+        "GET /city/{city_id}": lambda i: {"url": f"/city/{city()}"},
+        "PUT /city/{city_id}": lambda i: {"url": f"/city/{city()}", "json": {"state": "SP", "country": "Brasil"}},
+        "DELETE /city/{city_id}": lambda i: {"url": f"/city/{next(disposable['city'])}"},
+        # Horários
+        "GET /schedules/": lambda i: {"url": "/schedules/"},
+        "POST /schedules/create": lambda i: {"url": "/schedules/create", "json": {"line_id": data.line_ids[0], "arrival_time": "05:00", "departure_time": "05:15", "day_week": 1 + i % 5}},
+        "POST /schedules/{schedule_id}/interest": lambda i: {"url": f"/schedules/{schedule()}/interest"},
+        "GET /schedules/{schedule_id}": lambda i: {"url": f"/schedules/{schedule()}"},
+        "GET /schedules/next": lambda i: {"url": "/schedules/next", "params": {"line": line(), "limit": 5}},
+        "GET /schedules/next/batch": lambda i: {"url": "/schedules/next/batch", "params": {"ids": [schedule() for _ in range(50)]}},
+        "DELETE /schedules/{schedule_id}": lambda i: {"url": f"/schedules/{next(disposable['schedule'])}"},
+        # Ônibus
+        "GET /bus/": lambda i: {"url": "/bus/"},
+        "GET /bus/{bus_prefix}": lambda i: {"url": f"/bus/{bus()}"},
+        "POST /bus/{bus_prefix}": lambda i: {"url": f"/bus/{bus()}", "json": {"capacity": 45}},
+        "PATCH /bus/{bus_prefix}": lambda i: (lambda prefix: {"url": f"/bus/{prefix}", "json": {"prefix": prefix, "capacity": 45, "occupied": 0}})(bus()),
+        "DELETE /bus/{bus_prefix}": lambda i: {"url": f"/bus/{next(disposable['bus'])}"},
+        "GET /bus/{bus_prefix}/occupancy": lambda i: {"url": f"/bus/{bus()}/occupancy"},
+        "PATCH /bus/{bus_prefix}/occupancy": lambda i: {"url": f"/bus/{bus()}/occupancy", "json": {"occupied": 0}},
+        "PATCH /bus/{bus_prefix}/assign-line/{line_id}": lambda i: {"url": f"/bus/{bus()}/assign-line/{line()}"},
+        "PATCH /bus/{bus_prefix}/unassign-line": lambda i: {"url": f"/bus/{bus()}/unassign-line"},
+        "GET /bus/stream": lambda i: {"url": "/bus/stream", "stream": "sse"},
+        "WS /bus/ws": lambda i: {"url": f"/bus/ws?line_id={line()}", "stream": "ws"},
+        # Cadastro dos dispositivos; os DELETE desativam o que o PUT da mesma iteração criou
+        "GET /device/registry": lambda i: {"url": "/device/registry", "params": {"since": 0}},
+        "PUT /device/drivers": lambda i: {"url": "/device/drivers", "headers": auth, "json": [{"badge_id": f"bench-{run_id}-{i}", "name": f"Motorista {i}"}]},
+        "DELETE /device/drivers/{badge_id}": lambda i: {"url": f"/device/drivers/bench-{run_id}-{i}", "headers": auth},
+        "PUT /device/routes": lambda i: {"url": "/device/routes", "headers": auth, "json": [{"name": f"bench-{run_id}-{i}", "capacity": 45}]},
+        "DELETE /device/routes/{name}": lambda i: {"url": f"/device/routes/bench-{run_id}-{i}", "headers": auth},
+        # Usuários e login
+        "POST /user/": lambda i: {"url": "/user/", "json": {"totvs_id": f"new-{run_id}-{i}", "name": f"Novo {i}", "password": "secret"}},
+        "GET /user/{totvs_id}": lambda i: {"url": f"/user/{user()}", "headers": auth},
+        "GET /user/": lambda i: {"url": "/user/", "headers": auth},
+        "DELETE /user/{totvs_id}": lambda i: {"url": f"/user/{next(disposable['user'])}", "headers": auth},
+        "PATCH /user/": lambda i: {"url": "/user/", "headers": auth, "json": {"totvs_id": BENCH_USER_ID, "name": BENCH_USER_NAME, "password": BENCH_USER_PASSWORD}},
+        "POST /login": lambda i: {"url": "/login", "data": {"username": BENCH_USER_ID, "password": BENCH_USER_PASSWORD}},
+        # Auditoria e métricas
+        "GET /audit/": lambda i: {"url": "/audit/", "headers": auth},
+        "GET /audit/rollups": lambda i: {"url": "/audit/rollups", "headers": auth},
+        **{
+            f"GET /metrics/{name}": (lambda url: lambda i: {"url": url})(f"/metrics/{name}")
+            for name in ("db-pool", "auth-cache", "hashing", "rate-limit", "cache", "compression", "interest", "live")
+        },
+    }
+
+
+def router_routes() -> list[tuple[str, str]]:
+    """Todas as rotas (método, path) da API, lidas do schema OpenAPI do app, mais os WebSockets ("WS")."""
+    routes = []
+    for path, operations in main.app.openapi()["paths"].items():
+        for method in operations:
+            routes.append((method.upper(), path))
+    # WebSockets não entram no schema: vêm dos próprios routers
+    for module in vars(routers).values():
+        router = getattr(module, "router", None)
+        if isinstance(router, APIRouter):
+            routes.extend(("WS", route.path) for route in router.routes if isinstance(route, WebSocketRoute))
+    return routes
+
+
+async def first_event(kind: str, url: str) -> int:
+    """
+    Abre um stream direto no app ASGI (o ASGITransport do httpx espera o corpo
+    inteiro, que num stream nunca termina), espera a primeira mensagem e
+    desconecta. Devolve o status HTTP, 101 no WebSocket aceito ou o código de
+    fechamento se recusado.
+    """
+    path, _, query = url.partition("?")
+    received = asyncio.Event()
+    status_code = 504
+    connected = False
+
+    async def receive():
+        nonlocal connected
+        if not connected:
+            connected = True
+            return {"type": "websocket.connect"} if kind == "ws" else {"type": "http.request", "body": b"", "more_body": False}
+        await received.wait()
+        return {"type": "websocket.disconnect", "code": 1000} if kind == "ws" else {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+        elif message["type"] == "websocket.accept":
+            status_code = 101
+        elif message["type"] == "websocket.close" and status_code != 101:
+            status_code = message.get("code", 1000)
+            received.set()
+        elif message["type"] in ("http.response.body", "websocket.send"):
+            received.set()
+
+    scope = {
+        "type": "websocket" if kind == "ws" else "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "ws" if kind == "ws" else "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"accept", b"text/event-stream")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+        "subprotocols": [],
+    }
+    app = asyncio.create_task(main.app(scope, receive, send))
+    try:
+        await asyncio.wait_for(received.wait(), STREAM_TIMEOUT)
+    except asyncio.TimeoutError:
+        status_code = 504
+    received.set()
+    try:
+        await asyncio.wait_for(app, STREAM_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    except Exception:
+        status_code = 500
+    return status_code
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+async def measure(client: httpx.AsyncClient, method: str, builder, total: int, warmup: int, concurrency: int) -> dict:
+    counter = itertools.count()
+    statuses: dict[int, int] = {}
+    latencies: list[float] = []
+
+    async def one(record: bool):
+        request = builder(next(counter))
+        start = time.perf_counter()
+        if "stream" in request:
+            status_code = await first_event(request["stream"], request["url"])
+        else:
+            status_code = (await client.request(method, **request)).status_code
+        elapsed = time.perf_counter() - start
+        if record:
+            latencies.append(elapsed)
+            statuses[status_code] = statuses.get(status_code, 0) + 1
+
+    for _ in range(warmup):
+        await one(False)
+
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            await one(True)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    print(f"\nComparação com o baseline de {baseline['meta']['date']} (tolerância {tolerance:.0%})")
+    for key, result in current["routes"].items():
+        before = baseline["routes"].get(key)
+        if not before or "rps" not in result or "rps" not in before:
+            continue
+        p95_delta = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        rps_delta = (result["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+        flag = ""
+        if p95_delta > tolerance or rps_delta < -tolerance:
+            flag = "  <-- REGRESSÃO"
+            regressions.append(key)
+        print(f"{key:<48} p95 {before['p95_ms']:>8.2f} -> {result['p95_ms']:>8.2f} ms ({p95_delta:+.0%})  "
+              f"rps {before['rps']:>8.1f} -> {result['rps']:>8.1f} ({rps_delta:+.0%}){flag}")
+    return regressions
+
+
+async def run() -> int:
+    seed_config = SeedConfig(
+        cities=args.cities,
+        lines_per_city=args.lines_per_city,
+        schedules_per_line=args.schedules_per_line,
+        buses=args.buses,
+        users=args.users,
+        disposable=args.requests + args.warmup,
+    )
+
+    async with main.lifespan(main.app):
+        if args.reset:
+            async with database.engine.begin() as conn:
+                await conn.run_sync(SQLModel.metadata.drop_all)
+            await database.create_db_and_tables()
+        async for session in database.get_session():
+            data = await seed_database(session, seed_config)
+
+        token = jwt_repo.create_access_token({"sub": BENCH_USER_NAME}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+        scenarios = build_scenarios(data, token)
+
+        results = {}
+        # Erros da aplicação viram 500 no relatório em vez de derrubar o benchmark
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for method, path in router_routes():
+                key = f"{method} {path}"
+                if args.only and key not in args.only:
+                    continue
+                builder = scenarios.get(key)
+                if builder is None:
+                    results[key] = {"skipped": "sem cenário"}
+                    print(f"{key:<48} sem cenário")
+                    continue
+                total = max(10, args.requests // 20) if key in SLOW_ROUTES else args.requests
+                warmup = min(args.warmup, total)
+                results[key] = await measure(client, method, builder, total, warmup, args.concurrency)
+                r = results[key]
+                print(f"{key:<48} {r['rps']:>8.1f} req/s  p50 {r['p50_ms']:>7.2f}  p95 {r['p95_ms']:>7.2f}  "
+                      f"p99 {r['p99_ms']:>7.2f} ms  {r['statuses']}")
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "database": args.database_url.split("://")[0],
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "dataset": vars(seed_config),
+            "schedules": len(data.schedule_ids),
+        },
+        "routes": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nResultados em {args.output}")
+
+    if args.save_baseline:
+        baseline_path = args.baseline
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"Baseline salvo em {baseline_path}")
+
+    if args.compare:
+        baseline_path = args.baseline if args.compare is True else args.compare
+        regressions = compare(report, json.loads(baseline_path.read_text()), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} rota(s) pioraram além da tolerância.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tempo de montagem do corpo de GET /lines/: ORM + Pydantic contra o JSON montado pelo PostgreSQL.
+
+Popula linhas com horários (padrão: 50 linhas x 250 = 12.500 horários) e mede,
+sem HTTP e sem o cache de respostas, o que o loader do cache faz em cada
+caminho: selectinload + LineRead + jsonable_encoder + json.dumps, ou a
+consulta com json_build_object/json_agg (line_repo.list_lines_json). Também
+confere que os dois corpos têm o mesmo conteúdo. No SQLite só o caminho do
+ORM é medido.
+
+Uso (dentro de fretotvs-api/):
+    python benchmarks/bench_json_documents.py
+    python benchmarks/bench_json_documents.py --database-url postgresql+asyncpg://postgres@localhost/bench --reset
+    python benchmarks/bench_json_documents.py --database-url ... --reset --lines 200 --schedules-per-line 500 --limit 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+parser.add_argument("--database-url", help="DSN assíncrono; padrão: SQLite temporário")
+parser.add_argument("--reset", action="store_true", help="Apaga e recria as tabelas (obrigatório fora do SQLite)")
+parser.add_argument("--lines", type=int, default=50)
+parser.add_argument("--schedules-per-line", type=int, default=250)
+parser.add_argument("--limit", type=int, help="Mede uma página (LinePage) em vez da lista inteira")
+parser.add_argument("--repeat", type=int, default=20, help="Montagens medidas por caminho")
+args = parser.parse_args()
+
+if args.database_url is None:
+    db_path = Path(tempfile.gettempdir()) / "fretotvs-json.db"
+    db_path.unlink(missing_ok=True)
+    args.database_url = f"sqlite+aiosqlite:///{db_path}"
+elif not args.reset:
+    sys.exit("Use --reset para confirmar que as tabelas deste banco podem ser apagadas.")
+
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("SECRET_KEY", "ZmDfcTF7_60GrrY167zsiPd67pEvs0aGOv2oasOM1Pg=")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+from fastapi.encoders import jsonable_encoder
+from sqlmodel import SQLModel
+from core import database
+from repository import line_repo
+from benchmarks.seed import SeedConfig, seed_database
+
+
+async def build_orm(session) -> bytes:
+    # Mesmo trabalho do loader de GET /lines/ fora do PostgreSQL
+    line_repo.JSON_FAST_PATH = False
+    try:
+        data = await line_repo.list_lines(session, limit=args.limit)
+    finally:
+        line_repo.JSON_FAST_PATH = True
+    return json.dumps(jsonable_encoder(data), separators=(",", ":")).encode()
+
+
+async def build_database(session) -> bytes:
+    return await line_repo.list_lines(session, limit=args.limit)
+
+
+async def measure(name: str, build) -> tuple[dict, bytes]:
+    timings = []
+    body = b""
+    for i in range(args.repeat + 2):
+        # Sessão nova a cada rodada: o identity map não pode poupar o ORM
+        async for session in database.get_session():
+            start = time.perf_counter()
+            body = await build(session)
+            elapsed = (time.perf_counter() - start) * 1000
+        if i >= 2:
+            timings.append(elapsed)
+    result = {
+        "path": name,
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "max_ms": max(timings),
+        "bytes": len(body),
+    }
+    return result, body
+
+
+async def run() -> int:
+    await database.init_engine()
+    if args.reset:
+        async with database.engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+    await database.create_db_and_tables()
+    config = SeedConfig(cities=1, lines_per_city=args.lines, schedules_per_line=args.schedules_per_line,
+                        buses=0, users=0, disposable=0)
+    async for session in database.get_session():
+        data = await seed_database(session, config)
+    dialect = database.engine.dialect.name
+    print(f"{dialect}: {len(data.line_ids)} linhas, {len(data.schedule_ids)} horários"
+          f"{f', página de {args.limit}' if args.limit else ''}")
+
+    results = []
+    orm_result, orm_body = await measure("orm+pydantic", build_orm)
+    results.append(orm_result)
+    failures = 0
+    if dialect == "postgresql":
+        db_result, db_body = await measure("json_agg", build_database)
+        results.append(db_result)
+        if json.loads(orm_body) != json.loads(db_body):
+            print("FALHA: os dois caminhos montaram documentos diferentes")
+            failures += 1
+    else:
+        print("(caminho json_agg só existe no PostgreSQL)")
+
+    print(f"{'caminho':<14}{'mediana ms':>12}{'min ms':>10}{'max ms':>10}{'bytes':>12}")
+    for result in results:
+        print(f"{result['path']:<14}{result['median_ms']:>12.1f}{result['min_ms']:>10.1f}"
+              f"{result['max_ms']:>10.1f}{result['bytes']:>12}")
+    if len(results) == 2:
+        print(f"json_agg {results[0]['median_ms'] / results[1]['median_ms']:.1f}x mais rápido (mediana)")
+    await database.engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
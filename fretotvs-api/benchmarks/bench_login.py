@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark de vazão do POST /login: bcrypt inline no event loop x pool dedicado.
+
+Sobe o `main:app` em processo sobre um SQLite temporário, dispara uma rajada de
+logins concorrentes (troca de turno) e, em paralelo, uma requisição leve
+(GET /metrics/db-pool) a cada poucos milissegundos para medir quanto o resto
+da API fica travado enquanto os hashes rodam.
+
+Uso (dentro de fretotvs-api/):
+    python benchmarks/bench_login.py --logins 200 --concurrency 50
+    python benchmarks/bench_login.py --workers 0 8       # compara inline com 8 threads
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DB_PATH = Path(tempfile.gettempdir()) / "fretotvs-bench-login.db"
+DB_PATH.unlink(missing_ok=True)
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ.setdefault("SECRET_KEY", "ZmDfcTF7_60GrrY167zsiPd67pEvs0aGOv2oasOM1Pg=")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+# Os limites de /login e /interest distorceriam a medição
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from sqlalchemy import insert
+from core import database
+from models.user_model import User
+from repository import hashing_repo
+import main
+
+PASSWORD = "bench-password"
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+
+async def seed_users(count: int):
+    password_hash = hashing_repo.Hash.get_password_hash(PASSWORD)
+    async for session in database.get_session():
+        await session.execute(insert(User), [
+            {"totvs_id": f"login-{n}", "name": f"Login {n}", "password": password_hash} for n in range(count)
+        ])
+        await session.commit()
+
+
+async def burst(client: httpx.AsyncClient, logins: int, concurrency: int, probe_interval: float) -> dict:
+    login_latencies: list[float] = []
+    probe_latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    pending = iter(range(logins))
+    done = asyncio.Event()
+
+    async def login_worker():
+        for n in pending:
+            start = time.perf_counter()
+            response = await client.post("/login", data={"username": f"login-{n % concurrency}", "password": PASSWORD})
+            login_latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async def probe():
+        # Conta também o atraso para acordar do sleep: é o tempo que o event loop ficou travado
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(probe_interval)
+            await client.get("/metrics/db-pool")
+            probe_latencies.append(time.perf_counter() - start - probe_interval)
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+
+    return {
+        "logins_per_s": logins / elapsed,
+        "login_p50_ms": percentile(login_latencies, 0.50),
+        "login_p95_ms": percentile(login_latencies, 0.95),
+        "probe_p50_ms": percentile(probe_latencies, 0.50),
+        "probe_p99_ms": percentile(probe_latencies, 0.99),
+        "probe_max_ms": max(probe_latencies, default=0.0) * 1000,
+        "queue_depth_max": hashing_repo.executor.max_queued,
+        "statuses": statuses,
+    }
+
+
+async def main_async():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, hashing_repo.executor.workers or 4],
+                        help="Tamanhos de pool a comparar (0 = bcrypt inline)")
+    parser.add_argument("--probe-interval", type=float, default=0.005)
+    args = parser.parse_args()
+
+    async with main.lifespan(main.app):
+        await seed_users(args.concurrency)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for workers in args.workers:
+                hashing_repo.executor.shutdown()
+                hashing_repo.executor = hashing_repo.HashExecutor(workers=workers)
+                r = await burst(client, args.logins, args.concurrency, args.probe_interval)
+                label = "inline" if workers == 0 else f"{workers} threads"
+                print(f"{label:<12} {r['logins_per_s']:7.1f} logins/s  login p50 {r['login_p50_ms']:7.1f} "
+                      f"p95 {r['login_p95_ms']:7.1f} ms | probe p50 {r['probe_p50_ms']:6.1f} p99 {r['probe_p99_ms']:7.1f} "
+                      f"max {r['probe_max_ms']:7.1f} ms | fila máx {r['queue_depth_max']:3d}  {r['statuses']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
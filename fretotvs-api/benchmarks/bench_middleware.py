@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da pilha de middlewares: BaseHTTPMiddleware (antigo) x ASGI puro.
+
+Roda uma rota trivial em processo (httpx + ASGITransport, sem rede e sem banco)
+e imprime requisições por segundo de cada variante.
+
+Uso (dentro de fretotvs-api/):
+    python benchmarks/bench_middleware.py --requests 5000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "ZmDfcTF7_60GrrY167zsiPd67pEvs0aGOv2oasOM1Pg=")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+import httpx
+from datetime import datetime
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.trustedhost import TrustedHostMiddleware
+from core import audit
+from core.middleware import AuditMiddleware, SecurityHeadersMiddleware, CompressionMiddleware, SECURITY_HEADERS
+
+
+class LegacyAuditMiddleware(BaseHTTPMiddleware):
+    """Versão anterior, mas enfileirando em vez de gravar, para medir só o middleware."""
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        if not audit.writer.should_audit(path):
+            return await call_next(request)
+        timestamp = datetime.utcnow()
+        response = await call_next(request)
+        await audit.writer.submit({
+            "ip": request.client.host,
+            "method": request.method,
+            "path": path,
+            "timestamp": timestamp,
+            "user_agent": request.headers.get("user-agent"),
+            "status_code": response.status_code,
+        })
+        return response
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        for key, value in SECURITY_HEADERS.items():
+            response.headers[key] = value
+        for header in ["server", "x-powered-by"]:
+            try:
+                del response.headers[header]
+            except KeyError:
+                pass
+        return response
+
+
+def build_app(middleware: list[Middleware]) -> FastAPI:
+    app = FastAPI(middleware=middleware)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def legacy_app() -> FastAPI:
+    return build_app([
+        Middleware(LegacyAuditMiddleware),
+        Middleware(GZipMiddleware, minimum_size=1000),
+        Middleware(TrustedHostMiddleware, allowed_hosts=["*"]),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=False, allow_methods=["*"], allow_headers=["*"]),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]),
+        Middleware(LegacySecurityHeadersMiddleware),
+    ])
+
+
+def asgi_app() -> FastAPI:
+    return build_app([
+        Middleware(AuditMiddleware),
+        Middleware(TrustedHostMiddleware, allowed_hosts=["*"]),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=False, allow_methods=["*"], allow_headers=["*"]),
+        Middleware(SecurityHeadersMiddleware),
+        Middleware(CompressionMiddleware),
+    ])
+
+
+async def run(app: FastAPI, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(100):
+            await client.get("/ping")
+
+        async def worker(n: int):
+            for _ in range(n):
+                response = await client.get("/ping")
+                assert response.status_code == 200
+
+        per_worker = total // concurrency
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return per_worker * concurrency / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    # Sem a task de background as entradas são só contadas como descartadas
+    for name, factory in (("BaseHTTPMiddleware", legacy_app), ("ASGI puro", asgi_app)):
+        rps = await run(factory(), args.requests, args.concurrency)
+        print(f"{name:<20} {rps:10.0f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
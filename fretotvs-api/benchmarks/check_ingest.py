@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Verificação da ingestão MQTT: viagens simuladas de vários ônibus com reentregas QoS 1.
+
+Para cada ônibus: start_route, N embarques e M desembarques (no formato do
+iot-device, utils/wire.py), com uma fração das mensagens repetida como
+reentrega. Confere que as duplicatas foram descartadas, que a ocupação final de
+cada ônibus é N - M e que a linha foi vinculada pelo nome; depois end_route
+zera e desvincula tudo. Antes, confere que as duas cópias do formato
+(utils/wire.py e iot-device/wire.py) são idênticas.
+
+Sem --broker as mensagens entram direto no worker (dublê do broker, em
+processo). Com --broker host:porta passam por um broker MQTT de verdade
+(ex: mosquitto local), publicadas com QoS 1 e consumidas pelo MqttSource.
+
+Uso (dentro de fretotvs-api/):
+    python benchmarks/check_ingest.py
+    python benchmarks/check_ingest.py --broker localhost:1883
+    python benchmarks/check_ingest.py --database-url postgresql+asyncpg://postgres@localhost/bench --reset
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(API_DIR))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+parser.add_argument("--database-url", help="DSN assíncrono; padrão: SQLite temporário")
+parser.add_argument("--reset", action="store_true", help="Apaga e recria as tabelas (obrigatório fora do SQLite)")
+parser.add_argument("--broker", help="host:porta de um broker MQTT; padrão: dublê em processo")
+parser.add_argument("--buses", type=int, default=20)
+parser.add_argument("--boardings", type=int, default=30)
+parser.add_argument("--exits", type=int, default=10)
+parser.add_argument("--format", choices=("msgpack", "json", "legacy"), default="msgpack",
+                    help="Codificação das mensagens; legacy é o str(dict) dos dispositivos antigos")
+parser.add_argument("--redelivery", type=float, default=0.2, help="Fração de mensagens entregues duas vezes")
+args = parser.parse_args()
+
+if args.database_url is None:
+    db_path = Path(tempfile.gettempdir()) / "fretotvs-ingest.db"
+    db_path.unlink(missing_ok=True)
+    args.database_url = f"sqlite+aiosqlite:///{db_path}"
+elif not args.reset:
+    sys.exit("Use --reset para confirmar que as tabelas deste banco podem ser apagadas.")
+
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("SECRET_KEY", "ZmDfcTF7_60GrrY167zsiPd67pEvs0aGOv2oasOM1Pg=")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+import paho.mqtt.client as mqtt
+from sqlmodel import SQLModel, select
+from core import database, ingest, live
+from utils import wire
+from models.bus_model import Bus
+from models.schedule_model import Line
+
+LINE_NAME = "LINHA-CENTRO"
+CAPACITY = 45
+# O dispositivo e a API precisam falar o mesmo formato
+WIRE_COPIES = (API_DIR / "utils" / "wire.py", API_DIR.parent / "iot-device" / "wire.py")
+
+
+def encode(action: str, **fields) -> bytes:
+    if args.format == "legacy":
+        return str({"action": action, **fields, "timestamp": datetime.now().isoformat()}).encode()
+    return wire.encode(action, binary=args.format == "msgpack", **fields)
+
+
+def trip_messages(bus: int, kind: str) -> list[tuple[str, bytes]]:
+    """As mensagens de uma viagem (ou do seu encerramento), como o driver_logic.py publica."""
+    prefix = f"BUS-{bus}"
+    if kind == "end":
+        payload = encode("end_route", bus_prefix=prefix, driver_id="D1", line=LINE_NAME, queue_count=0)
+        return [(f"bus/{prefix}/driver_event", payload)]
+    payload = encode("start_route", bus_prefix=prefix, driver_id="D1", line=LINE_NAME, capacity=CAPACITY)
+    messages = [(f"bus/{prefix}/driver_event", payload)]
+    count = 0
+    for i in range(args.boardings + args.exits):
+        entry = i < args.boardings
+        count += 1 if entry else -1
+        action = "passenger_entry" if entry else "passenger_exit"
+        payload = encode(action, line=LINE_NAME, passenger_id=f"P{i % args.boardings}", queue_count=count)
+        messages.append((f"bus/{prefix}/queue", payload))
+    return messages
+
+
+def with_redeliveries(messages: list[tuple[str, bytes]], rng: random.Random) -> list[tuple[str, bytes]]:
+    """QoS 1 reentrega a mesma mensagem logo depois da original (ack perdido)."""
+    delivered = []
+    for message in messages:
+        delivered.append(message)
+        if rng.random() < args.redelivery:
+            delivered.append(message)
+    return delivered
+
+
+async def deliver(messages: list[tuple[str, bytes]]):
+    if args.broker is None:
+        for topic, payload in messages:
+            ingest.worker.submit(topic, payload)
+        return
+    host, _, port = args.broker.partition(":")
+    publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="fretotvs-check-publisher")
+    publisher.connect(host, int(port or 1883))
+    publisher.loop_start()
+    infos = [publisher.publish(topic, payload, qos=1) for topic, payload in messages]
+    for info in infos:
+        await asyncio.to_thread(info.wait_for_publish, 10)
+    publisher.disconnect()
+    publisher.loop_stop()
+
+
+async def wait_applied(expected: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while ingest.worker.stats["applied"] + ingest.worker.stats["duplicates"] < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    await ingest.worker.flush()
+
+
+async def read_buses() -> dict[int, Bus]:
+    async with database.async_session() as session:
+        return {bus.prefix: bus for bus in (await session.execute(select(Bus))).scalars().all()}
+
+
+def check_wire_copies() -> list[str]:
+    api_copy, device_copy = WIRE_COPIES
+    if not device_copy.exists():
+        return [f"{device_copy} não encontrado"]
+    if api_copy.read_bytes() != device_copy.read_bytes():
+        return [f"{api_copy} e {device_copy} divergem: as alterações entram nos dois arquivos"]
+    return []
+
+
+async def run() -> int:
+    failures = check_wire_copies()
+    if failures:
+        print(f"FALHA: {failures[0]}")
+        return 1
+    await database.init_engine()
+    if args.reset:
+        async with database.engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+    await database.create_db_and_tables()
+    live.hub.start(database.engine, listen=False)
+    async for session in database.get_session():
+        line = Line(name=LINE_NAME, active_bus=1, active=True)
+        session.add(line)
+        await session.commit()
+        line_id = line.id
+
+    source = None
+    if args.broker:
+        host, _, port = args.broker.partition(":")
+        source = ingest.MqttSource(ingest.worker, host, int(port or 1883), "bus/#", client_id="fretotvs-check-ingest")
+        source.start()
+        await asyncio.sleep(1)
+    ingest.worker.start()
+
+    rng = random.Random(42)
+    buses = range(1, args.buses + 1)
+    try:
+        for kind in ("trip", "end"):
+            messages = [message for bus in buses for message in trip_messages(bus, kind)]
+            delivered = with_redeliveries(messages, rng)
+            started = time.perf_counter()
+            before = ingest.worker.stats["applied"] + ingest.worker.stats["duplicates"]
+            await deliver(delivered)
+            await wait_applied(before + len(delivered))
+            elapsed = time.perf_counter() - started
+            size = sum(len(payload) for _, payload in messages)
+            print(f"{kind}: {len(delivered)} mensagens ({len(delivered) - len(messages)} reentregas, {size / len(messages):.0f} bytes em média) em {elapsed:.2f}s")
+
+            state = await read_buses()
+            expected_occupied = args.boardings - args.exits if kind == "trip" else 0
+            expected_line = line_id if kind == "trip" else None
+            for bus in buses:
+                current = state.get(bus)
+                if current is None:
+                    failures.append(f"{kind}: ônibus {bus} não foi criado")
+                elif (current.occupied, current.active_line_id, current.capacity) != (expected_occupied, expected_line, CAPACITY):
+                    failures.append(
+                        f"{kind}: ônibus {bus} com ocupação {current.occupied}, linha {current.active_line_id}, "
+                        f"lotação {current.capacity}; esperado {expected_occupied}, {expected_line}, {CAPACITY}"
+                    )
+    finally:
+        if source is not None:
+            source.stop()
+        await ingest.worker.stop()
+        await database.close_connector()
+
+    print(ingest.worker.snapshot())
+    for failure in failures[:20]:
+        print(f"FALHA: {failure}")
+    print("OK" if not failures else f"{len(failures)} falha(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Verificação de concorrência da ocupação: centenas de check-ins simultâneos no mesmo ônibus.
+
+Cria um ônibus com capacidade C, dispara N (> C) PATCH /bus/{prefix}/occupancy
+com {"delta": 1} em paralelo e confere que exatamente C embarques foram aceitos,
+N - C recusados com 400 e que a ocupação final é C (nenhuma atualização perdida,
+nenhum estouro da lotação). Depois faz o caminho inverso com {"delta": -1}.
+
+Uso (dentro de fretotvs-api/):
+    python benchmarks/check_occupancy_race.py
+    python benchmarks/check_occupancy_race.py --database-url postgresql+asyncpg://postgres@localhost/bench --reset
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+parser.add_argument("--database-url", help="DSN assíncrono; padrão: SQLite temporário")
+parser.add_argument("--reset", action="store_true", help="Apaga e recria as tabelas (obrigatório fora do SQLite)")
+parser.add_argument("--checkins", type=int, default=300)
+parser.add_argument("--capacity", type=int, default=45)
+args = parser.parse_args()
+
+if args.database_url is None:
+    db_path = Path(tempfile.gettempdir()) / "fretotvs-occupancy.db"
+    db_path.unlink(missing_ok=True)
+    args.database_url = f"sqlite+aiosqlite:///{db_path}"
+elif not args.reset:
+    sys.exit("Use --reset para confirmar que as tabelas deste banco podem ser apagadas.")
+
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("SECRET_KEY", "ZmDfcTF7_60GrrY167zsiPd67pEvs0aGOv2oasOM1Pg=")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from sqlmodel import SQLModel
+from core import database
+import main
+
+BUS_PREFIX = 4242
+
+
+async def fire(client: httpx.AsyncClient, delta: int, total: int) -> Counter:
+    async def one():
+        response = await client.patch(f"/bus/{BUS_PREFIX}/occupancy", json={"delta": delta})
+        return response.status_code
+
+    return Counter(await asyncio.gather(*(one() for _ in range(total))))
+
+
+async def run() -> int:
+    async with main.lifespan(main.app):
+        if args.reset:
+            async with database.engine.begin() as conn:
+                await conn.run_sync(SQLModel.metadata.drop_all)
+            await database.create_db_and_tables()
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+            await client.post(f"/bus/{BUS_PREFIX}", json={"capacity": args.capacity})
+            failures = []
+
+            for delta, expected_final in ((1, args.capacity), (-1, 0)):
+                statuses = await fire(client, delta, args.checkins)
+                occupied = (await client.get(f"/bus/{BUS_PREFIX}")).json()["occupied"]
+                accepted = args.capacity
+                print(f"delta {delta:+d}: {dict(statuses)} -> ocupação final {occupied}")
+                if statuses[200] != accepted:
+                    failures.append(f"delta {delta:+d}: {statuses[200]} aceitos, esperado {accepted}")
+                if statuses[400] != args.checkins - accepted:
+                    failures.append(f"delta {delta:+d}: {statuses[400]} recusados, esperado {args.checkins - accepted}")
+                if occupied != expected_final:
+                    failures.append(f"delta {delta:+d}: ocupação final {occupied}, esperado {expected_final}")
+
+    for failure in failures:
+        print(f"FALHA: {failure}")
+    print("OK" if not failures else f"{len(failures)} falha(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Verificação da chave de IP do rate limit: trocar o X-Forwarded-For não zera o balde do /login.
+
+Simula a API atrás de --trusted-hops proxies (padrão 1, como no Cloud Run):
+cada requisição chega com entradas forjadas e diferentes à esquerda do
+X-Forwarded-For, seguidas das anexadas pelos proxies. Confere que o limite do
+/login (LOGIN_RATE_LIMIT) estoura mesmo assim, que outro cliente de verdade
+(outra entrada anexada pelo proxy) tem o próprio balde, e que client_ip
+nunca devolve a entrada mais à esquerda controlada pelo cliente.
+
+Uso (dentro de fretotvs-api/):
+    python benchmarks/check_rate_limit_ip.py
+    python benchmarks/check_rate_limit_ip.py --trusted-hops 0
+    python benchmarks/check_rate_limit_ip.py --trusted-hops 2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+parser.add_argument("--trusted-hops", type=int, default=1, help="Valor de TRUSTED_PROXY_HOPS na API")
+parser.add_argument("--attempts", type=int, default=30)
+args = parser.parse_args()
+
+db_path = Path(tempfile.gettempdir()) / "fretotvs-rate-limit.db"
+db_path.unlink(missing_ok=True)
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+os.environ["TRUSTED_PROXY_HOPS"] = str(args.trusted_hops)
+os.environ["RATE_LIMIT_ENABLED"] = "true"
+os.environ.pop("REDIS_URL", None)
+os.environ.setdefault("SECRET_KEY", "ZmDfcTF7_60GrrY167zsiPd67pEvs0aGOv2oasOM1Pg=")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+import httpx
+from config import LOGIN_RATE_LIMIT
+from core.middleware import client_ip
+from core.rate_limit import parse_rule
+import main
+
+PEER = "10.0.0.1"
+
+
+def forwarded_for(client: str, spoofed: str) -> str:
+    # O cliente manda o que quiser; cada proxy confiável anexa quem se conectou a ele
+    if not args.trusted_hops:
+        return spoofed
+    proxies = [f"10.0.1.{hop}" for hop in range(1, args.trusted_hops)]
+    return ", ".join([spoofed, client, *proxies])
+
+
+def check_client_ip() -> int:
+    failures = 0
+    cases = [
+        (0, "1.1.1.1", PEER),
+        (0, "1.1.1.1, 203.0.113.7", PEER),
+        (1, "1.1.1.1, 203.0.113.7", "203.0.113.7"),
+        (1, "203.0.113.7", "203.0.113.7"),
+        (2, "1.1.1.1, 203.0.113.7, 10.0.1.1", "203.0.113.7"),
+        # Cadeia mais curta que o esperado: não passou por todos os proxies, vale o peer
+        (2, "1.1.1.1", PEER),
+    ]
+    for hops, header, expected in cases:
+        scope = {"headers": [(b"x-forwarded-for", header.encode())], "client": (PEER, 5000)}
+        got = client_ip(scope, trusted_hops=hops)
+        if got != expected:
+            print(f"FALHA: client_ip({header!r}, hops={hops}) = {got}, esperado {expected}")
+            failures += 1
+    return failures
+
+
+async def attempts(client: httpx.AsyncClient, real_ip: str) -> Counter:
+    statuses = Counter()
+    for i in range(args.attempts):
+        response = await client.post(
+            "/login",
+            data={"username": "nobody", "password": "wrong"},
+            headers={"X-Forwarded-For": forwarded_for(real_ip, f"198.51.100.{i % 250}")},
+        )
+        statuses[response.status_code] += 1
+    return statuses
+
+
+async def run() -> int:
+    times, _ = parse_rule(LOGIN_RATE_LIMIT)
+    if not 0 < times < args.attempts:
+        sys.exit(f"LOGIN_RATE_LIMIT={LOGIN_RATE_LIMIT}: use --attempts maior que o limite")
+
+    failures = check_client_ip()
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app, client=(PEER, 5000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await attempts(client, "203.0.113.7")
+            second = await attempts(client, "203.0.113.8")
+
+    print(f"TRUSTED_PROXY_HOPS={args.trusted_hops}, LOGIN_RATE_LIMIT={LOGIN_RATE_LIMIT}")
+    print(f"cliente 1 (X-Forwarded-For trocado a cada tentativa): {dict(first)}")
+    print(f"cliente 2: {dict(second)}")
+    if first[429] != args.attempts - times:
+        print(f"FALHA: esperado {args.attempts - times} respostas 429 para o cliente 1")
+        failures += 1
+    # Sem proxy confiável os dois "clientes" são o mesmo peer e dividem o balde
+    expected = args.attempts if args.trusted_hops == 0 else args.attempts - times
+    if second[429] != expected:
+        print(f"FALHA: esperado {expected} respostas 429 para o cliente 2")
+        failures += 1
+    print("OK" if not failures else f"{failures} falha(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,120 @@
+"""
+Massa de dados escalável para os benchmarks, no mesmo formato do populate_db.py:
+cidades -> linhas -> horários de segunda a sexta, mais ônibus e usuários.
+"""
+
+from dataclasses import dataclass, field
+from datetime import time
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.schedule_model import City, Line, Schedule
+from models.bus_model import Bus
+from models.user_model import User
+from repository.hashing_repo import Hash
+
+STATES = ["SP", "RJ", "MG", "PR", "SC", "RS", "BA", "PE"]
+
+BENCH_USER_ID = "bench-user"
+BENCH_USER_NAME = "Bench User"
+BENCH_USER_PASSWORD = "bench-password"
+
+
+@dataclass
+class SeedConfig:
+    cities: int = 4
+    lines_per_city: int = 5
+    schedules_per_line: int = 40
+    buses: int = 50
+    users: int = 50
+    # Registros descartáveis, consumidos pelos cenários de DELETE
+    disposable: int = 300
+
+
+@dataclass
+class SeedData:
+    city_ids: list[int] = field(default_factory=list)
+    line_ids: list[int] = field(default_factory=list)
+    schedule_ids: list[int] = field(default_factory=list)
+    bus_prefixes: list[int] = field(default_factory=list)
+    user_ids: list[str] = field(default_factory=list)
+    disposable_city_ids: list[int] = field(default_factory=list)
+    disposable_line_ids: list[int] = field(default_factory=list)
+    disposable_schedule_ids: list[int] = field(default_factory=list)
+    disposable_bus_prefixes: list[int] = field(default_factory=list)
+    disposable_user_ids: list[str] = field(default_factory=list)
+
+
+def departure_slots(count: int) -> list[tuple[time, time]]:
+    """Pares (chegada, saída) espalhados entre 06:00 e 21:00, chegada 15 min antes."""
+    slots = []
+    for i in range(count):
+        minutes = 6 * 60 + (i * 15 * 60 // max(count, 1)) % (15 * 60)
+        departure = time(minutes // 60, minutes % 60)
+        arrival_minutes = minutes - 15
+        slots.append((time(arrival_minutes // 60, arrival_minutes % 60), departure))
+    return slots
+
+
+async def _insert_returning_ids(session: AsyncSession, model, rows: list[dict], key: str = "id") -> list:
+    if not rows:
+        return []
+    result = await session.execute(insert(model).returning(getattr(model, key)), rows)
+    return list(result.scalars().all())
+
+
+async def seed_database(session: AsyncSession, config: SeedConfig) -> SeedData:
+    data = SeedData()
+
+    data.city_ids = await _insert_returning_ids(session, City, [
+        {"state": STATES[i % len(STATES)], "country": "Brasil"} for i in range(config.cities)
+    ])
+    data.disposable_city_ids = await _insert_returning_ids(session, City, [
+        {"state": "XX", "country": "Brasil"} for _ in range(config.disposable)
+    ])
+
+    data.line_ids = await _insert_returning_ids(session, Line, [
+        {"city_id": city_id, "name": f"Linha {city_id}-{n}", "active_bus": 1 + n % 3, "active": n % 4 != 3}
+        for city_id in data.city_ids
+        for n in range(config.lines_per_city)
+    ])
+    data.disposable_line_ids = await _insert_returning_ids(session, Line, [
+        {"city_id": data.city_ids[0], "name": f"Descartável {n}", "active_bus": 1, "active": False}
+        for n in range(config.disposable)
+    ])
+
+    slots = departure_slots(max(1, config.schedules_per_line // 5))
+    schedule_rows = [
+        {"line_id": line_id, "arrival_time": arrival, "departure_time": departure, "day_week": day, "interest": 0}
+        for line_id in data.line_ids
+        for arrival, departure in slots
+        for day in range(1, 6)
+    ]
+    data.schedule_ids = await _insert_returning_ids(session, Schedule, schedule_rows)
+    data.disposable_schedule_ids = await _insert_returning_ids(session, Schedule, [
+        {"line_id": data.line_ids[0], "arrival_time": time(5, 0), "departure_time": time(5, 15), "day_week": 1, "interest": 0}
+        for _ in range(config.disposable)
+    ])
+
+    data.bus_prefixes = await _insert_returning_ids(session, Bus, [
+        {"prefix": 1000 + n, "capacity": 45, "occupied": 0, "active_line_id": data.line_ids[n % len(data.line_ids)]}
+        for n in range(config.buses)
+    ], key="prefix")
+    data.disposable_bus_prefixes = await _insert_returning_ids(session, Bus, [
+        {"prefix": 900000 + n, "capacity": 45, "occupied": 0, "active_line_id": None}
+        for n in range(config.disposable)
+    ], key="prefix")
+
+    # Um único hash bcrypt reaproveitado: o custo do seed não deve depender de N usuários
+    password_hash = Hash.get_password_hash(BENCH_USER_PASSWORD)
+    data.user_ids = await _insert_returning_ids(session, User, [
+        {"totvs_id": BENCH_USER_ID, "name": BENCH_USER_NAME, "password": password_hash}
+    ] + [
+        {"totvs_id": f"user-{n}", "name": f"Usuário {n}", "password": password_hash} for n in range(config.users)
+    ], key="totvs_id")
+    data.disposable_user_ids = await _insert_returning_ids(session, User, [
+        {"totvs_id": f"disposable-{n}", "name": f"Descartável {n}", "password": password_hash}
+        for n in range(config.disposable)
+    ], key="totvs_id")
+
+    await session.commit()
+    return data
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import random
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from core import database
+from models import audit_model as log
+from utils import encrypt
+from config import (
+    SECRET_KEY,
+    BLIND_INDEX_KEY,
+    AUDIT_QUEUE_MAXSIZE,
+    AUDIT_BATCH_SIZE,
+    AUDIT_FLUSH_INTERVAL,
+    AUDIT_SAMPLE_RATE,
+    AUDIT_PATH_RULES,
+    AUDIT_OVERFLOW_POLICY,
+)
+
+_STOP = object()
+
+
+def parse_path_rules(rules: list[str]) -> list[tuple[str, float]]:
+    """
+    Converte regras "prefixo:taxa" (ex: "/docs:0", "/lines:0.1") em tuplas.
+    A taxa é a fração de requisições auditadas (0 = nunca, 1 = sempre).
+    """
+    parsed = []
+    for rule in rules:
+        prefix, _, rate = rule.rpartition(":")
+        if not prefix:
+            prefix, rate = rate, "0"
+        parsed.append((prefix, float(rate)))
+    # Prefixo mais longo vence
+    parsed.sort(key=lambda item: len(item[0]), reverse=True)
+    return parsed
+
+
+class AuditWriter:
+    """
+    Fila de auditoria em memória drenada por uma task de background.
+
+    O middleware só enfileira; a task agrupa as entradas e grava tudo
+    com um único INSERT em lote, por tamanho (batch_size) ou por tempo
+    (flush_interval). A amostragem vale só para as entradas detalhadas:
+    toda requisição passa por `count`, e os rollups por hora saem desse
+    contador em memória, gravado junto com cada lote.
+    """
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        sample_rate: float = 1.0,
+        path_rules: list[tuple[str, float]] | None = None,
+        overflow_policy: str = "drop",
+    ):
+        if overflow_policy not in ("drop", "block"):
+            raise ValueError(f"overflow_policy deve ser 'drop' ou 'block', recebido: {overflow_policy}")
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.path_rules = path_rules or []
+        self.overflow_policy = overflow_policy
+        self.queue: asyncio.Queue | None = None
+        self.task: asyncio.Task | None = None
+        # (hora, rota, status) -> requisições ainda não gravadas em audit_rollup
+        self.rollups: Counter = Counter()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def sample_rate_for(self, path: str) -> float:
+        for prefix, rate in self.path_rules:
+            if path.startswith(prefix):
+                return rate
+        return self.sample_rate
+
+    def should_audit(self, path: str) -> bool:
+        rate = self.sample_rate_for(path)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        return random.random() < rate
+
+    def count(self, timestamp: datetime, route: str | None, status_code: int):
+        """Conta a requisição no rollup, amostrada ou não."""
+        # "route" é o template da rota (ex: /bus/{bus_prefix}); caminhos sem rota
+        # (404 de scanners etc.) ficam agrupados num único bucket
+        bucket = timestamp.replace(minute=0, second=0, microsecond=0)
+        self.rollups[(bucket, route or "(unmatched)", status_code)] += 1
+
+    async def submit(self, entry: dict):
+        """Enfileira uma entrada; aplica a política de overflow se a fila estiver cheia."""
+        if self.queue is None or self.task is None or self.task.done():
+            self.dropped += 1
+            return
+        if self.overflow_policy == "block":
+            await self.queue.put(entry)
+            return
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logging.warning(f"Audit queue full, {self.dropped} entries dropped so far")
+
+    def start(self):
+        if self.task is not None and not self.task.done():
+            return
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.task = asyncio.create_task(self._run(), name="audit-writer")
+
+    async def stop(self):
+        """Grava o que ainda estiver na fila e encerra a task."""
+        if self.task is None:
+            return
+        if not self.task.done():
+            await self.queue.put(_STOP)
+            await self.task
+        self.task = None
+        self.queue = None
+
+    async def _collect(self) -> tuple[list[dict], bool]:
+        loop = asyncio.get_running_loop()
+        batch = []
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect()
+            if batch or self.rollups:
+                await self._flush(batch)
+
+    async def _flush(self, batch: list[dict]):
+        rows = [
+            {
+                **entry,
+                "ip": encrypt.encrypt_data(SECRET_KEY, entry["ip"]),
+                "ip_index": encrypt.blind_index(BLIND_INDEX_KEY, entry["ip"]),
+            }
+            for entry in batch
+        ]
+        rollups, self.rollups = self.rollups, Counter()
+        try:
+            async for session in database.get_session():
+                if rows:
+                    await session.execute(insert(log.AuditLog), rows)
+                if rollups:
+                    await self._upsert_rollups(session, rollups)
+                await session.commit()
+            self.written += len(rows)
+            logging.debug(f"Audit batch saved: {len(rows)} entries")
+        except Exception as e:
+            self.failed += len(rows)
+            # As contagens voltam para o próximo lote; as entradas detalhadas se perdem
+            self.rollups.update(rollups)
+            logging.error(f"Error saving audit batch ({len(rows)} entries): {getattr(e, 'orig', e)}")
+
+    async def _upsert_rollups(self, session, rollups: Counter):
+        dialect = postgresql if session.bind.dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(log.AuditRollup)
+        statement = statement.on_conflict_do_update(
+            index_elements=["bucket", "path", "status_code"],
+            set_={"count": log.AuditRollup.count + statement.excluded.count},
+        )
+        # Ordem fixa das chaves para que instâncias concorrentes travem as linhas na mesma ordem
+        values = [
+            {"bucket": bucket, "path": path, "status_code": status_code, "count": count}
+            for (bucket, path, status_code), count in sorted(rollups.items(), key=lambda item: str(item[0]))
+        ]
+        await session.execute(statement, values)
+
+writer = AuditWriter(
+    maxsize=AUDIT_QUEUE_MAXSIZE,
+    batch_size=AUDIT_BATCH_SIZE,
+    flush_interval=AUDIT_FLUSH_INTERVAL,
+    sample_rate=AUDIT_SAMPLE_RATE,
+    path_rules=parse_path_rules(AUDIT_PATH_RULES),
+    overflow_policy=AUDIT_OVERFLOW_POLICY,
+)
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import text, delete
+from sqlalchemy.ext.asyncio import AsyncConnection
+from models.audit_model import AuditLog
+from config import (
+    AUDIT_PARTITION_INTERVAL,
+    AUDIT_PARTITIONS_AHEAD,
+    AUDIT_RETENTION_DAYS,
+    AUDIT_MAINTENANCE_INTERVAL,
+)
+
+# Chave do pg_advisory_lock que evita duas instâncias mantendo as partições ao mesmo tempo
+MAINTENANCE_LOCK_ID = 727100
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+PARENT_DDL = [
+    "CREATE SEQUENCE IF NOT EXISTS auditlog_id_seq",
+    """
+    CREATE TABLE IF NOT EXISTS auditlog (
+        id INTEGER NOT NULL DEFAULT nextval('auditlog_id_seq'),
+        ip VARCHAR NOT NULL,
+        ip_index VARCHAR,
+        method VARCHAR NOT NULL,
+        path VARCHAR NOT NULL,
+        timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        user_agent VARCHAR,
+        status_code INTEGER,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp)
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_auditlog_ip_index ON auditlog (ip_index)",
+    "CREATE INDEX IF NOT EXISTS ix_auditlog_timestamp_id ON auditlog (timestamp, id)",
+]
+
+
+def period_start(ts: datetime, interval: str = AUDIT_PARTITION_INTERVAL) -> datetime:
+    if interval == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_period(start: datetime, interval: str = AUDIT_PARTITION_INTERVAL) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(start: datetime, interval: str = AUDIT_PARTITION_INTERVAL) -> str:
+    return f"auditlog_p{start:%Y%m%d}" if interval == "day" else f"auditlog_p{start:%Y%m}"
+
+
+def _parse_bound(value: str) -> datetime | None:
+    if value == "MINVALUE":
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+async def _relkind(conn: AsyncConnection, name: str) -> str | None:
+    result = await conn.execute(
+        text("SELECT relkind::text FROM pg_class WHERE relname = :name AND relnamespace = 'public'::regnamespace"),
+        {"name": name},
+    )
+    return result.scalar()
+
+
+async def list_partitions(conn: AsyncConnection) -> list[tuple[str, datetime | None, datetime]]:
+    """Retorna (nome, início, fim) de cada partição; início None = MINVALUE."""
+    result = await conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'auditlog'::regclass"
+    ))
+    partitions = []
+    for name, bound in result.all():
+        match = _BOUND_RE.search(bound or "")
+        if match:
+            partitions.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    return partitions
+
+
+async def prepare_audit_table(conn: AsyncConnection):
+    """
+    Garante que `auditlog` seja uma tabela particionada por `timestamp` (PostgreSQL).
+
+    Uma tabela comum já existente (criada antes do particionamento) é renomeada
+    para `auditlog_legacy` e anexada como partição de MINVALUE até o início do
+    próximo período, então os dados antigos continuam consultáveis e saem
+    inteiros pela retenção.
+    """
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+    relkind = await _relkind(conn, "auditlog")
+    if relkind == "p":
+        await ensure_partitions(conn)
+        return
+
+    legacy_upper = None
+    if relkind == "r":
+        await conn.execute(text("ALTER TABLE auditlog ADD COLUMN IF NOT EXISTS ip_index VARCHAR"))
+        await conn.execute(text("ALTER TABLE auditlog ALTER COLUMN timestamp SET NOT NULL"))
+        latest = (await conn.execute(text("SELECT max(timestamp) FROM auditlog"))).scalar()
+        legacy_upper = next_period(period_start(max(latest or datetime.utcnow(), datetime.utcnow())))
+        await conn.execute(text("ALTER TABLE auditlog RENAME TO auditlog_legacy"))
+        # A chave primária de uma partição precisa incluir a coluna de particionamento
+        await conn.execute(text(
+            "ALTER TABLE auditlog_legacy DROP CONSTRAINT auditlog_pkey, "
+            "ADD CONSTRAINT auditlog_legacy_pkey PRIMARY KEY (id, timestamp)"
+        ))
+        await conn.execute(text("ALTER INDEX IF EXISTS ix_auditlog_ip_index RENAME TO ix_auditlog_legacy_ip_index"))
+        await conn.execute(text("ALTER INDEX IF EXISTS ix_auditlog_timestamp_id RENAME TO ix_auditlog_legacy_timestamp_id"))
+        # A sequência passa a ser do pai; sem isso o DROP da partição antiga a levaria junto
+        await conn.execute(text("ALTER SEQUENCE auditlog_id_seq OWNED BY NONE"))
+
+    for statement in PARENT_DDL:
+        await conn.execute(text(statement))
+
+    if legacy_upper is not None:
+        await conn.execute(text(
+            f"ALTER TABLE auditlog ATTACH PARTITION auditlog_legacy "
+            f"FOR VALUES FROM (MINVALUE) TO ('{legacy_upper.isoformat(sep=' ')}')"
+        ))
+        logging.info(f"Audit table converted to partitioned; legacy rows kept until {legacy_upper}")
+
+    await ensure_partitions(conn)
+
+
+async def ensure_partitions(conn: AsyncConnection, now: datetime | None = None):
+    """Cria as partições do período atual e de AUDIT_PARTITIONS_AHEAD períodos seguintes."""
+    now = now or datetime.utcnow()
+    partitions = await list_partitions(conn)
+    covered_until = max((upper for _, _, upper in partitions), default=None)
+
+    start = period_start(now)
+    for _ in range(AUDIT_PARTITIONS_AHEAD + 1):
+        end = next_period(start)
+        if covered_until is None or start >= covered_until:
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF auditlog "
+                f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+            ))
+        start = end
+
+
+async def drop_expired_partitions(conn: AsyncConnection, now: datetime | None = None) -> list[str]:
+    """Remove partições inteiras cujo fim é anterior ao limite de retenção."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=AUDIT_RETENTION_DAYS)
+    dropped = []
+    for name, _, upper in await list_partitions(conn):
+        if upper <= cutoff:
+            await conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            dropped.append(name)
+    return dropped
+
+
+async def run_maintenance(engine):
+    async with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            # Sem particionamento (ex: SQLite local) a retenção vira um DELETE simples
+            cutoff = datetime.utcnow() - timedelta(days=AUDIT_RETENTION_DAYS)
+            await conn.execute(delete(AuditLog).where(AuditLog.timestamp < cutoff))
+            return
+        locked = (await conn.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})).scalar()
+        if not locked:
+            return
+        await ensure_partitions(conn)
+        dropped = await drop_expired_partitions(conn)
+        if dropped:
+            logging.info(f"Audit partitions dropped by retention: {', '.join(dropped)}")
+
+
+class AuditMaintenance:
+    """Task de background que cria partições futuras e aplica a retenção."""
+    def __init__(self, interval: float = 3600):
+        self.interval = interval
+        self.task: asyncio.Task | None = None
+
+    def start(self, engine):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run(engine), name="audit-maintenance")
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self, engine):
+        while True:
+            try:
+                await run_maintenance(engine)
+            except Exception as e:
+                logging.error(f"Error running audit maintenance: {getattr(e, 'orig', e)}")
+            await asyncio.sleep(self.interval)
+
+
+maintenance = AuditMaintenance(interval=AUDIT_MAINTENANCE_INTERVAL)
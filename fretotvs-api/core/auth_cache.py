@@ -0,0 +1,105 @@
+import hashlib
+import time
+from collections import OrderedDict
+from config import AUTH_CACHE_TTL, AUTH_CACHE_MAXSIZE
+
+
+def token_key(token: str) -> str:
+    """O token em si não fica em memória, só o hash."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class UserCache:
+    """
+    Cache LRU com TTL das claims do JWT e do usuário resolvido, por hash do token.
+
+    A entrada vale até o menor entre o TTL e o `exp` do token. O índice por
+    totvs_id e por nome permite que user_repo invalide explicitamente um usuário
+    alterado ou removido. A invalidação é local ao processo: em várias instâncias
+    o TTL limita por quanto tempo outra réplica pode servir o usuário antigo.
+    """
+    def __init__(self, ttl: float = 60, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, tuple[float, dict, dict]] = OrderedDict()
+        self.by_user: dict[str, set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> tuple[dict, dict] | None:
+        """Retorna (claims, campos do usuário) ou None."""
+        if self.ttl <= 0:
+            return None
+        key = token_key(token)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def set(self, token: str, claims: dict, user: dict):
+        if self.ttl <= 0:
+            return
+        ttl = self.ttl
+        exp = claims.get("exp")
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl <= 0:
+            return
+        key = token_key(token)
+        self._remove(key)
+        self.entries[key] = (time.monotonic() + ttl, claims, user)
+        for user_key in self._user_keys(user):
+            self.by_user.setdefault(user_key, set()).add(key)
+        while len(self.entries) > self.maxsize:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def invalidate_user(self, totvs_id: str | None = None, *names: str):
+        """Remove as entradas do usuário (por totvs_id) e de tokens cujo `sub` é um dos nomes."""
+        user_keys = [f"id:{totvs_id}"] if totvs_id else []
+        user_keys += [f"name:{name}" for name in names if name]
+        for user_key in user_keys:
+            for key in list(self.by_user.get(user_key, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.by_user.clear()
+
+    def _user_keys(self, user: dict) -> list[str]:
+        return [f"id:{user['totvs_id']}", f"name:{user['name']}"]
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for user_key in self._user_keys(entry[2]):
+            keys = self.by_user.get(user_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_user[user_key]
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = UserCache(ttl=AUTH_CACHE_TTL, maxsize=AUTH_CACHE_MAXSIZE)
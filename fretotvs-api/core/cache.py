@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from config import CACHE_TTL, CACHE_MAX_ENTRIES
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+
+class ResponseCache:
+    """
+    Cache read-through de respostas JSON já serializadas.
+
+    Cada entrada guarda os bytes do corpo e as tabelas de que depende (tags).
+    Escritas nos repositórios chamam `invalidate(tag)`, que apaga as entradas
+    locais, as do Redis (se configurado) e publica a tag no canal de pub/sub
+    para as outras instâncias fazerem o mesmo. O TTL é só uma rede de segurança.
+    """
+    def __init__(self, ttl: float = 300, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, bytes, tuple[str, ...]]] = OrderedDict()
+        # Geração por tag: uma carga que começou antes de uma invalidação não é guardada
+        self.generations: dict[str, int] = {}
+        self.inflight: dict[str, tuple[asyncio.Future, tuple[str, ...]]] = {}
+        # Identifica esta instância nas mensagens de invalidação, para ignorar as próprias
+        self.instance_id = uuid.uuid4().hex
+        self.redis = None
+        self.listener: asyncio.Task | None = None
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+        self.errors = 0
+
+    def start(self, redis_client):
+        """Liga o segundo nível no Redis e a escuta de invalidações das outras instâncias."""
+        self.redis = redis_client
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self._listen(), name="cache-invalidation")
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+        self.redis = None
+
+    async def get_or_load(self, key: str, tags: tuple[str, ...], loader) -> bytes:
+        body = self._get_local(key)
+        if body is not None:
+            self.hits += 1
+            return body
+
+        # Várias requisições no mesmo miss esperam uma única carga
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending[0])
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = (future, tags)
+        try:
+            body = await self._load(key, tags, loader)
+            future.set_result(body)
+            return body
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita "exception was never retrieved" quando ninguém mais esperava
+            future.exception()
+            raise
+        finally:
+            if self.inflight.get(key, (None,))[0] is future:
+                del self.inflight[key]
+
+    async def _load(self, key: str, tags: tuple[str, ...], loader) -> bytes:
+        if self.redis is not None:
+            try:
+                body = await self.redis.get(f"cache:{key}")
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Cache Redis read error: {e}")
+                body = None
+            if body is not None:
+                self.redis_hits += 1
+                body = body.encode() if isinstance(body, str) else body
+                self._set_local(key, body, tags)
+                return body
+
+        self.misses += 1
+        generation = self._generation(tags)
+        data = await loader()
+        # O loader pode devolver o corpo já serializado (ex: JSON montado pelo banco)
+        body = data if isinstance(data, bytes) else json.dumps(jsonable_encoder(data), separators=(",", ":")).encode()
+        if generation == self._generation(tags):
+            self._set_local(key, body, tags)
+            await self._set_redis(key, body, tags)
+        return body
+
+    async def response(self, key: str, tags: tuple[str, ...], loader, headers: dict[str, str] | None = None) -> Response:
+        """
+        Resposta JSON de `loader()` (corrotina sem argumentos, que devolve
+        objetos ou os bytes do JSON), servida do cache quando possível.
+
+        Com o ETag das versões (Conditional) na chave, uma entrada montada antes
+        de uma escrita nunca sai com o ETag novo, mesmo sem a invalidação pelo
+        Redis chegar a esta instância.
+        """
+        if headers and "ETag" in headers:
+            key = f"{key}:{headers['ETag']}"
+        body = await self.get_or_load(key, tags, loader)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def invalidate(self, *tags: str):
+        self._invalidate_local(tags)
+        self.invalidations += 1
+        if self.redis is None:
+            return
+        try:
+            for tag in tags:
+                keys = await self.redis.smembers(f"cache:tag:{tag}")
+                if keys:
+                    await self.redis.delete(*(f"cache:{key}" for key in keys), f"cache:tag:{tag}")
+            await self.redis.publish(INVALIDATION_CHANNEL, f"{self.instance_id}|{','.join(tags)}")
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Cache Redis invalidation error: {e}")
+
+    def clear(self):
+        self.entries.clear()
+
+    def _generation(self, tags: tuple[str, ...]) -> tuple[int, ...]:
+        return tuple(self.generations.get(tag, 0) for tag in tags)
+
+    def _get_local(self, key: str) -> bytes | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def _set_local(self, key: str, body: bytes, tags: tuple[str, ...]):
+        if self.ttl <= 0:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, body, tags)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def _set_redis(self, key: str, body: bytes, tags: tuple[str, ...]):
+        if self.redis is None or self.ttl <= 0:
+            return
+        try:
+            await self.redis.set(f"cache:{key}", body, ex=int(self.ttl))
+            for tag in tags:
+                await self.redis.sadd(f"cache:tag:{tag}", key)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Cache Redis write error: {e}")
+
+    def _invalidate_local(self, tags):
+        tags = set(tags)
+        for tag in tags:
+            self.generations[tag] = self.generations.get(tag, 0) + 1
+        for key in [key for key, entry in self.entries.items() if tags.intersection(entry[2])]:
+            del self.entries[key]
+        # Quem chegar depois da invalidação não pega carona numa carga iniciada antes dela
+        for key in [key for key, (_, entry_tags) in self.inflight.items() if tags.intersection(entry_tags)]:
+            del self.inflight[key]
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    data = data.decode() if isinstance(data, bytes) else data
+                    sender, _, tags = data.partition("|")
+                    if sender == self.instance_id:
+                        continue
+                    self._invalidate_local(tags.split(","))
+                    self.remote_invalidations += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Cache invalidation listener error: {e}")
+                # Mensagens perdidas enquanto desconectado: descarta tudo para não servir dado velho
+                self.clear()
+                await asyncio.sleep(1)
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "backend": "memory+redis" if self.redis is not None else "memory",
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations,
+            "errors": self.errors,
+        }
+
+
+cache = ResponseCache(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
@@ -0,0 +1,210 @@
+import gzip
+import hashlib
+import time
+from collections import Counter, OrderedDict
+from config import (
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_CACHE_ENTRIES,
+    COMPRESSION_CACHE_MAX_BYTES,
+    COMPRESSION_LEVELS,
+    COMPRESSION_ROUTE_LEVELS,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _gzip(body: bytes, level: int) -> bytes:
+    # mtime fixo: o mesmo corpo sempre gera os mesmos bytes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _brotli(body: bytes, level: int) -> bytes:
+    return brotli.compress(body, quality=level)
+
+
+def _zstd(body: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+# Em ordem de preferência do servidor, quando o cliente aceita mais de uma com o mesmo q
+CODECS = {"zstd": _zstd, "br": _brotli, "gzip": _gzip}
+AVAILABLE = {
+    name: codec for name, codec in CODECS.items()
+    if (name != "br" or brotli is not None) and (name != "zstd" or zstandard is not None)
+}
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag da variante comprimida: '"v1"' -> '"v1-br"' (W/ preservado)."""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else f"{etag}-{encoding}"
+
+
+def strip_encoding(etag: str) -> str:
+    """Inverso de encoded_etag, para comparar If-None-Match com o ETag da representação sem compressão."""
+    for encoding in CODECS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[: -len(suffix)] + '"'
+    return etag
+
+
+def parse_levels(rules: list[str]) -> dict[str, int]:
+    """Converte regras "codec=nível" (ex: "gzip=6", "br=4") em dict."""
+    levels = {}
+    for rule in rules:
+        name, _, level = rule.partition("=")
+        levels[name.strip()] = int(level)
+    return levels
+
+
+def parse_route_levels(rules: list[str]) -> list[tuple[str, str, int]]:
+    """
+    Converte regras "prefixo:codec=nível" (ex: "/lines:br=9") em tuplas.
+    Nível 0 desliga a compressão daquela codificação no prefixo.
+    """
+    parsed = []
+    for rule in rules:
+        prefix, _, level = rule.rpartition(":")
+        name, _, level = level.partition("=")
+        parsed.append((prefix, name.strip(), int(level)))
+    # Prefixo mais longo vence
+    parsed.sort(key=lambda item: len(item[0]), reverse=True)
+    return parsed
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+class Compressor:
+    """
+    Compressão das respostas com cache das variantes já comprimidas.
+
+    A codificação sai do Accept-Encoding (zstd, br ou gzip, conforme o que
+    estiver instalado). As respostas com ETag se repetem byte a byte até a
+    próxima escrita, então a variante comprimida fica guardada pelo hash do
+    corpo, codificação e nível: uma repetição custa só o hash. As demais são
+    comprimidas a cada vez, sem ocupar o cache.
+    """
+    def __init__(
+        self,
+        min_size: int = 1000,
+        max_entries: int = 256,
+        max_bytes: int = 32 * 1024 * 1024,
+        levels: dict[str, int] | None = None,
+        route_levels: list[tuple[str, str, int]] | None = None,
+    ):
+        self.min_size = min_size
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.levels = {"zstd": 3, "br": 4, "gzip": 6, **(levels or {})}
+        self.route_levels = route_levels or []
+        self.entries: OrderedDict[tuple[bytes, str, int], bytes] = OrderedDict()
+        self.cached_bytes = 0
+        self.stats = Counter()
+        self.cpu_seconds = Counter()
+        self.bytes_in = Counter()
+        self.bytes_out = Counter()
+
+    def level_for(self, path: str, encoding: str) -> int:
+        for prefix, name, level in self.route_levels:
+            if name == encoding and path.startswith(prefix):
+                return level
+        return self.levels[encoding]
+
+    def choose(self, accept_encoding: str | None, path: str) -> tuple[str, int] | None:
+        """(codificação, nível) para a resposta, ou None para enviar sem compressão."""
+        if not accept_encoding:
+            return None
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best = None
+        for name in AVAILABLE:
+            q = accepted.get(name, wildcard)
+            level = self.level_for(path, name)
+            if q > 0 and level > 0 and (best is None or q > best[2]):
+                best = (name, level, q)
+        return best[:2] if best else None
+
+    def compress(self, body: bytes, encoding: str, level: int, cacheable: bool) -> bytes:
+        if not cacheable:
+            self.stats["uncached"] += 1
+            return self._compress(body, encoding, level)
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding, level)
+        compressed = self.entries.get(key)
+        if compressed is not None:
+            self.stats["hits"] += 1
+            self.entries.move_to_end(key)
+            return compressed
+        self.stats["misses"] += 1
+        compressed = self._compress(body, encoding, level)
+        self.entries[key] = compressed
+        self.cached_bytes += len(compressed)
+        while self.entries and (len(self.entries) > self.max_entries or self.cached_bytes > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.cached_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+        return compressed
+
+    def _compress(self, body: bytes, encoding: str, level: int) -> bytes:
+        # Tempo de CPU desta thread: não conta o tempo esperando outras tasks
+        start = time.thread_time()
+        compressed = AVAILABLE[encoding](body, level)
+        self.cpu_seconds[encoding] += time.thread_time() - start
+        self.bytes_in[encoding] += len(body)
+        self.bytes_out[encoding] += len(compressed)
+        return compressed
+
+    def clear(self):
+        self.entries.clear()
+        self.cached_bytes = 0
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "available": list(AVAILABLE),
+            "levels": self.levels,
+            "entries": len(self.entries),
+            "cached_bytes": self.cached_bytes,
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else None,
+            **self.stats,
+            "encodings": {
+                name: {
+                    "cpu_ms": round(self.cpu_seconds[name] * 1000, 1),
+                    "bytes_in": self.bytes_in[name],
+                    "bytes_out": self.bytes_out[name],
+                    "ratio": round(self.bytes_out[name] / self.bytes_in[name], 4) if self.bytes_in[name] else None,
+                }
+                for name in AVAILABLE
+            },
+        }
+
+
+compressor = Compressor(
+    min_size=COMPRESSION_MIN_SIZE,
+    max_entries=COMPRESSION_CACHE_ENTRIES,
+    max_bytes=COMPRESSION_CACHE_MAX_BYTES,
+    levels=parse_levels(COMPRESSION_LEVELS),
+    route_levels=parse_route_levels(COMPRESSION_ROUTE_LEVELS),
+)
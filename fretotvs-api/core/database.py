@@ -1,9 +1,25 @@
 import os
+import time
 from sqlmodel import SQLModel
+from sqlalchemy import text, select
+from sqlalchemy.dialects import postgresql, sqlite
 from typing import AsyncGenerator
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from google.cloud.sql.connector import Connector, IPTypes
 from dotenv import load_dotenv
+from core import audit_partitions
+from core.pool import TimedAsyncQueuePool
+from models.version_model import TableVersion, VERSIONED_TABLES
+from config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_STATEMENT_CACHE_SIZE,
+)
 
 load_dotenv()
 
@@ -22,8 +38,47 @@ async def get_engine():
         await init_engine()
     return engine
 
+def pool_options() -> dict:
+    return {
+        "poolclass": TimedAsyncQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
 async def init_engine():
-    global connector, engine, async_session
+    global engine, async_session
+    if DATABASE_URL:
+        engine = create_engine_from_url(DATABASE_URL)
+    else:
+        engine = create_cloud_sql_engine()
+
+    async_session = async_sessionmaker(
+        engine,
+        class_=AsyncSession,
+        expire_on_commit=False
+    )
+
+def create_engine_from_url(url: str):
+    """Conexão direta por DSN, sem o handshake do Cloud SQL Connector."""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        # SQLite (ambiente local/benchmarks) usa o pool padrão do dialeto
+        return create_async_engine(url, echo=False)
+    return create_async_engine(
+        url,
+        echo=False,
+        connect_args={
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        },
+        **pool_options()
+    )
+
+def create_cloud_sql_engine():
+    global connector
     if connector is None:
         connector = Connector()
 
@@ -34,27 +89,67 @@ async def init_engine():
             user=DB_USER,
             password=DB_PASS,
             db=DB_NAME,
-            ip_type=IPTypes.PUBLIC
+            ip_type=IPTypes.PUBLIC,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
         )
         return conn
 
+    # Com async_creator o SQLAlchemy ignora connect_args, e o cache de prepared
+    # statements do dialeto ficaria no padrão (100): o creator repassa o tamanho
+    def creator():
+        return engine.sync_engine.dialect.dbapi.connect(
+            async_creator_fn=getconn,
+            prepared_statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        )
+
     engine = create_async_engine(
         "postgresql+asyncpg://",
-        async_creator=getconn,
-        echo=False
+        creator=creator,
+        echo=False,
+        **pool_options()
     )
+    return engine
 
-    async_session = async_sessionmaker(
-        engine,
-        class_=AsyncSession,
-        expire_on_commit=False
-    )
+# create_all não altera tabelas que já existem; colunas e índices novos
+# em tabelas antigas entram aqui como DDL idempotente (apenas PostgreSQL).
+SCHEMA_PATCHES: list[str] = [
+    "CREATE INDEX IF NOT EXISTS ix_city_state ON city (state)",
+    "CREATE INDEX IF NOT EXISTS ix_line_city_active ON line (city_id, active)",
+    "CREATE INDEX IF NOT EXISTS ix_schedule_line_day_departure ON schedule (line_id, day_week, departure_time, id)",
+    "CREATE INDEX IF NOT EXISTS ix_schedule_day_departure ON schedule (day_week, departure_time, id)",
+    "CREATE INDEX IF NOT EXISTS ix_bus_active_line_prefix ON bus (active_line_id, prefix)",
+    "CREATE INDEX IF NOT EXISTS ix_bus_full_prefix ON bus ((occupied >= capacity), prefix)",
+]
 
 async def create_db_and_tables():
     if engine is None:
         raise RuntimeError("Engine não inicializado. Chame init_engine() primeiro.")
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # A auditoria é particionada e por isso criada antes, fora do create_all
+            await audit_partitions.prepare_audit_table(conn)
         await conn.run_sync(SQLModel.metadata.create_all)
+        if conn.dialect.name == "postgresql":
+            for statement in SCHEMA_PATCHES:
+                await conn.execute(text(statement))
+        await ensure_table_versions(conn)
+
+async def ensure_table_versions(conn):
+    """
+    Cria a linha de versão das tabelas que ainda não têm. A versão inicial vem
+    do relógio (ms), então um banco recriado do zero não repete ETags antigos.
+    """
+    existing = set((await conn.execute(select(TableVersion.name))).scalars().all())
+    missing = [name for name in VERSIONED_TABLES if name not in existing]
+    if not missing:
+        return
+    start = int(time.time() * 1000)
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    # Outra instância subindo ao mesmo tempo pode ter inserido antes
+    await conn.execute(
+        dialect.insert(TableVersion).on_conflict_do_nothing(),
+        [{"name": name, "version": start} for name in missing],
+    )
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     if engine is None:
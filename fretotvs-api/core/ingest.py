@@ -0,0 +1,371 @@
+import ast
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+import paho.mqtt.client as mqtt
+from sqlalchemy import exc as sa_exc
+from core import database, versions
+from core.cache import cache
+from repository import bus_repo, line_repo
+from utils import wire
+from config import (
+    INGEST_BATCH_SIZE,
+    INGEST_FLUSH_INTERVAL,
+    INGEST_MAX_ATTEMPTS,
+    INGEST_DEDUPE_SIZE,
+    INGEST_DEDUPE_TTL,
+    INGEST_LEGACY_MAX_BYTES,
+)
+
+OCCUPANCY_ACTIONS = {"passenger_entry": 1, "passenger_exit": -1}
+ROUTE_ACTIONS = {"start_route", "end_route"}
+
+# "bus/BUS-45/queue" -> 45: o dispositivo usa o prefixo com texto, a API só o número
+_PREFIX = re.compile(r"(\d+)$")
+
+
+def parse_payload(payload: bytes) -> dict:
+    """
+    Formato v1 (utils/wire.py, MessagePack ou JSON). Dispositivos ainda não
+    atualizados publicam o dict com nomes longos, em JSON ou como repr (str(payload)),
+    aceito só até INGEST_LEGACY_MAX_BYTES: literal_eval de um texto grande e
+    aninhado pode estourar a pilha ou a memória.
+    """
+    payload = bytes(payload)
+    try:
+        return wire.decode(payload)
+    except ValueError as e:
+        if payload[:1] != b"{":
+            raise
+        error = e
+    if len(payload) > INGEST_LEGACY_MAX_BYTES:
+        raise ValueError(f"legacy payload too large ({len(payload)} bytes)")
+    text = payload.decode()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = ast.literal_eval(text)
+    if not isinstance(data, dict) or "v" in data:
+        raise error
+    return data
+
+
+def is_transient(error: Exception) -> bool:
+    """Banco fora do ar, conexão caída ou pool esgotado: o lote volta inteiro, sem contar tentativa."""
+    return isinstance(error, (sa_exc.OperationalError, sa_exc.InterfaceError, sa_exc.TimeoutError, OSError, TimeoutError)) or (
+        getattr(error, "connection_invalidated", False)
+    )
+
+
+def bus_prefix_from(topic: str, data: dict) -> int | None:
+    parts = topic.split("/")
+    candidates = [data.get("bus_prefix"), parts[1] if len(parts) > 1 else None]
+    for candidate in candidates:
+        match = _PREFIX.search(str(candidate or ""))
+        if match:
+            return int(match.group(1))
+    return None
+
+
+class Deduplicator:
+    """Digests das mensagens já vistas, com validade e tamanho máximo (as mais antigas saem)."""
+    def __init__(self, max_size: int = 100000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.seen: OrderedDict[bytes, float] = OrderedDict()
+
+    def is_duplicate(self, topic: str, payload: bytes) -> bool:
+        now = time.monotonic()
+        digest = hashlib.blake2b(topic.encode() + b"\0" + bytes(payload), digest_size=16).digest()
+        while self.seen:
+            oldest, expires = next(iter(self.seen.items()))
+            if expires > now and len(self.seen) < self.max_size:
+                break
+            del self.seen[oldest]
+        if digest in self.seen:
+            return True
+        self.seen[digest] = now + self.ttl
+        return False
+
+
+@dataclass
+class DeviceEvent:
+    bus_prefix: int
+    action: str
+    data: dict
+    ack: Callable[[], None] | None = None
+    # Lotes com este evento que falharam por erro que não é de conexão
+    attempts: int = 0
+
+
+@dataclass
+class BusChanges:
+    """Efeito líquido de um lote num ônibus: último evento de viagem e ocupação depois dele."""
+    route: DeviceEvent | None = None
+    occupied: int | None = None
+    delta: int = 0
+
+    def add(self, event: DeviceEvent):
+        if event.action in ROUTE_ACTIONS:
+            # Início/fim de viagem zera a ocupação: o que veio antes não importa mais
+            self.route, self.occupied, self.delta = event, None, 0
+        elif event.data.get("queue_count") is not None:
+            self.occupied, self.delta = event.data["queue_count"], 0
+        else:
+            self.delta += OCCUPANCY_ACTIONS[event.action]
+
+
+class IngestWorker:
+    """
+    Aplica os eventos dos dispositivos (bus/{prefixo}/queue e /driver_event) no banco.
+
+    As mensagens chegam por `submit` (do cliente MQTT ou de qualquer outra
+    fonte); reentregas QoS 1 são descartadas pelo digest. A cada
+    `flush_interval` segundos, ou ao juntar `batch_size` eventos, o lote vira
+    uma transação só: por ônibus vale o último início/fim de viagem e a
+    ocupação mais recente (o `queue_count` do dispositivo). A confirmação
+    (ack) das mensagens só é enviada depois do commit; um lote que falha é
+    tentado de novo no próximo ciclo. Se a falha não é de conexão e se repete
+    `max_attempts` vezes, o lote é aplicado em metades até isolar o evento
+    que falha sozinho, que é descartado (log, métrica e ack) para o resto seguir.
+    """
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.5, dedupe: Deduplicator | None = None,
+                 max_attempts: int = 3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.dedupe = dedupe or Deduplicator()
+        self.pending: list[DeviceEvent] = []
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.stats = Counter()
+        # Duração do último lote e maior atraso (commit - instante do evento no
+        # dispositivo) desde o último snapshot(reset_lag=True)
+        self.last_apply_ms = 0.0
+        self.max_lag_ms = 0
+
+    def submit(self, topic: str, payload: bytes, ack: Callable[[], None] | None = None):
+        self.stats["received"] += 1
+        if self.dedupe.is_duplicate(topic, payload):
+            self.stats["duplicates"] += 1
+            if ack:
+                ack()
+            return
+        try:
+            data = parse_payload(payload)
+            action = data.get("action")
+            bus_prefix = bus_prefix_from(topic, data)
+            if action == "heartbeat":
+                # Só sinal de vida do dispositivo (QoS 0): não mexe no banco
+                self.stats["heartbeats"] += 1
+                if ack:
+                    ack()
+                return
+            if bus_prefix is None or (action not in ROUTE_ACTIONS and action not in OCCUPANCY_ACTIONS):
+                raise ValueError(f"unsupported event {action!r} on {topic}")
+            # Números validados aqui para um campo ruim não derrubar o lote inteiro
+            for key in ("queue_count", "capacity"):
+                if data.get(key) is not None:
+                    data[key] = int(data[key])
+        except Exception as e:
+            # Mensagem inválida não volta a ser entregue: confirma e descarta. Qualquer
+            # erro conta (RecursionError, MemoryError...), senão a reentrega não teria fim
+            self.stats["invalid"] += 1
+            logging.warning(f"Ignoring device message: {e}")
+            if ack:
+                ack()
+            return
+        self.pending.append(DeviceEvent(bus_prefix, action, data, ack))
+        if len(self.pending) >= self.batch_size:
+            self.wakeup.set()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run(), name="device-ingest")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch = self.pending
+        self.pending = []
+        started = time.monotonic()
+        try:
+            await self._apply(batch)
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            logging.error(f"Error applying device events: {getattr(e, 'orig', e)}")
+            if not is_transient(e):
+                for event in batch:
+                    event.attempts += 1
+            remaining = batch
+            if any(event.attempts >= self.max_attempts for event in batch):
+                remaining = await self._isolate(batch)
+            # Volta para a frente da fila, na ordem original
+            self.pending = remaining + self.pending
+            return
+        self.last_apply_ms = (time.monotonic() - started) * 1000
+        self._applied(batch)
+
+    async def _isolate(self, batch: list[DeviceEvent]) -> list[DeviceEvent]:
+        """
+        Aplica o lote em metades, na ordem, até sobrar o evento que falha sozinho.
+        Devolve os eventos que ficaram para depois por uma falha transitória.
+        """
+        try:
+            await self._apply(batch)
+        except Exception as e:
+            if is_transient(e):
+                return batch
+            if len(batch) == 1:
+                self._dead_letter(batch[0], e)
+                return []
+            middle = len(batch) // 2
+            remaining = await self._isolate(batch[:middle])
+            if remaining:
+                return remaining + batch[middle:]
+            return await self._isolate(batch[middle:])
+        self._applied(batch)
+        return []
+
+    def _applied(self, batch: list[DeviceEvent]):
+        self.stats["batches"] += 1
+        self.stats["applied"] += len(batch)
+        now_ms = wire.now_ms()
+        # Só o formato wire traz timestamp_ms; o legado não entra na conta
+        lags = [now_ms - event.data["timestamp_ms"] for event in batch if event.data.get("timestamp_ms")]
+        if lags:
+            self.max_lag_ms = max(self.max_lag_ms, max(lags))
+        for event in batch:
+            if event.ack:
+                event.ack()
+
+    def _dead_letter(self, event: DeviceEvent, error: Exception):
+        # Confirmado mesmo assim: reentregar só travaria a fila de novo
+        self.stats["dead_lettered"] += 1
+        logging.error(
+            f"Dropping device event after {event.attempts} failed batches: "
+            f"bus {event.bus_prefix} {event.action} {event.data}: {getattr(error, 'orig', error)}"
+        )
+        if event.ack:
+            event.ack()
+
+    async def _apply(self, batch: list[DeviceEvent]):
+        changes: dict[int, BusChanges] = {}
+        for event in batch:
+            changes.setdefault(event.bus_prefix, BusChanges()).add(event)
+
+        async for session in database.get_session():
+            line_ids: dict[str, int | None] = {}
+            # Ordem fixa dos prefixos: lotes concorrentes travam as linhas na mesma ordem
+            for bus_prefix in sorted(changes):
+                change = changes[bus_prefix]
+                if change.route is not None:
+                    await self._apply_route(session, bus_prefix, change.route, line_ids)
+                if change.occupied is not None or change.delta:
+                    bus = await bus_repo.set_device_occupancy(session, bus_prefix, change.occupied, change.delta)
+                    if bus is None:
+                        self.stats["unknown_bus"] += 1
+            await versions.bump(session, "bus")
+            await session.commit()
+        await cache.invalidate("bus")
+
+    async def _apply_route(self, session, bus_prefix: int, event: DeviceEvent, line_ids: dict):
+        if event.action == "end_route":
+            if await bus_repo.end_device_route(session, bus_prefix) is None:
+                self.stats["unknown_bus"] += 1
+            return
+        name = event.data.get("line")
+        if name not in line_ids:
+            line = await line_repo.find_line_by_name(name, session) if name else None
+            line_ids[name] = line.id if line else None
+        if line_ids[name] is None:
+            self.stats["unknown_line"] += 1
+        await bus_repo.start_device_route(session, bus_prefix, line_ids[name], event.data.get("capacity"))
+
+    def snapshot(self, reset_lag: bool = False) -> dict:
+        snapshot = {
+            "pending": len(self.pending),
+            "dedupe_entries": len(self.dedupe.seen),
+            "last_apply_ms": round(self.last_apply_ms, 1),
+            "max_lag_ms": self.max_lag_ms,
+            **self.stats,
+        }
+        if reset_lag:
+            self.max_lag_ms = 0
+        return snapshot
+
+
+class MqttSource:
+    """
+    Liga o broker ao worker (paho-mqtt, em thread própria). Sessão persistente
+    (clean_session=False) com client id fixo: o broker guarda as mensagens QoS 1
+    enquanto o worker está fora, e as confirmações são manuais, depois do commit.
+    """
+    def __init__(self, worker: IngestWorker, host: str, port: int = 1883, topic: str = "bus/#",
+                 client_id: str = "fretotvs-ingest", username: str | None = None, password: str | None = None):
+        self.worker = worker
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, clean_session=False)
+        self.client.manual_ack_set(True)
+        if username:
+            self.client.username_pw_set(username, password)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.client.connect_async(self.host, self.port, keepalive=60)
+        self.client.loop_start()
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logging.error(f"MQTT connection refused: {reason_code}")
+            return
+        client.subscribe(self.topic, qos=1)
+        logging.info(f"Ingest subscribed to {self.topic} on {self.host}:{self.port}")
+
+    def _on_message(self, client, userdata, message):
+        # Callback na thread do paho: o worker só é tocado dentro do event loop
+        mid, qos = message.mid, message.qos
+        ack = (lambda: client.ack(mid, qos)) if qos > 0 else None
+        self.loop.call_soon_threadsafe(self.worker.submit, message.topic, message.payload, ack)
+
+
+worker = IngestWorker(
+    batch_size=INGEST_BATCH_SIZE,
+    flush_interval=INGEST_FLUSH_INTERVAL,
+    max_attempts=INGEST_MAX_ATTEMPTS,
+    dedupe=Deduplicator(max_size=INGEST_DEDUPE_SIZE, ttl=INGEST_DEDUPE_TTL),
+)
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import logging
+import uuid
+from collections import Counter
+from sqlalchemy import bindparam, update
+from core import database, versions
+from core.cache import cache
+from models.schedule_model import Schedule
+from config import INTEREST_FLUSH_INTERVAL
+
+PENDING_KEY = "interest:pending"
+FLUSHING_KEY = "interest:flushing"
+LOCK_KEY = "interest:flush-lock"
+
+# Um UPDATE em lote (executemany): interest = interest + delta, por id
+_schedule = Schedule.__table__
+ADD_INTEREST = (
+    update(_schedule)
+    .where(_schedule.c.id == bindparam("schedule_id"))
+    .values(interest=_schedule.c.interest + bindparam("delta"))
+)
+
+
+class InterestCounter:
+    """
+    Acumula os votos de interesse e grava periodicamente, um único UPDATE em lote
+    por flush, em vez de travar a linha do horário a cada clique.
+
+    Sem Redis os deltas ficam em memória, por instância. Com Redis ficam num hash
+    compartilhado (HINCRBY); no flush uma instância por vez (lock com expiração)
+    renomeia o hash para `interest:flushing`, grava e apaga. Um `flushing` que
+    sobrou de uma instância que caiu é gravado pelo próximo flush.
+    As leituras somam os deltas pendentes ao valor do banco.
+    """
+    def __init__(self, flush_interval: float = 1.0):
+        self.flush_interval = flush_interval
+        self.pending: Counter[int] = Counter()
+        self.flushing: Counter[int] = Counter()
+        self.redis = None
+        self.instance_id = uuid.uuid4().hex
+        self.task: asyncio.Task | None = None
+        self.votes = 0
+        self.flushes = 0
+        self.rows_updated = 0
+        self.failed = 0
+
+    def use_redis(self, redis_client):
+        self.redis = redis_client
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run(), name="interest-flush")
+
+    async def stop(self):
+        """Encerra a task e grava o que estiver pendente."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+        self.redis = None
+
+    async def add(self, schedule_id: int, delta: int = 1):
+        self.votes += 1
+        if self.redis is not None:
+            try:
+                await self.redis.hincrby(PENDING_KEY, schedule_id, delta)
+                return
+            except Exception as e:
+                logging.error(f"Interest Redis error, counting locally: {e}")
+        self.pending[schedule_id] += delta
+
+    async def pending_for(self, schedule_id: int) -> int:
+        total = self.pending[schedule_id] + self.flushing[schedule_id]
+        if self.redis is not None:
+            try:
+                values = await self.redis.hmget(PENDING_KEY, schedule_id)
+                values += await self.redis.hmget(FLUSHING_KEY, schedule_id)
+                total += sum(int(value) for value in values if value)
+            except Exception as e:
+                logging.error(f"Interest Redis error: {e}")
+        return total
+
+    async def pending_all(self) -> dict[int, int]:
+        """Todos os deltas ainda não gravados (locais e do Redis), só os diferentes de zero."""
+        total = self.pending + self.flushing
+        if self.redis is not None:
+            try:
+                for key in (PENDING_KEY, FLUSHING_KEY):
+                    for schedule_id, value in (await self.redis.hgetall(key)).items():
+                        total[int(schedule_id)] += int(value)
+            except Exception as e:
+                logging.error(f"Interest Redis error: {e}")
+        return {schedule_id: delta for schedule_id, delta in total.items() if delta}
+
+    async def validator(self) -> str | None:
+        """
+        Resumo dos deltas pendentes para o ETag das leituras que mostram o interesse
+        (versions.Conditional): o voto muda a resposta antes do flush versionar "schedule".
+        """
+        deltas = await self.pending_all()
+        if not deltas:
+            return None
+        return hashlib.blake2b(repr(sorted(deltas.items())).encode(), digest_size=6).hexdigest()
+
+    async def flush(self):
+        # `flushing` guarda os deltas locais até o commit; se o flush anterior falhou
+        # (ou foi cancelado no meio), eles entram de novo neste
+        self.flushing.update(self.pending)
+        self.pending = Counter()
+        deltas = Counter(self.flushing)
+        redis_batch = self.redis is not None and await self._claim_redis_batch(deltas)
+        if not +deltas and not -deltas:
+            self.flushing = Counter()
+            if redis_batch:
+                await self._finish_redis_batch()
+            return
+        try:
+            await self._write(deltas)
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"Error flushing interest votes: {getattr(e, 'orig', e)}")
+            if redis_batch:
+                # Os deltas do Redis continuam em `interest:flushing` para o próximo flush
+                await self._release_lock()
+            return
+        self.flushing = Counter()
+        if redis_batch:
+            await self._finish_redis_batch()
+        await cache.invalidate("schedule")
+
+    async def _claim_redis_batch(self, deltas: Counter) -> bool:
+        try:
+            locked = await self.redis.set(LOCK_KEY, self.instance_id, nx=True, px=int(max(self.flush_interval, 1) * 10000))
+            if not locked:
+                return False
+            # Um `flushing` existente é de um flush que não terminou: grava esse primeiro
+            if not await self.redis.exists(FLUSHING_KEY):
+                try:
+                    await self.redis.rename(PENDING_KEY, FLUSHING_KEY)
+                except Exception:
+                    # Sem votos pendentes no Redis
+                    await self._release_lock()
+                    return False
+            batch = await self.redis.hgetall(FLUSHING_KEY)
+            deltas.update({int(schedule_id): int(value) for schedule_id, value in batch.items()})
+            return True
+        except Exception as e:
+            logging.error(f"Interest Redis flush error: {e}")
+            return False
+
+    async def _finish_redis_batch(self):
+        try:
+            await self.redis.delete(FLUSHING_KEY)
+        except Exception as e:
+            logging.error(f"Interest Redis flush error: {e}")
+        await self._release_lock()
+
+    async def _release_lock(self):
+        try:
+            if await self.redis.get(LOCK_KEY) == self.instance_id:
+                await self.redis.delete(LOCK_KEY)
+        except Exception as e:
+            logging.error(f"Interest Redis lock release error: {e}")
+
+    async def _write(self, deltas: Counter):
+        # Ordem fixa dos ids para que flushes concorrentes travem as linhas na mesma ordem
+        rows = [{"schedule_id": schedule_id, "delta": delta} for schedule_id, delta in sorted(deltas.items()) if delta]
+        if not rows:
+            return
+        async for session in database.get_session():
+            await session.execute(ADD_INTEREST, rows)
+            await versions.bump(session, "schedule")
+            await session.commit()
+        self.flushes += 1
+        self.rows_updated += len(rows)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def snapshot(self) -> dict:
+        return {
+            "backend": "redis" if self.redis is not None else "memory",
+            "flush_interval": self.flush_interval,
+            "votes": self.votes,
+            "pending_local": sum(self.pending.values()),
+            "flushes": self.flushes,
+            "rows_updated": self.rows_updated,
+            "failed": self.failed,
+        }
+
+
+counter = InterestCounter(flush_interval=INTEREST_FLUSH_INTERVAL)
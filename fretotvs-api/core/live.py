@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from config import LIVE_MAX_SUBSCRIBERS
+
+CHANNEL = "fretotvs_live"
+PENDING_KEY = "live_events"
+
+
+class Subscription:
+    """
+    Fila com conflação de um cliente: guarda só o estado mais recente de cada
+    ônibus/linha ainda não entregue. Um cliente lento recebe o último valor,
+    nunca uma fila crescente de eventos intermediários.
+    """
+    def __init__(self, line_ids: set[int] | None = None):
+        self.line_ids = line_ids or None
+        self.latest: dict[str, dict] = {}
+        self.ready = asyncio.Event()
+        self.conflated = 0
+
+    def matches(self, payload: dict) -> bool:
+        if self.line_ids is None:
+            return True
+        return bool(self.line_ids.intersection(payload.get("lines", ())))
+
+    def put(self, payload: dict, replace: bool = True):
+        key = payload["key"]
+        if key in self.latest:
+            if not replace:
+                return
+            self.conflated += 1
+            # Reinsere no fim: a ordem de entrega segue a última alteração
+            del self.latest[key]
+        self.latest[key] = payload
+        self.ready.set()
+
+    async def get(self) -> list[dict]:
+        """Espera e devolve tudo o que está pendente (um evento por chave)."""
+        await self.ready.wait()
+        self.ready.clear()
+        events, self.latest = list(self.latest.values()), {}
+        return events
+
+
+class LiveHub:
+    """
+    Distribui alterações de ocupação e de status de linha para os streams abertos.
+
+    Os repositórios chamam `notify(session, payload)` antes do commit. No
+    PostgreSQL vira um `pg_notify` na mesma transação: só é entregue se ela
+    confirmar, e chega a todas as instâncias da API, cada uma ouvindo o canal
+    com uma conexão própria (LISTEN). No SQLite o evento fica na sessão e é
+    publicado em memória depois do commit.
+    """
+    def __init__(self, max_subscribers: int = 1000):
+        self.max_subscribers = max_subscribers
+        self.subscribers: set[Subscription] = set()
+        self.listener: asyncio.Task | None = None
+        self.postgres = False
+        self.published = 0
+        self.conflated = 0
+        self.errors = 0
+
+    def start(self, engine, listen: bool = True):
+        """`listen=False` só publica (processos sem streams abertos, como o ingest.py)."""
+        self.postgres = engine.dialect.name == "postgresql"
+        if self.postgres and listen and (self.listener is None or self.listener.done()):
+            self.listener = asyncio.create_task(self._listen(engine), name="live-listen")
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+
+    def subscribe(self, line_ids: set[int] | None = None) -> Subscription | None:
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+        subscription = Subscription(line_ids)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self.subscribers:
+            self.subscribers.discard(subscription)
+            self.conflated += subscription.conflated
+
+    async def notify(self, session: AsyncSession, payload: dict):
+        if self.postgres:
+            await session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": json.dumps(payload)})
+        else:
+            session.info.setdefault(PENDING_KEY, []).append(payload)
+
+    def publish(self, payload: dict):
+        self.published += 1
+        for subscription in self.subscribers:
+            if subscription.matches(payload):
+                subscription.put(payload)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            self.publish(json.loads(payload))
+        except ValueError as e:
+            self.errors += 1
+            logging.error(f"Invalid live notification: {e}")
+
+    async def _listen(self, engine):
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    await raw.add_listener(CHANNEL, self._on_notification)
+                    try:
+                        # Confere a conexão de tempos em tempos; se cair, reconecta
+                        while True:
+                            await asyncio.sleep(30)
+                            await raw.execute("SELECT 1")
+                    finally:
+                        await raw.remove_listener(CHANNEL, self._on_notification)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Live listener error: {e}")
+                await asyncio.sleep(1)
+
+    def snapshot(self) -> dict:
+        return {
+            "backend": "postgres" if self.postgres else "memory",
+            "subscribers": len(self.subscribers),
+            "max_subscribers": self.max_subscribers,
+            "published": self.published,
+            "conflated": self.conflated + sum(subscription.conflated for subscription in self.subscribers),
+            "errors": self.errors,
+        }
+
+
+hub = LiveHub(max_subscribers=LIVE_MAX_SUBSCRIBERS)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session):
+    for payload in session.info.pop(PENDING_KEY, ()):
+        hub.publish(payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def bus_event(bus, previous_line_id: int | None = None, deleted: bool = False) -> dict:
+    """Estado de um ônibus; `lines` diz a que filtros de linha o evento interessa."""
+    lines = {line_id for line_id in (bus.active_line_id, previous_line_id) if line_id is not None}
+    payload = {
+        "key": f"bus:{bus.prefix}",
+        "type": "bus",
+        "prefix": bus.prefix,
+        "line_id": bus.active_line_id,
+        "capacity": bus.capacity,
+        "occupied": bus.occupied,
+        "lines": sorted(lines),
+    }
+    if deleted:
+        payload["deleted"] = True
+    return payload
+
+
+def line_event(line, deleted: bool = False) -> dict:
+    payload = {"key": f"line:{line.id}", "type": "line", "line_id": line.id, "active": line.active, "lines": [line.id]}
+    if deleted:
+        payload["deleted"] = True
+    return payload
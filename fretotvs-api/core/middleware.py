@@ -0,0 +1,204 @@
+from datetime import datetime
+import logging
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from core import audit
+from core.compression import CODECS, compressor, encoded_etag
+from config import TRUSTED_PROXY_HOPS
+
+CSP = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline'; "
+    "style-src 'self' 'unsafe-inline'; "
+    "img-src 'self' data:; "
+    "connect-src 'self'; "
+    "font-src 'self'; "
+    "object-src 'none'; "
+    "base-uri 'self'; "
+    "form-action 'self';"
+)
+
+SECURITY_HEADERS = {
+    "Content-Security-Policy": CSP,
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains; preload",
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
+    "Cache-Control": "no-store, no-cache, must-revalidate, private",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+REMOVED_HEADERS = ("server", "x-powered-by")
+
+# Respostas com ETag podem ficar no cache do navegador, mas sempre revalidadas (If-None-Match)
+REVALIDATE_HEADERS = {"Cache-Control": "private, no-cache"}
+CACHE_HEADERS = ("Cache-Control", "Pragma", "Expires")
+
+
+def get_header(scope: Scope, name: bytes) -> str | None:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_ip(scope: Scope, trusted_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """
+    IP do cliente para rate limit e auditoria. As entradas à esquerda do
+    X-Forwarded-For vêm do próprio cliente; só vale a que o proxy confiável
+    mais externo anexou, `trusted_hops` posições a partir da direita.
+    """
+    if trusted_hops > 0:
+        x_forwarded_for = get_header(scope, b"x-forwarded-for")
+        if x_forwarded_for:
+            entries = [entry.strip() for entry in x_forwarded_for.split(",")]
+            if len(entries) >= trusted_hops:
+                return entries[-trusted_hops]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AuditMiddleware:
+    """
+    Middleware ASGI que captura o status da resposta no `send`. Toda
+    requisição entra nos rollups (audit.writer.count); só as amostradas
+    (should_audit) viram entrada detalhada, enfileirada depois da resposta.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampled = audit.writer.should_audit(scope["path"])
+        timestamp = datetime.utcnow()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            audit.writer.count(timestamp, getattr(route, "path", None), status_code)
+            if sampled:
+                ip = client_ip(scope)
+                await audit.writer.submit({
+                    "ip": ip,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "timestamp": timestamp,
+                    "user_agent": get_header(scope, b"user-agent"),
+                    "status_code": status_code,
+                })
+                logging.debug(f"Audit: {scope['method']} {scope['path']} from {ip} -> {status_code}")
+
+
+class SecurityHeadersMiddleware:
+    """Middleware ASGI que injeta os headers de segurança no início da resposta."""
+    def __init__(self, app: ASGIApp, headers: dict[str, str] | None = None):
+        self.app = app
+        self.headers = SECURITY_HEADERS if headers is None else headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for header in REMOVED_HEADERS:
+                    del headers[header]
+                revalidate = "etag" in headers
+                for key, value in self.headers.items():
+                    if not (revalidate and key in CACHE_HEADERS):
+                        headers[key] = value
+                if revalidate:
+                    headers.update(REVALIDATE_HEADERS)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# text/event-stream (/live) fica de fora: é streaming e nunca chega inteiro
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI no lugar do GZipMiddleware: escolhe zstd, br ou gzip pelo
+    Accept-Encoding e comprime pelo `compressor` (core/compression.py), que
+    guarda as variantes das respostas com ETag. A variante comprimida sai com
+    a codificação no ETag ('"v1-br"'). Só comprime corpos que chegam numa
+    mensagem só; respostas em streaming passam direto.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        choice = compressor.choose(get_header(scope, b"accept-encoding"), scope["path"])
+        start_message: Message | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if message["status"] == 304 and "etag" in headers:
+                    # O 304 confirma a variante que o cliente tem: devolve o ETag dela
+                    if_none_match = get_header(scope, b"if-none-match") or ""
+                    for encoding in CODECS:
+                        if encoded_etag(headers["etag"], encoding) in if_none_match:
+                            headers["ETag"] = encoded_etag(headers["etag"], encoding)
+                            break
+                    headers.add_vary_header("Accept-Encoding")
+                    passthrough = True
+                    await send(message)
+                    return
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if message.get("more_body", False) or choice is None or len(body) < compressor.min_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            encoding, level = choice
+            cacheable = scope["method"] == "GET" and "etag" in headers
+            body = compressor.compress(body, encoding, level, cacheable)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            # Bytes diferentes por codificação: cada variante tem o próprio validador forte
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], encoding)
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -5,10 +5,11 @@ from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_session
+from core.auth_cache import user_cache
 from models import user_model
 from sqlmodel import select
 from schemas import jwt_schema
-from config import ALGORITHM, SECRET_KEY
+from config import ALGORITHM, SECRET_KEY, ADMIN_USERS
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
@@ -18,6 +19,10 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: As
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached = user_cache.get(token)
+    if cached is not None:
+        _, user_data = cached
+        return user_model.User(**user_data)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         name = payload.get("sub")
@@ -39,4 +44,12 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: As
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return user
\ No newline at end of file
+    user_cache.set(token, payload, user.model_dump())
+    return user
+
+
+async def require_admin(current_user: user_model.User = Depends(get_current_user)):
+    """Só os usuários listados em ADMIN_USERS; o cadastro (POST /user/) é aberto, então autenticar não basta."""
+    if current_user.totvs_id not in ADMIN_USERS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
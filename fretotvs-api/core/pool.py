@@ -0,0 +1,74 @@
+import time
+from collections import deque
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolStats:
+    """Tempos de espera no checkout do pool (últimas `window` amostras) e timeouts."""
+    def __init__(self, window: int = 1024):
+        self.waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self.waits.append(seconds)
+        self.max_wait = max(self.max_wait, seconds)
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.waits)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3)
+
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "wait_ms_p50": percentile(0.50),
+            "wait_ms_p95": percentile(0.95),
+            "wait_ms_p99": percentile(0.99),
+            "wait_ms_max": round(self.max_wait * 1000, 3),
+        }
+
+
+stats = PoolStats()
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool que mede quanto cada checkout esperou por uma conexão.
+    Inclui o tempo de abrir uma conexão nova (handshake do Cloud SQL Connector).
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            stats.timeouts += 1
+            raise
+        finally:
+            stats.record_wait(time.perf_counter() - start)
+
+    def _create_connection(self):
+        stats.connects += 1
+        return super()._create_connection()
+
+
+def pool_status(engine) -> dict:
+    pool = engine.pool if engine is not None else None
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {"pool": type(pool).__name__ if pool else None, **stats.snapshot()}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "in_use": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **stats.snapshot(),
+    }
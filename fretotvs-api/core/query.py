@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import date, datetime, time
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Tipos que o cursor guarda como texto ISO e precisa reconstruir na leitura
+_ISO_TYPES = (datetime, date, time)
+
+
+def encode_cursor(values: tuple) -> str:
+    """Cursor opaco: os valores da ordenação da última linha da página, em base64."""
+    raw = json.dumps(jsonable_encoder(list(values)), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, order_by: tuple) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(order_by):
+            raise ValueError(cursor)
+        return tuple(_from_json(column, value) for column, value in zip(order_by, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _from_json(column, value):
+    if value is None:
+        raise ValueError("null key")
+    python_type = column.type.python_type
+    if issubclass(python_type, _ISO_TYPES):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def where_all(statement, *predicates):
+    """Aplica só os filtros informados (None é ignorado)."""
+    for predicate in predicates:
+        if predicate is not None:
+            statement = statement.where(predicate)
+    return statement
+
+
+async def fetch_page(session: AsyncSession, statement, order_by: tuple, limit: int | None, cursor: str | None = None):
+    """
+    Paginação por keyset: ordena por `order_by` (colunas não nulas, terminando
+    numa chave única) e continua estritamente depois do cursor. O custo de cada
+    página é o do índice até `limit` linhas, não importa quão fundo ela está.
+
+    Retorna (linhas, próximo cursor ou None). Sem `limit` devolve tudo.
+    """
+    if cursor:
+        statement = statement.where(tuple_(*order_by) > tuple_(*decode_cursor(cursor, order_by)))
+    statement = statement.order_by(*order_by)
+    if limit is not None:
+        statement = statement.limit(limit + 1)
+    rows = (await session.execute(statement)).scalars().all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(tuple(getattr(last, column.key) for column in order_by))
+    return rows, next_cursor
@@ -0,0 +1,149 @@
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+import jwt
+from fastapi import HTTPException, Request, status
+from jwt.exceptions import InvalidTokenError
+from core.middleware import client_ip
+from config import SECRET_KEY, ALGORITHM, RATE_LIMIT_ENABLED, RATE_LIMIT_MAX_KEYS
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Token bucket atômico no Redis: capacidade `times`, reposição de `times` fichas a cada `period_ms`.
+# O relógio é o do próprio Redis, então instâncias diferentes da API enxergam o mesmo tempo.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2]) / tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[3]))
+return retry
+"""
+
+
+def parse_rule(rule: str) -> tuple[int, int]:
+    """'10/minute' ou '10/60' -> (10, 60 segundos)."""
+    times, _, period = rule.partition("/")
+    seconds = PERIODS.get(period.strip()) or int(period)
+    return int(times), seconds
+
+
+class SlidingWindowStore:
+    """
+    Janela deslizante em memória (sem Redis): guarda os instantes das últimas
+    `times` requisições por chave. As chaves menos usadas saem acima de `max_keys`.
+    """
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self.windows: OrderedDict[str, deque] = OrderedDict()
+
+    async def hit(self, key: str, times: int, seconds: int) -> float:
+        """Registra a requisição e devolve 0, ou os segundos até a próxima ser aceita."""
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = deque()
+            while len(self.windows) > self.max_keys:
+                self.windows.popitem(last=False)
+        else:
+            self.windows.move_to_end(key)
+        while window and window[0] <= now - seconds:
+            window.popleft()
+        if len(window) >= times:
+            return window[0] + seconds - now
+        window.append(now)
+        return 0.0
+
+
+class RedisTokenBucketStore:
+    def __init__(self, client):
+        self.client = client
+        self.script = client.register_script(TOKEN_BUCKET_LUA)
+
+    async def hit(self, key: str, times: int, seconds: int) -> float:
+        retry_ms = await self.script(keys=[f"ratelimit:{key}"], args=[times, times, seconds * 1000])
+        return int(retry_ms) / 1000
+
+
+class RateLimiter:
+    """Guarda o backend atual: Redis se REDIS_URL estiver configurado, senão memória."""
+    def __init__(self):
+        self.store = SlidingWindowStore(max_keys=RATE_LIMIT_MAX_KEYS)
+        self.backend = "memory"
+        self.rejected: dict[str, int] = {}
+        self.errors = 0
+
+    def init_redis(self, client):
+        self.store = RedisTokenBucketStore(client)
+        self.backend = "redis"
+
+    async def hit(self, key: str, times: int, seconds: int) -> float:
+        try:
+            return await self.store.hit(key, times, seconds)
+        except Exception as e:
+            # Redis fora do ar não derruba a API: a requisição passa e o erro é contado
+            self.errors += 1
+            logging.error(f"Rate limit backend error: {e}")
+            return 0.0
+
+    def snapshot(self) -> dict:
+        return {"backend": self.backend, "enabled": RATE_LIMIT_ENABLED, "rejected": dict(self.rejected), "errors": self.errors}
+
+
+limiter = RateLimiter()
+
+
+def user_or_ip(request: Request) -> str:
+    """O `sub` do bearer token quando válido; senão o IP do cliente."""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except InvalidTokenError:
+            pass
+    return f"ip:{client_ip(request.scope)}"
+
+
+def ip(request: Request) -> str:
+    return f"ip:{client_ip(request.scope)}"
+
+
+class RateLimit:
+    """
+    Dependência de rota com limite próprio, declarada no módulo do router:
+
+        login_limit = RateLimit("login", "10/minute")
+        @router.post("/login", dependencies=[Depends(login_limit)])
+
+    Estourado o limite, responde 429 com Retry-After.
+    """
+    def __init__(self, name: str, rule: str, key=ip):
+        self.name = name
+        self.times, self.seconds = parse_rule(rule)
+        self.key = key
+
+    async def __call__(self, request: Request):
+        if not RATE_LIMIT_ENABLED or self.times <= 0:
+            return
+        retry_after = await limiter.hit(f"{self.name}:{self.key(request)}", self.times, self.seconds)
+        if retry_after > 0:
+            limiter.rejected[self.name] = limiter.rejected.get(self.name, 0) + 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
@@ -0,0 +1,208 @@
+import asyncio
+import bisect
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core import versions
+from models.schedule_model import Schedule
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+WEEK_SECONDS = 7 * 24 * 3600
+
+
+def minute_of_week(day_week: int, at: time) -> int:
+    """Minutos desde segunda 00:00 (day_week 1 = segunda)."""
+    return (day_week - 1) * 1440 + at.hour * 60 + at.minute
+
+
+def week_start(at: datetime) -> datetime:
+    return (at - timedelta(days=at.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def seconds_of_week(at: datetime) -> int:
+    return at.weekday() * 86400 + at.hour * 3600 + at.minute * 60 + at.second
+
+
+@dataclass(frozen=True)
+class TimetableEntry:
+    schedule_id: int
+    line_id: int
+    day_week: int
+    departure_time: time
+    arrival_time: time
+
+
+class LineTimetable:
+    """
+    Partidas de uma linha na semana: `minutes` (minuto da semana, ordenado) e
+    `ids` alinhados. Cada dia é um trecho contíguo, então a busca por
+    bissecção já atravessa a virada do dia e da semana.
+    """
+    __slots__ = ("minutes", "ids")
+
+    def __init__(self):
+        self.minutes = array("l")
+        self.ids = array("l")
+
+    def _position(self, minute: int, schedule_id: int) -> int:
+        # Empate no minuto: ordem por id, como na listagem
+        i = bisect.bisect_left(self.minutes, minute)
+        while i < len(self.minutes) and self.minutes[i] == minute and self.ids[i] < schedule_id:
+            i += 1
+        return i
+
+    def insert(self, minute: int, schedule_id: int):
+        i = self._position(minute, schedule_id)
+        self.minutes.insert(i, minute)
+        self.ids.insert(i, schedule_id)
+
+    def remove(self, minute: int, schedule_id: int):
+        i = self._position(minute, schedule_id)
+        if i < len(self.ids) and self.ids[i] == schedule_id:
+            del self.minutes[i]
+            del self.ids[i]
+
+    def following(self, after_minute: int, limit: int):
+        """(posição na semana, id) das próximas `limit` partidas depois do minuto, dando a volta na semana."""
+        count = len(self.ids)
+        start = bisect.bisect_right(self.minutes, after_minute)
+        for k in range(min(limit, count)):
+            wraps, i = divmod(start + k, count)
+            yield wraps * 7 * 1440 + self.minutes[i], self.ids[i]
+
+
+class TimetableIndex:
+    """
+    Índice em memória da grade de horários, para "próximas partidas" sem ir ao banco.
+
+    Carregado inteiro do banco na primeira consulta e sempre que a versão
+    "timetable" (incrementada pelas escritas de horários em schedule_repo) não
+    é a que o índice conhece, ou seja, quando outra instância escreveu. As
+    escritas desta instância são aplicadas no lugar (applied) sem recarregar.
+    Os votos de interesse não mudam a grade e não invalidam o índice.
+    """
+    def __init__(self):
+        self.lines: dict[int, LineTimetable] = {}
+        self.entries: dict[int, TimetableEntry] = {}
+        self.version: int | None = None
+        self.lock = asyncio.Lock()
+        # Arrays da consulta em lote (ids ordenados e minuto da semana), montados sob demanda
+        self._batch_arrays = None
+        self.stats = Counter()
+
+    async def _current_version(self, session: AsyncSession) -> int | None:
+        current = (await versions.current(session, ("timetable",))).get("timetable")
+        return current[0] if current else None
+
+    async def ensure_fresh(self, session: AsyncSession):
+        version = await self._current_version(session)
+        if version is not None and version == self.version:
+            return
+        async with self.lock:
+            if self.version is None or self.version != version:
+                await self._reload(session, version)
+
+    async def _reload(self, session: AsyncSession, version: int | None):
+        result = await session.execute(
+            select(Schedule.id, Schedule.line_id, Schedule.day_week, Schedule.departure_time, Schedule.arrival_time)
+            .order_by(Schedule.line_id, Schedule.day_week, Schedule.departure_time, Schedule.id)
+        )
+        lines: dict[int, LineTimetable] = {}
+        entries: dict[int, TimetableEntry] = {}
+        for row in result.all():
+            entry = TimetableEntry(*row)
+            entries[entry.schedule_id] = entry
+            timetable = lines.setdefault(entry.line_id, LineTimetable())
+            # Já vem em ordem: append em vez de insert
+            timetable.minutes.append(minute_of_week(entry.day_week, entry.departure_time))
+            timetable.ids.append(entry.schedule_id)
+        self.lines, self.entries, self._batch_arrays = lines, entries, None
+        self.version = version
+        self.stats["reloads"] += 1
+
+    def _remove(self, schedule_id: int):
+        entry = self.entries.pop(schedule_id, None)
+        if entry is not None and entry.line_id in self.lines:
+            self.lines[entry.line_id].remove(minute_of_week(entry.day_week, entry.departure_time), schedule_id)
+
+    async def applied(self, session: AsyncSession, schedule: Schedule | None = None, removed_id: int | None = None):
+        """
+        Chamado por schedule_repo depois do commit de um horário criado,
+        alterado (schedule) ou apagado (removed_id).
+        """
+        if self.version is None:
+            return
+        async with self.lock:
+            schedule_id = schedule.id if schedule is not None else removed_id
+            self._remove(schedule_id)
+            if schedule is not None:
+                entry = TimetableEntry(schedule.id, schedule.line_id, schedule.day_week, schedule.departure_time, schedule.arrival_time)
+                self.entries[entry.schedule_id] = entry
+                self.lines.setdefault(entry.line_id, LineTimetable()).insert(
+                    minute_of_week(entry.day_week, entry.departure_time), entry.schedule_id
+                )
+            self._batch_arrays = None
+            self.stats["incremental"] += 1
+            # Só esta escrita desde a última carga: o índice continua atual. Senão recarrega na próxima consulta
+            version = await self._current_version(session)
+            self.version = version if self.version is not None and version == self.version + 1 else None
+
+    def next_departures(self, line_id: int, at: datetime, limit: int) -> list[tuple[TimetableEntry, datetime]]:
+        timetable = self.lines.get(line_id)
+        if timetable is None:
+            return []
+        start = week_start(at)
+        return [
+            (self.entries[schedule_id], start + timedelta(minutes=minute))
+            for minute, schedule_id in timetable.following(seconds_of_week(at) // 60, limit)
+        ]
+
+    def next_occurrences(self, schedule_ids: list[int], at: datetime) -> list[tuple[int, datetime]]:
+        """
+        Próxima partida de cada horário depois de `at`, de uma vez; ids
+        desconhecidos ficam de fora. Com NumPy o cálculo é vetorizado.
+        """
+        start = week_start(at)
+        now = seconds_of_week(at)
+        if numpy is None:
+            result = []
+            for schedule_id in schedule_ids:
+                entry = self.entries.get(schedule_id)
+                if entry is None:
+                    continue
+                delta = (minute_of_week(entry.day_week, entry.departure_time) * 60 - now) % WEEK_SECONDS or WEEK_SECONDS
+                result.append((schedule_id, at.replace(microsecond=0) + timedelta(seconds=delta)))
+            return result
+
+        if self._batch_arrays is None:
+            ids = numpy.fromiter(sorted(self.entries), dtype=numpy.int64, count=len(self.entries))
+            minutes = numpy.fromiter(
+                (minute_of_week(self.entries[i].day_week, self.entries[i].departure_time) for i in ids.tolist()),
+                dtype=numpy.int64, count=len(ids),
+            )
+            self._batch_arrays = (ids, minutes)
+        ids, minutes = self._batch_arrays
+        wanted = numpy.asarray(schedule_ids, dtype=numpy.int64)
+        if not len(ids) or not len(wanted):
+            return []
+        positions = numpy.minimum(numpy.searchsorted(ids, wanted), len(ids) - 1)
+        found = ids[positions] == wanted
+        seconds = minutes[positions[found]] * 60 - now
+        seconds %= WEEK_SECONDS
+        seconds[seconds == 0] = WEEK_SECONDS
+        # Segundos desde o início da semana de `at` até cada partida
+        offsets = seconds + now
+        return [
+            (schedule_id, start + timedelta(seconds=offset))
+            for schedule_id, offset in zip(wanted[found].tolist(), offsets.tolist())
+        ]
+
+
+index = TimetableIndex()
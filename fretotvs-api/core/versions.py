@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_session
+from core.compression import strip_encoding
+from models.version_model import TableVersion
+
+
+async def bump(session: AsyncSession, *tables: str):
+    """Incrementa a versão das tabelas na transação da escrita; chamar antes do commit."""
+    await session.execute(
+        update(TableVersion)
+        .where(TableVersion.name.in_(tables))
+        .values(version=TableVersion.version + 1, updated_at=datetime.utcnow())
+    )
+
+
+async def current(session: AsyncSession, tables: tuple[str, ...]) -> dict[str, tuple[int, datetime]]:
+    result = await session.execute(
+        select(TableVersion.name, TableVersion.version, TableVersion.updated_at).where(TableVersion.name.in_(tables))
+    )
+    return {name: (version, updated_at) for name, version, updated_at in result.all()}
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # As variantes comprimidas levam a codificação no ETag (CompressionMiddleware)
+    return etag in (strip_encoding(tag.strip()) for tag in header.split(","))
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    # Last-Modified tem resolução de segundos: uma escrita no mesmo segundo da
+    # resposta anterior não mudaria a data, então só confia nela depois de 1s
+    if last_modified > datetime.utcnow() - timedelta(seconds=1):
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+class Conditional:
+    """
+    Dependência de GET condicional, declarada com as tabelas de que a resposta depende:
+
+        lines_conditional = Conditional("line", "schedule")
+        async def read_lines(validators: dict = Depends(lines_conditional)): ...
+
+    Lê só as versões das tabelas. Se o cliente já tem a representação atual
+    (If-None-Match, ou If-Modified-Since sem If-None-Match) responde 304 antes
+    de qualquer consulta do ORM; senão coloca ETag e Last-Modified na resposta
+    e devolve os mesmos headers para rotas que montam a própria Response.
+
+    `pending` (corrotina sem argumentos) entra no ETag o que a resposta tem de
+    ainda não versionado, como os votos de interesse antes do flush; enquanto
+    houver algo pendente, If-Modified-Since não basta para o 304.
+    """
+    def __init__(self, *tables: str, pending=None):
+        self.tables = tables
+        self.pending = pending
+
+    async def __call__(self, request: Request, response: Response, session: AsyncSession = Depends(get_session)) -> dict[str, str]:
+        versions = await current(session, self.tables)
+        if len(versions) < len(self.tables):
+            return {}
+        token = await self.pending() if self.pending else None
+        etag = '"' + "-".join(f"{table}{versions[table][0]}" for table in self.tables) + (f"-p{token}" if token else "") + '"'
+        last_modified = max(updated_at for _, updated_at in versions.values())
+        headers = {
+            "ETag": etag,
+            "Last-Modified": format_datetime(last_modified.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True),
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if (if_none_match is not None and _etag_matches(if_none_match, etag)) or (
+            if_none_match is None and if_modified_since and not token and _not_modified_since(if_modified_since, last_modified)
+        ):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+        return headers
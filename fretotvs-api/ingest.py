@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import signal
+import redis.asyncio as redis
+from core import database, ingest, live
+from core.cache import cache
+from config import REDIS_URL, MQTT_BROKER, MQTT_PORT, MQTT_TOPIC, MQTT_CLIENT_ID, MQTT_USERNAME, MQTT_PASSWORD, INGEST_STATS_INTERVAL
+
+# Worker de ingestão: consome os eventos MQTT dos dispositivos (bus/#) e grava
+# em lote no mesmo banco da API. Roda como processo separado: python ingest.py
+
+
+async def report_stats(interval: float):
+    # Vazão e atraso por intervalo: pending e max_lag_ms crescendo indicam que o banco não acompanha
+    applied = 0
+    while True:
+        await asyncio.sleep(interval)
+        snapshot = ingest.worker.snapshot(reset_lag=True)
+        rate = (snapshot.get("applied", 0) - applied) / interval
+        applied = snapshot.get("applied", 0)
+        logging.info(
+            f"Ingest: {rate:.0f} events/s, pending {snapshot['pending']}, "
+            f"last batch {snapshot['last_apply_ms']} ms, max lag {snapshot['max_lag_ms']} ms, "
+            f"dead-lettered {snapshot.get('dead_lettered', 0)}"
+        )
+
+
+async def run():
+    await database.init_engine()
+    await database.create_db_and_tables()
+    live.hub.start(database.engine, listen=False)
+    redis_client = None
+    if REDIS_URL:
+        # Invalidações do cache de respostas chegam às instâncias da API pelo pub/sub
+        redis_client = redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+        cache.start(redis_client)
+    source = ingest.MqttSource(
+        ingest.worker, MQTT_BROKER, MQTT_PORT, MQTT_TOPIC,
+        client_id=MQTT_CLIENT_ID, username=MQTT_USERNAME, password=MQTT_PASSWORD,
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    ingest.worker.start()
+    source.start()
+    stats_task = asyncio.create_task(report_stats(INGEST_STATS_INTERVAL)) if INGEST_STATS_INTERVAL > 0 else None
+    try:
+        await stop.wait()
+    finally:
+        if stats_task is not None:
+            stats_task.cancel()
+        source.stop()
+        await ingest.worker.stop()
+        await live.hub.stop()
+        await cache.stop()
+        if redis_client is not None:
+            await redis_client.aclose()
+        logging.info(f"Ingest stopped: {ingest.worker.snapshot()}")
+        await database.close_connector()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
@@ -1,11 +1,47 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from datetime import datetime, timezone
 
 class AuditLog(SQLModel, table=True):
+    # No PostgreSQL a tabela é particionada por timestamp (core/audit_partitions.py)
+    __table_args__ = (Index("ix_auditlog_timestamp_id", "timestamp", "id"),)
+
     id: int | None = Field(default=None, primary_key=True)
     ip: str
+    # HMAC do IP (utils.encrypt.blind_index) para buscas sem descriptografar
+    ip_index: str | None = Field(default=None, index=True)
     method: str
     path: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     user_agent: str | None = None
-    status_code: int | None = None
\ No newline at end of file
+    status_code: int | None = None
+
+
+class AuditRollup(SQLModel, table=True):
+    """Contagem de requisições por hora, rota e status code."""
+    bucket: datetime = Field(primary_key=True)
+    path: str = Field(primary_key=True)
+    status_code: int = Field(primary_key=True)
+    count: int = Field(default=0)
+
+
+class AuditLogRead(SQLModel):
+    id: int
+    ip: str
+    method: str
+    path: str
+    timestamp: datetime
+    user_agent: str | None = None
+    status_code: int | None = None
+
+
+class AuditLogPage(SQLModel):
+    items: list[AuditLogRead] = []
+    next_cursor: str | None = None
+
+
+class AuditRollupRead(SQLModel):
+    bucket: datetime
+    path: str
+    total: int
+    status_codes: dict[int, int] = {}
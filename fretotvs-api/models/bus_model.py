@@ -1,4 +1,6 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index, text
+from pydantic import model_validator
 
 class BusBase(SQLModel):
     prefix: int
@@ -6,6 +8,12 @@ class BusBase(SQLModel):
     occupied: int = Field(default=0, ge=0, description="Number of occupied seats (must be >= 0)")
 
 class Bus(BusBase, table=True):
+    __table_args__ = (
+        Index("ix_bus_active_line_prefix", "active_line_id", "prefix"),
+        # Filtro "lotado / com lugar" direto no índice
+        Index("ix_bus_full_prefix", text("(occupied >= capacity)"), "prefix"),
+    )
+
     prefix: int = Field(primary_key=True)
     capacity: int | None = Field(default=None)
     occupied: int = Field(default=0, ge=0, description="Number of occupied seats (must be >= 0)")
@@ -13,7 +21,15 @@ class Bus(BusBase, table=True):
 
 
 class BusOccupancyUpdate(SQLModel):
-    occupied: int = Field(ge=0, description="Number of occupied seats (must be >= 0)")
+    """Ocupação absoluta (`occupied`) ou relativa (`delta`, ex: +1 no embarque, -1 na saída)."""
+    occupied: int | None = Field(default=None, ge=0, description="Number of occupied seats (must be >= 0)")
+    delta: int | None = Field(default=None, description="Change in occupied seats (e.g. 1 for a boarding)")
+
+    @model_validator(mode="after")
+    def check_exactly_one(self):
+        if (self.occupied is None) == (self.delta is None):
+            raise ValueError("Provide exactly one of 'occupied' or 'delta'")
+        return self
 
 
 class BusOccupancyInfo(SQLModel):
@@ -22,4 +38,9 @@ class BusOccupancyInfo(SQLModel):
     occupied: int
     available_seats: int
     occupancy_percentage: float
-    is_full: bool
\ No newline at end of file
+    is_full: bool
+
+
+class BusPage(SQLModel):
+    items: list[Bus] = []
+    next_cursor: str | None = None
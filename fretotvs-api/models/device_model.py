@@ -0,0 +1,45 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import BigInteger, Column
+
+
+class Driver(SQLModel, table=True):
+    """Crachá de motorista aceito pelos dispositivos dos ônibus."""
+    badge_id: str = Field(primary_key=True)
+    name: str
+    active: bool = Field(default=True)
+    # Revisão do cadastro (versão "registry") em que a linha mudou pela última vez
+    revision: int = Field(sa_column=Column(BigInteger, nullable=False, index=True))
+
+
+class DeviceRoute(SQLModel, table=True):
+    """Rota que o motorista pode escolher no dispositivo, com a lotação do ônibus."""
+    __tablename__ = "device_route"
+
+    name: str = Field(primary_key=True)
+    capacity: int
+    active: bool = Field(default=True)
+    revision: int = Field(sa_column=Column(BigInteger, nullable=False, index=True))
+
+
+class DriverUpdate(SQLModel):
+    badge_id: str
+    name: str
+    active: bool = True
+
+
+class DeviceRouteUpdate(SQLModel):
+    name: str
+    capacity: int = Field(gt=0)
+    active: bool = True
+
+
+class RegistryDelta(SQLModel):
+    """
+    Mudanças do cadastro depois da revisão `since` do dispositivo. Com
+    full=True é o cadastro inteiro (só os ativos) e substitui o que o
+    dispositivo tinha; senão as linhas inativas são remoções.
+    """
+    version: int
+    full: bool
+    drivers: list[Driver] = []
+    routes: list[DeviceRoute] = []
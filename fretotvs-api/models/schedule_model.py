@@ -1,9 +1,12 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from datetime import datetime, time
 from pydantic import validator
 from enum import IntEnum
 
 class City(SQLModel, table=True):
+    __table_args__ = (Index("ix_city_state", "state"),)
+
     id: int | None = Field(default=None, primary_key=True)
     state: str
     country: str
@@ -12,6 +15,8 @@ class City(SQLModel, table=True):
 
 
 class Line(SQLModel, table=True):
+    __table_args__ = (Index("ix_line_city_active", "city_id", "active"),)
+
     id: int | None = Field(default=None, primary_key=True)
     city_id: int | None = Field(default=None, foreign_key="city.id")
     name: str = Field(unique=True, index=True)
@@ -53,6 +58,12 @@ class LineStatusUpdate(SQLModel):
 
 
 class Schedule(SQLModel, table=True):
+    # Índices das listagens paginadas: por linha/dia em ordem de partida e pela grade inteira
+    __table_args__ = (
+        Index("ix_schedule_line_day_departure", "line_id", "day_week", "departure_time", "id"),
+        Index("ix_schedule_day_departure", "day_week", "departure_time", "id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     line_id: int = Field(foreign_key="line.id")
     arrival_time: time
@@ -103,4 +114,28 @@ class CityRead(SQLModel):
     lines: list[LineRead] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class LinePage(SQLModel):
+    items: list[LineRead] = []
+    next_cursor: str | None = None
+
+
+class SchedulePage(SQLModel):
+    items: list[Schedule] = []
+    next_cursor: str | None = None
+
+
+class NextDeparture(SQLModel):
+    schedule_id: int
+    line_id: int
+    day_week: int
+    departure_time: time
+    arrival_time: time
+    departs_at: datetime
+
+
+class NextOccurrence(SQLModel):
+    schedule_id: int
+    departs_at: datetime
@@ -6,3 +6,6 @@ class User(SQLModel, table=True):
     password: str
 
 
+class UserPage(SQLModel):
+    items: list[User] = []
+    next_cursor: str | None = None
@@ -0,0 +1,15 @@
+from sqlmodel import SQLModel, Field
+from sqlalchemy import BigInteger, Column
+from datetime import datetime
+
+# Tabelas cujas escritas incrementam a versão (ETag dos GETs); "registry" cobre
+# driver e device_route e também numera as revisões do cadastro dos dispositivos;
+# "timetable" muda só com a grade de horários (não com os votos de interesse)
+VERSIONED_TABLES = ("city", "line", "schedule", "bus", "registry", "timetable")
+
+
+class TableVersion(SQLModel, table=True):
+    """Versão monotônica por tabela, incrementada pelas escritas dos repositórios."""
+    name: str = Field(primary_key=True)
+    version: int = Field(sa_column=Column(BigInteger, nullable=False))
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,110 @@
+import base64
+from collections import defaultdict
+from datetime import datetime
+from cryptography.fernet import InvalidToken
+from fastapi import HTTPException
+from sqlmodel import select
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.audit_model import AuditLog, AuditLogRead, AuditLogPage, AuditRollup, AuditRollupRead
+from utils import encrypt
+from config import SECRET_KEY, BLIND_INDEX_KEY
+
+
+def encode_cursor(timestamp: datetime, entry_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{entry_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        timestamp, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(entry_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _decrypt_ip(value: str) -> str:
+    try:
+        return encrypt.decrypt_data(SECRET_KEY, value)
+    except InvalidToken:
+        # Linha gravada com outra chave; não derruba a página inteira
+        return "<undecryptable>"
+
+
+async def search_audit_logs(
+    session: AsyncSession,
+    ip: str | None = None,
+    path: str | None = None,
+    status_code: int | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> AuditLogPage:
+    """
+    Filtra a auditoria no banco; o IP é comparado pelo índice cego,
+    então só as linhas retornadas são descriptografadas.
+    Paginação por keyset em (timestamp, id), do mais recente para o mais antigo.
+    """
+    statement = select(AuditLog)
+    if ip:
+        statement = statement.where(AuditLog.ip_index == encrypt.blind_index(BLIND_INDEX_KEY, ip))
+    if path:
+        statement = statement.where(AuditLog.path.startswith(path, autoescape=True))
+    if status_code is not None:
+        statement = statement.where(AuditLog.status_code == status_code)
+    if start:
+        statement = statement.where(AuditLog.timestamp >= start)
+    if end:
+        statement = statement.where(AuditLog.timestamp < end)
+    if cursor:
+        statement = statement.where(tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(*decode_cursor(cursor)))
+    statement = statement.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(limit + 1)
+
+    result = await session.execute(statement)
+    entries = result.scalars().all()
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1].timestamp, entries[-1].id)
+
+    items = [
+        AuditLogRead(
+            id=entry.id,
+            ip=_decrypt_ip(entry.ip),
+            method=entry.method,
+            path=entry.path,
+            timestamp=entry.timestamp,
+            user_agent=entry.user_agent,
+            status_code=entry.status_code,
+        )
+        for entry in entries
+    ]
+    return AuditLogPage(items=items, next_cursor=next_cursor)
+
+
+async def get_audit_rollups(
+    session: AsyncSession,
+    path: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> list[AuditRollupRead]:
+    """Contagens por hora e rota com histograma de status, lidas só da tabela de rollup."""
+    statement = select(AuditRollup)
+    if path:
+        statement = statement.where(AuditRollup.path == path)
+    if start:
+        statement = statement.where(AuditRollup.bucket >= start)
+    if end:
+        statement = statement.where(AuditRollup.bucket < end)
+    statement = statement.order_by(AuditRollup.bucket, AuditRollup.path)
+
+    result = await session.execute(statement)
+    grouped = defaultdict(dict)
+    for row in result.scalars().all():
+        grouped[(row.bucket, row.path)][row.status_code] = row.count
+    return [
+        AuditRollupRead(bucket=bucket, path=route, total=sum(histogram.values()), status_codes=histogram)
+        for (bucket, route), histogram in grouped.items()
+    ]
@@ -1,17 +1,38 @@
 from fastapi import HTTPException
 from sqlmodel import select
+from sqlalchemy import update, literal, case
 from sqlalchemy.ext.asyncio import AsyncSession
+from core.cache import cache
+from core import versions, live
+from core.query import fetch_page, where_all
 from models import bus_model
 
-async def get_all_buses(session: AsyncSession):
-    statement = select(bus_model.Bus)
-    results = await session.execute(statement)
-    return results.scalars().all()
+async def list_buses(
+    session: AsyncSession,
+    is_full: bool | None = None,
+    line_id: int | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+):
+    """Ônibus filtrados no banco, em ordem de prefixo; com `limit` devolve uma página (BusPage)."""
+    Bus = bus_model.Bus
+    statement = where_all(
+        select(Bus),
+        (Bus.occupied >= Bus.capacity) == is_full if is_full is not None else None,
+        Bus.active_line_id == line_id if line_id is not None else None,
+    )
+    buses, next_cursor = await fetch_page(session, statement, (Bus.prefix,), limit, cursor)
+    if limit is None:
+        return buses
+    return bus_model.BusPage(items=buses, next_cursor=next_cursor)
 
 
 async def create_bus(session: AsyncSession, bus: bus_model.Bus):
     session.add(bus)
+    await versions.bump(session, "bus")
+    await live.hub.notify(session, live.bus_event(bus))
     await session.commit()
+    await cache.invalidate("bus")
     await session.refresh(bus)
     return bus
 
@@ -41,11 +62,15 @@ async def update_bus(session: AsyncSession, bus_prefix: int, updated_bus: bus_mo
     bus = result.scalars().one_or_none()
     if not bus:
         raise HTTPException(status_code=404, detail="Bus not found")
+    previous_line_id = bus.active_line_id
     bus_data = updated_bus.dict(exclude_unset=True)
     for key, value in bus_data.items():
         setattr(bus, key, value)
     session.add(bus)
+    await versions.bump(session, "bus")
+    await live.hub.notify(session, live.bus_event(bus, previous_line_id))
     await session.commit()
+    await cache.invalidate("bus")
     await session.refresh(bus)
     return bus
 
@@ -57,25 +82,103 @@ async def delete_bus(session: AsyncSession, bus_prefix: int):
     if not bus:
         raise HTTPException(status_code=404, detail="Bus not found")
     await session.delete(bus)
+    await versions.bump(session, "bus")
+    await live.hub.notify(session, live.bus_event(bus, deleted=True))
     await session.commit()
+    await cache.invalidate("bus")
     return {"detail": "Bus deleted successfully"}
     session.commit()
     return {"detail": "Bus deleted successfully"}
 
 
+async def _apply_occupancy(session: AsyncSession, bus_prefix: int, new_value, description: str):
+    """
+    Um único UPDATE condicional: só grava se o novo valor ficar entre 0 e a capacidade.
+    Embarques concorrentes no mesmo ônibus não perdem atualizações nem passam da lotação.
+    """
+    Bus = bus_model.Bus
+    statement = (
+        update(Bus)
+        .where(Bus.prefix == bus_prefix, new_value >= 0, new_value <= Bus.capacity)
+        .values(occupied=new_value)
+        .returning(Bus)
+        .execution_options(synchronize_session=False)
+    )
+    bus = (await session.execute(statement)).scalars().one_or_none()
+    if bus is None:
+        # Caminho de erro: descobre o motivo só quando o UPDATE não casou
+        current = (await session.execute(select(Bus.capacity, Bus.occupied).where(Bus.prefix == bus_prefix))).first()
+        await session.rollback()
+        if current is None:
+            raise HTTPException(status_code=404, detail="Bus not found")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Occupied seats ({description}) must stay between 0 and capacity ({current.capacity}); currently {current.occupied}",
+        )
+    await versions.bump(session, "bus")
+    await live.hub.notify(session, live.bus_event(bus))
+    await session.commit()
+    await cache.invalidate("bus")
+    return bus
+
+
 async def update_bus_occupancy(session: AsyncSession, bus_prefix: int, occupied: int):
-    """Atualiza a ocupação de um ônibus específico"""
-    bus = await get_bus_by_prefix(session, bus_prefix)
-    
-    if occupied < 0:
-        raise HTTPException(status_code=400, detail="Occupied seats cannot be negative")
-    if occupied > bus.capacity:
-        raise HTTPException(status_code=400, detail=f"Occupied seats ({occupied}) cannot exceed capacity ({bus.capacity})")
+    """Define a ocupação absoluta de um ônibus"""
+    return await _apply_occupancy(session, bus_prefix, literal(occupied), str(occupied))
+
+
+async def change_bus_occupancy(session: AsyncSession, bus_prefix: int, delta: int):
+    """Soma `delta` à ocupação atual (positivo no embarque, negativo na saída)"""
+    return await _apply_occupancy(session, bus_prefix, bus_model.Bus.occupied + delta, f"{delta:+d}")
+
+
+async def set_device_occupancy(session: AsyncSession, bus_prefix: int, occupied: int | None = None, delta: int = 0):
+    """
+    Ocupação informada pelo dispositivo do ônibus: valor absoluto (`occupied`)
+    e/ou `delta`, limitada a [0, capacidade]. Não faz commit (lote da ingestão MQTT).
+    Retorna o ônibus, ou None se o prefixo não existe.
+    """
+    Bus = bus_model.Bus
+    value = (literal(occupied) if occupied is not None else Bus.occupied) + delta
+    clamped = case((value < 0, 0), (value > Bus.capacity, Bus.capacity), else_=value)
+    statement = (
+        update(Bus)
+        .where(Bus.prefix == bus_prefix)
+        .values(occupied=clamped)
+        .returning(Bus)
+        .execution_options(synchronize_session=False)
+    )
+    bus = (await session.execute(statement)).scalars().one_or_none()
+    if bus is not None:
+        await live.hub.notify(session, live.bus_event(bus))
+    return bus
 
-    bus.occupied += 1
-    session.add(bus)
-    await session.commit()
-    await session.refresh(bus)
+
+async def start_device_route(session: AsyncSession, bus_prefix: int, line_id: int | None, capacity: int | None):
+    """Início de viagem pelo dispositivo: vincula a linha, ajusta a lotação e zera a ocupação. Não faz commit."""
+    bus = await session.get(bus_model.Bus, bus_prefix)
+    if bus is None:
+        bus = bus_model.Bus(prefix=bus_prefix, capacity=capacity, occupied=0)
+        session.add(bus)
+    previous_line_id = bus.active_line_id
+    bus.active_line_id = line_id
+    bus.capacity = capacity or bus.capacity
+    bus.occupied = 0
+    await session.flush()
+    await live.hub.notify(session, live.bus_event(bus, previous_line_id))
+    return bus
+
+
+async def end_device_route(session: AsyncSession, bus_prefix: int):
+    """Fim de viagem pelo dispositivo: desvincula a linha e zera a ocupação. Não faz commit."""
+    bus = await session.get(bus_model.Bus, bus_prefix)
+    if bus is None:
+        return None
+    previous_line_id = bus.active_line_id
+    bus.active_line_id = None
+    bus.occupied = 0
+    await session.flush()
+    await live.hub.notify(session, live.bus_event(bus, previous_line_id))
     return bus
 
 
@@ -97,24 +200,6 @@ async def get_bus_occupancy_info(session: AsyncSession, bus_prefix: int) -> bus_
     )
 
 
-async def get_buses_by_occupancy_status(session: AsyncSession, is_full: bool = None):
-    """Lista ônibus por status de ocupação"""
-    statement = select(bus_model.Bus)
-    result = await session.execute(statement)
-    buses = result.scalars().all()
-    
-    if is_full is None:
-        return buses
-    
-    filtered_buses = []
-    for bus in buses:
-        bus_is_full = bus.occupied >= bus.capacity
-        if is_full == bus_is_full:
-            filtered_buses.append(bus)
-    
-    return filtered_buses
-
-
 async def assign_bus_to_line(session: AsyncSession, bus_prefix: int, line_id: int):
     bus = await get_bus_by_prefix(session, bus_prefix)
     
@@ -126,19 +211,27 @@ async def assign_bus_to_line(session: AsyncSession, bus_prefix: int, line_id: in
     if not line:
         raise HTTPException(status_code=404, detail="Line not found")
     
+    previous_line_id = bus.active_line_id
     bus.active_line_id = line_id
     session.add(bus)
+    await versions.bump(session, "bus")
+    await live.hub.notify(session, live.bus_event(bus, previous_line_id))
     await session.commit()
+    await cache.invalidate("bus")
     await session.refresh(bus)
     return bus
 
 
 async def unassign_bus_from_line(session: AsyncSession, bus_prefix: int):
     bus = await get_bus_by_prefix(session, bus_prefix)
+    previous_line_id = bus.active_line_id
     bus.active_line_id = None
     bus.occupied = 0
     session.add(bus)
+    await versions.bump(session, "bus")
+    await live.hub.notify(session, live.bus_event(bus, previous_line_id))
     await session.commit()
+    await cache.invalidate("bus")
     await session.refresh(bus)
     return bus
 
@@ -1,6 +1,8 @@
 from fastapi import HTTPException
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from core.cache import cache
+from core import versions
 from models import schedule_model
 
 async def create_city(city: schedule_model.City, session: AsyncSession):
@@ -10,7 +12,9 @@ async def create_city(city: schedule_model.City, session: AsyncSession):
         raise HTTPException(status_code=400, detail="City already exists")
     new_city = schedule_model.City(name=city.name, state=city.state, country=city.country)
     session.add(new_city)
+    await versions.bump(session, "city")
     await session.commit()
+    await cache.invalidate("city")
     await session.refresh(new_city)
     return new_city
 
@@ -39,7 +43,9 @@ async def update_city(city_id: int, city: schedule_model.City, session: AsyncSes
     existing_city.state = city.state
     existing_city.country = city.country
     session.add(existing_city)
+    await versions.bump(session, "city")
     await session.commit()
+    await cache.invalidate("city")
     await session.refresh(existing_city)
     return existing_city
 
@@ -50,7 +56,9 @@ async def delete_city(city_id: int, session: AsyncSession):
     if not existing_city:
         raise HTTPException(status_code=404, detail="City not found")
     await session.delete(existing_city)
+    await versions.bump(session, "city")
     await session.commit()
+    await cache.invalidate("city")
     return {"detail": "City deleted successfully"}
 
 
@@ -0,0 +1,82 @@
+from fastapi import HTTPException
+from sqlmodel import select
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from core import versions
+from models.device_model import Driver, DeviceRoute, DriverUpdate, DeviceRouteUpdate, RegistryDelta
+
+
+async def _next_revision(session: AsyncSession) -> int:
+    """Nova revisão do cadastro; a linha de versão fica travada até o commit, então as revisões não se repetem."""
+    await versions.bump(session, "registry")
+    return (await versions.current(session, ("registry",)))["registry"][0]
+
+
+async def _upsert(session: AsyncSession, model, key: str, rows: list[dict]) -> int:
+    revision = await _next_revision(session)
+    dialect = postgresql if session.bind.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(model)
+    statement = statement.on_conflict_do_update(
+        index_elements=[key],
+        set_={column: statement.excluded[column] for column in rows[0] if column != key} | {"revision": revision},
+    )
+    # Ordem fixa das chaves: cargas concorrentes travam as linhas na mesma ordem
+    rows = sorted(rows, key=lambda row: row[key])
+    await session.execute(statement, [{**row, "revision": revision} for row in rows])
+    await session.commit()
+    return revision
+
+
+async def upsert_drivers(drivers: list[DriverUpdate], session: AsyncSession):
+    if not drivers:
+        raise HTTPException(status_code=400, detail="No drivers given")
+    revision = await _upsert(session, Driver, "badge_id", [driver.model_dump() for driver in drivers])
+    return {"version": revision, "drivers": len(drivers)}
+
+
+async def upsert_routes(routes: list[DeviceRouteUpdate], session: AsyncSession):
+    if not routes:
+        raise HTTPException(status_code=400, detail="No routes given")
+    revision = await _upsert(session, DeviceRoute, "name", [route.model_dump() for route in routes])
+    return {"version": revision, "routes": len(routes)}
+
+
+async def _deactivate(session: AsyncSession, model, predicate, detail: str):
+    # A linha fica como remoção (active=False) para os dispositivos receberem no delta
+    revision = await _next_revision(session)
+    result = await session.execute(update(model).where(predicate).values(active=False, revision=revision))
+    if result.rowcount == 0:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail=detail)
+    await session.commit()
+    return {"version": revision}
+
+
+async def delete_driver(badge_id: str, session: AsyncSession):
+    return await _deactivate(session, Driver, Driver.badge_id == badge_id, "Driver not found")
+
+
+async def delete_route(name: str, session: AsyncSession):
+    return await _deactivate(session, DeviceRoute, DeviceRoute.name == name, "Route not found")
+
+
+async def get_registry_delta(since: int, session: AsyncSession) -> RegistryDelta:
+    """
+    O que mudou depois de `since` (índice em revision). since=0, ou maior que a
+    versão atual (banco recriado), devolve o cadastro inteiro.
+    """
+    version = (await versions.current(session, ("registry",)))["registry"][0]
+    full = since <= 0 or since > version
+    if full:
+        drivers = select(Driver).where(Driver.active)
+        routes = select(DeviceRoute).where(DeviceRoute.active)
+    else:
+        drivers = select(Driver).where(Driver.revision > since)
+        routes = select(DeviceRoute).where(DeviceRoute.revision > since)
+    return RegistryDelta(
+        version=version,
+        full=full,
+        drivers=(await session.execute(drivers)).scalars().all(),
+        routes=(await session.execute(routes)).scalars().all(),
+    )
@@ -1,6 +1,11 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from config import BCRYPT_ROUNDS, HASH_WORKERS, HASH_MAX_QUEUE
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes com custo diferente de BCRYPT_ROUNDS são marcados para rehash no login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 class Hash():
     def __init__(self):
@@ -13,3 +18,86 @@ class Hash():
 
     def verify_password(plain_password, hashed_password):
         return pwd_context.verify(plain_password, hashed_password)
+
+
+    def verify_and_update(plain_password, hashed_password):
+        """Retorna (senha confere, hash novo ou None se o atual ainda serve)."""
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class HashExecutor:
+    """
+    Roda o bcrypt num pool de threads dedicado (o bcrypt libera o GIL), fora do event loop.
+
+    No máximo `workers` hashes rodam ao mesmo tempo; os demais esperam no semáforo
+    e contam como fila. Com a fila acima de `max_queue` a requisição recebe 503
+    em vez de esperar indefinidamente. `workers=0` roda inline, como antes.
+    """
+    def __init__(self, workers: int = 4, max_queue: int = 0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pool: ThreadPoolExecutor | None = None
+        self.semaphore: asyncio.Semaphore | None = None
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, func, *args):
+        if self.workers <= 0:
+            self.completed += 1
+            return func(*args)
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            self.semaphore = asyncio.Semaphore(self.workers)
+        if self.max_queue and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password operations",
+                headers={"Retry-After": "1"},
+            )
+        if self.semaphore.locked():
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                await self.semaphore.acquire()
+            finally:
+                self.queued -= 1
+        else:
+            await self.semaphore.acquire()
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self.run(Hash.get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self.run(Hash.verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+            self.semaphore = None
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": BCRYPT_ROUNDS,
+            "running": self.running,
+            "queue_depth": self.queued,
+            "queue_depth_max": self.max_queued,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+executor = HashExecutor(workers=HASH_WORKERS, max_queue=HASH_MAX_QUEUE)
@@ -12,8 +12,13 @@ async def authenticate_user(db: AsyncSession, totvs_id: str, password: str):
     user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="ID not found")
-    if not hashing_repo.Hash.verify_password(password, user.password):
+    valid, new_hash = await hashing_repo.executor.verify_and_update(password, user.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Password doesn't match")
+    if new_hash:
+        # BCRYPT_ROUNDS mudou desde que a senha foi gravada
+        user.password = new_hash
+        await db.commit()
     return user
 
 
@@ -1,10 +1,16 @@
+import json
 from fastapi import HTTPException
 from sqlmodel import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import asc
+from sqlalchemy import asc, func, cast, literal_column, tuple_, Text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
+from core.cache import cache
+from core import versions, live, interest
+from core.query import fetch_page, where_all, encode_cursor, decode_cursor
 from models import schedule_model
 from models.schedule_model import Line, LineRead, City, Schedule
+from config import JSON_FAST_PATH
 
 async def create_line(line: schedule_model.Line, session: AsyncSession):
     result = await session.execute(select(schedule_model.Line).where(schedule_model.Line.name == line.name))
@@ -12,7 +18,12 @@ async def create_line(line: schedule_model.Line, session: AsyncSession):
     if existing:
         raise HTTPException(status_code=400, detail="Line already exists.")
     session.add(line)
+    # O id entra no evento do stream
+    await session.flush()
+    await versions.bump(session, "line")
+    await live.hub.notify(session, live.line_event(line))
     await session.commit()
+    await cache.invalidate("line")
     await session.refresh(line)
     return line
 
@@ -23,31 +34,106 @@ async def get_line(line_id: int, session: AsyncSession):
         raise HTTPException(status_code=404, detail="Line not found")
     return line
 
-async def get_all_lines(session: AsyncSession) -> list[LineRead]:
-    result = await session.execute(
-        select(Line).options(selectinload(Line.schedules))
-    )
-    lines = result.scalars().all()
-    return [LineRead.model_validate(line) for line in lines]
+async def find_line_by_name(name: str, session: AsyncSession) -> Line | None:
+    result = await session.execute(select(Line).where(Line.name == name))
+    return result.scalars().first()
 
-async def get_lines_by_state(state: str, session: AsyncSession) -> list[LineRead]:
-    result = await session.execute(
-        select(Line)
-        .join(City)
-        .where(City.state == state.upper())
-        .options(selectinload(Line.schedules))
+async def list_lines(
+    session: AsyncSession,
+    state: str | None = None,
+    active: bool | None = None,
+    city_id: int | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+):
+    """
+    Linhas com os horários, filtros combináveis no banco; com `limit` devolve
+    uma página (LinePage). No PostgreSQL devolve os bytes do JSON (list_lines_json).
+    """
+    filters = (
+        Line.city_id.in_(select(City.id).where(City.state == state.upper())) if state else None,
+        func.coalesce(Line.active, False) == active if active is not None else None,
+        Line.city_id == city_id if city_id is not None else None,
     )
-    lines = result.scalars().all()
-    return [LineRead.model_validate(line) for line in lines]
+    if JSON_FAST_PATH and session.bind.dialect.name == "postgresql":
+        return await list_lines_json(session, filters, limit, cursor)
+    statement = where_all(select(Line).options(selectinload(Line.schedules)), *filters)
+    lines, next_cursor = await fetch_page(session, statement, (Line.id,), limit, cursor)
+    items = [LineRead.model_validate(line) for line in lines]
+    await _add_pending_interest(schedule for item in items for schedule in item.schedules)
+    if limit is None:
+        return items
+    return schedule_model.LinePage(items=items, next_cursor=next_cursor)
 
-async def get_active_lines(session: AsyncSession) -> list[LineRead]:
-    result = await session.execute(
-        select(Line)
-        .where(Line.active == True)
-        .options(selectinload(Line.schedules))
+async def _add_pending_interest(schedules):
+    """Soma os votos ainda não gravados (core/interest.py) a cópias ScheduleRead, que não estão na sessão."""
+    deltas = await interest.counter.pending_all()
+    if deltas:
+        for schedule in schedules:
+            schedule.interest += deltas.get(schedule.id, 0)
+
+
+def _json_object(**fields):
+    # Chaves como literais no SQL: parâmetros dentro de json_build_object não têm tipo no asyncpg
+    return func.json_build_object(*(arg for key, value in fields.items() for arg in (literal_column(f"'{key}'"), value)))
+
+
+def _line_document():
+    """Uma linha no formato de LineRead, com os horários (ScheduleRead, por id) agregados pelo próprio banco."""
+    schedule = _json_object(
+        id=Schedule.id,
+        arrival_time=Schedule.arrival_time,
+        departure_time=Schedule.departure_time,
+        interest=Schedule.interest,
+        day_week=Schedule.day_week,
+    )
+    schedules = (
+        select(func.coalesce(func.json_agg(aggregate_order_by(schedule, Schedule.id)), literal_column("'[]'::json")))
+        .where(Schedule.line_id == Line.id)
+        .scalar_subquery()
     )
-    lines = result.scalars().all()
-    return [LineRead.model_validate(line) for line in lines]
+    document = _json_object(id=Line.id, name=Line.name, active_bus=Line.active_bus, active=Line.active, schedules=schedules)
+    return cast(document, Text)
+
+
+def _with_deltas(document: str, deltas: dict[int, int]) -> str:
+    line = json.loads(document)
+    changed = False
+    for schedule in line["schedules"]:
+        if schedule["id"] in deltas:
+            schedule["interest"] += deltas[schedule["id"]]
+            changed = True
+    return json.dumps(line, separators=(",", ":")) if changed else document
+
+
+async def list_lines_json(session: AsyncSession, filters: tuple, limit: int | None = None, cursor: str | None = None) -> bytes:
+    """
+    Caminho rápido do PostgreSQL para list_lines: uma consulta devolve o JSON
+    de cada linha já montado, e a resposta é só a junção desses textos, sem
+    carregar objetos do ORM nem validar/serializar com Pydantic.
+    """
+    order_by = (Line.id,)
+    statement = where_all(select(Line.id, _line_document()), *filters)
+    if cursor:
+        statement = statement.where(tuple_(*order_by) > tuple_(*decode_cursor(cursor, order_by)))
+    statement = statement.order_by(*order_by)
+    if limit is not None:
+        statement = statement.limit(limit + 1)
+    rows = (await session.execute(statement)).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor((rows[-1][0],))
+    documents = [document for _, document in rows]
+    deltas = await interest.counter.pending_all()
+    if deltas:
+        # Votos ainda não gravados: decodifica os documentos e reescreve só os afetados
+        documents = [_with_deltas(document, deltas) for document in documents]
+    items = "[" + ",".join(documents) + "]"
+    if limit is None:
+        return items.encode()
+    return f'{{"items":{items},"next_cursor":{json.dumps(next_cursor)}}}'.encode()
+
 
 async def update_line(line_id: int, line: schedule_model.Line, session: AsyncSession):
     result = await session.execute(select(schedule_model.Line).where(schedule_model.Line.id == line_id))
@@ -57,7 +143,10 @@ async def update_line(line_id: int, line: schedule_model.Line, session: AsyncSes
     existing.name = line.name
     existing.active_bus = line.active_bus
     existing.active = line.active
+    await versions.bump(session, "line")
+    await live.hub.notify(session, live.line_event(existing))
     await session.commit()
+    await cache.invalidate("line")
     await session.refresh(existing)
     return existing
 
@@ -67,7 +156,10 @@ async def delete_line(line_id: int, session: AsyncSession):
     if not existing:
         raise HTTPException(status_code=404, detail="Line not found")
     await session.delete(existing)
+    await versions.bump(session, "line")
+    await live.hub.notify(session, live.line_event(existing, deleted=True))
     await session.commit()
+    await cache.invalidate("line")
     return {"detail": "Line deleted successfully"}
 
 async def get_line_schedules(line_id: int, session: AsyncSession) -> list[schedule_model.ScheduleRead]:
@@ -77,7 +169,9 @@ async def get_line_schedules(line_id: int, session: AsyncSession) -> list[schedu
     line = result.scalars().first()
     if not line:
         raise HTTPException(status_code=404, detail="Line not found")
-    return [schedule_model.ScheduleRead.model_validate(s) for s in line.schedules]
+    schedules = [schedule_model.ScheduleRead.model_validate(s) for s in line.schedules]
+    await _add_pending_interest(schedules)
+    return schedules
 
 async def get_line_status(line_id: int, session: AsyncSession) -> dict:
     result = await session.execute(select(schedule_model.Line).where(schedule_model.Line.id == line_id))
@@ -93,6 +187,9 @@ async def update_line_status(line_id: int, active: bool, session: AsyncSession):
         raise HTTPException(status_code=404, detail="Line not found")
     line.active = active
     session.add(line)
+    await versions.bump(session, "line")
+    await live.hub.notify(session, live.line_event(line))
     await session.commit()
+    await cache.invalidate("line")
     await session.refresh(line)
     return line
\ No newline at end of file
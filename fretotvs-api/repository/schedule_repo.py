@@ -1,9 +1,12 @@
 from fastapi import HTTPException
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from core.cache import cache
+from core import versions, interest, timetable
+from core.query import fetch_page, where_all
 from models import schedule_model
 from models.schedule_model import Line
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
 
 async def create_schedule(schedule: schedule_model.ScheduleCreate, session: AsyncSession):
@@ -15,38 +18,72 @@ async def create_schedule(schedule: schedule_model.ScheduleCreate, session: Asyn
         interest=0
     )
     session.add(new_schedule)
+    await versions.bump(session, "schedule", "timetable")
     await session.commit()
+    await cache.invalidate("schedule")
     await session.refresh(new_schedule)
+    await timetable.index.applied(session, schedule=new_schedule)
     return new_schedule
 
 
-async def get_schedule(schedule_id: int, session: AsyncSession):
-    result = await session.execute(select(schedule_model.Schedule).where(schedule_model.Schedule.id == schedule_id))
-    schedule = result.scalars().first()
-    if not schedule:
-        raise HTTPException(status_code=404, detail="Schedule not found")
+async def with_pending_interest(schedule: schedule_model.Schedule, session: AsyncSession):
+    """Soma ao horário os votos ainda não gravados, sem marcar o objeto como alterado na sessão."""
+    pending = await interest.counter.pending_for(schedule.id)
+    if pending:
+        session.expunge(schedule)
+        schedule.interest += pending
     return schedule
 
 
-async def get_all_schedules(session: AsyncSession):
-    result = await session.execute(select(schedule_model.Schedule))
-    schedules = result.scalars().all()
-    if not schedules:
-        raise HTTPException(status_code=404, detail="No schedules found")
+async def with_pending_interest_all(schedules: list[schedule_model.Schedule], session: AsyncSession):
+    """with_pending_interest para uma lista, com uma leitura só dos deltas pendentes."""
+    deltas = await interest.counter.pending_all()
+    for schedule in schedules:
+        if schedule.id in deltas:
+            session.expunge(schedule)
+            schedule.interest += deltas[schedule.id]
     return schedules
 
 
-async def get_active_schedules(session: AsyncSession):
-    """Retorna apenas schedules de linhas ativas"""
-    result = await session.execute(
-        select(schedule_model.Schedule)
-        .join(Line)
-        .where(Line.active == True)
+async def get_schedule(schedule_id: int, session: AsyncSession):
+    result = await session.execute(select(schedule_model.Schedule).where(schedule_model.Schedule.id == schedule_id))
+    schedule = result.scalars().first()
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return await with_pending_interest(schedule, session)
+
+
+async def list_schedules(
+    session: AsyncSession,
+    line_id: int | None = None,
+    day_week: int | None = None,
+    departure_from: time | None = None,
+    departure_to: time | None = None,
+    active_lines_only: bool = False,
+    limit: int | None = None,
+    cursor: str | None = None,
+):
+    """
+    Horários filtrados no banco, em ordem de (dia, partida, id), servida pelos
+    índices de schedule; com `limit` devolve uma página (SchedulePage).
+    """
+    Schedule = schedule_model.Schedule
+    statement = where_all(
+        select(Schedule),
+        Schedule.line_id == line_id if line_id is not None else None,
+        Schedule.day_week == day_week if day_week is not None else None,
+        Schedule.departure_time >= departure_from if departure_from is not None else None,
+        Schedule.departure_time <= departure_to if departure_to is not None else None,
+        Schedule.line_id.in_(select(Line.id).where(Line.active == True)) if active_lines_only else None,
     )
-    schedules = result.scalars().all()
-    if not schedules:
-        raise HTTPException(status_code=404, detail="No active schedules found")
-    return schedules
+    order_by = (Schedule.day_week, Schedule.departure_time, Schedule.id)
+    schedules, next_cursor = await fetch_page(session, statement, order_by, limit, cursor)
+    await with_pending_interest_all(schedules, session)
+    if not schedules and cursor is None:
+        raise HTTPException(status_code=404, detail="No active schedules found" if active_lines_only else "No schedules found")
+    if limit is None:
+        return schedules
+    return schedule_model.SchedulePage(items=schedules, next_cursor=next_cursor)
 
 
 async def update_schedule(schedule_id: int, request: schedule_model.Schedule, session: AsyncSession):
@@ -57,8 +94,11 @@ async def update_schedule(schedule_id: int, request: schedule_model.Schedule, se
     schedule_data = request.model_dump(exclude_unset=True)
     db_schedule.sqlmodel_update(schedule_data)
     session.add(db_schedule)
+    await versions.bump(session, "schedule", "timetable")
     await session.commit()
+    await cache.invalidate("schedule")
     await session.refresh(db_schedule)
+    await timetable.index.applied(session, schedule=db_schedule)
     return db_schedule
 
 
@@ -68,11 +108,9 @@ async def update_interest(schedule_id: int, session: AsyncSession):
     db_schedule = result.scalars().first()
     if not db_schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
-    db_schedule.interest += 1
-    session.add(db_schedule)
-    await session.commit()
-    await session.refresh(db_schedule)
-    return db_schedule
+    # O voto entra no contador; o flush periódico grava no banco, versiona e invalida o cache
+    await interest.counter.add(schedule_id)
+    return await with_pending_interest(db_schedule, session)
 
 
 
@@ -82,8 +120,35 @@ async def delete_schedule(schedule_id: int, session: AsyncSession):
     if not existing_schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
     await session.delete(existing_schedule)
+    await versions.bump(session, "schedule", "timetable")
     await session.commit()
+    await cache.invalidate("schedule")
+    await timetable.index.applied(session, removed_id=schedule_id)
     return {"detail": "Schedule deleted successfully"}
 
 
-
+async def next_departures(line_id: int, at: datetime, limit: int, session: AsyncSession):
+    """Próximas partidas da linha depois de `at`, pelo índice em memória (core/timetable.py)."""
+    await timetable.index.ensure_fresh(session)
+    departures = timetable.index.next_departures(line_id, at, limit)
+    if not departures:
+        raise HTTPException(status_code=404, detail="No schedules found for this line")
+    return [
+        schedule_model.NextDeparture(
+            schedule_id=entry.schedule_id,
+            line_id=entry.line_id,
+            day_week=entry.day_week,
+            departure_time=entry.departure_time,
+            arrival_time=entry.arrival_time,
+            departs_at=departs_at,
+        )
+        for entry, departs_at in departures
+    ]
+
+
+async def next_occurrences(schedule_ids: list[int], at: datetime, session: AsyncSession):
+    await timetable.index.ensure_fresh(session)
+    return [
+        schedule_model.NextOccurrence(schedule_id=schedule_id, departs_at=departs_at)
+        for schedule_id, departs_at in timetable.index.next_occurrences(schedule_ids, at)
+    ]
@@ -3,13 +3,15 @@ from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from models import user_model
 from repository import hashing_repo
+from core.auth_cache import user_cache
+from core.query import fetch_page
 
 async def create_user(db: AsyncSession, name: str, totvs_id: str, password: str):
     result = await db.execute(select(user_model.User).where(user_model.User.totvs_id == totvs_id))
     user = result.scalars().first()
     if user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID already registered")
-    hashed_password = hashing_repo.Hash.get_password_hash(password)
+    hashed_password = await hashing_repo.executor.hash(password)
     new_user = user_model.User(name=name, totvs_id=totvs_id, password=hashed_password)
     db.add(new_user)
     await db.commit()
@@ -23,18 +25,22 @@ async def get_user_by_id(db: AsyncSession, totvs_id: str):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
 
-async def get_all_users(db: AsyncSession):
-    result = await db.execute(select(user_model.User))
-    users = result.scalars().all()
-    return users
+async def get_all_users(db: AsyncSession, limit: int | None = None, cursor: str | None = None):
+    """Usuários em ordem de totvs_id; com `limit` devolve uma página (UserPage)."""
+    users, next_cursor = await fetch_page(db, select(user_model.User), (user_model.User.totvs_id,), limit, cursor)
+    if limit is None:
+        return users
+    return user_model.UserPage(items=users, next_cursor=next_cursor)
 
 async def delete_user(db: AsyncSession, totvs_id: str):
     result = await db.execute(select(user_model.User).where(user_model.User.totvs_id == totvs_id))
     user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    name = user.name
     await db.delete(user)
     await db.commit()
+    user_cache.invalidate_user(totvs_id, name)
     return {"detail": "User deleted successfully"}
 
 async def update_user(id: int, db: AsyncSession, request: user_model.User):
@@ -42,11 +48,14 @@ async def update_user(id: int, db: AsyncSession, request: user_model.User):
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User not found")
     if request.password not in (None, ""):
-        hashed_password = hashing_repo.Hash.get_password_hash(request.password)
+        hashed_password = await hashing_repo.executor.hash(request.password)
         request.password = hashed_password
     user_data = request.model_dump(exclude_unset=True)
+    previous_name = db_user.name
     db_user.sqlmodel_update(user_data)
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
+    # Tokens emitidos com o nome antigo ou que passam a resolver para o novo nome
+    user_cache.invalidate_user(id, previous_name, db_user.name)
     return db_user
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Query, Depends
+from repository import audit_repo
+from models import audit_model, user_model
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_session
+from core import oauth2
+from datetime import datetime
+from typing import List, Optional
+
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+@router.get("/", response_model=audit_model.AuditLogPage)
+async def search_audit_logs(
+    ip: Optional[str] = Query(None, description="Exact client IP"),
+    path: Optional[str] = Query(None, description="Path prefix (e.g., '/bus')"),
+    status_code: Optional[int] = Query(None, description="HTTP status code"),
+    start: Optional[datetime] = Query(None, description="From this timestamp (UTC, inclusive)"),
+    end: Optional[datetime] = Query(None, description="Until this timestamp (UTC, exclusive)"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    session: AsyncSession = Depends(get_session),
+    current_user: user_model.User = Depends(oauth2.require_admin),
+):
+    return await audit_repo.search_audit_logs(session, ip, path, status_code, start, end, limit, cursor)
+
+
+@router.get("/rollups", response_model=List[audit_model.AuditRollupRead])
+async def read_audit_rollups(
+    path: Optional[str] = Query(None, description="Route template (e.g., '/bus/{bus_prefix}')"),
+    start: Optional[datetime] = Query(None, description="From this hour (UTC, inclusive)"),
+    end: Optional[datetime] = Query(None, description="Until this hour (UTC, exclusive)"),
+    session: AsyncSession = Depends(get_session),
+    current_user: user_model.User = Depends(oauth2.require_admin),
+):
+    return await audit_repo.get_audit_rollups(session, path, start, end)
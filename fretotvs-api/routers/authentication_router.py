@@ -6,11 +6,15 @@ from repository import jwt_repo
 from datetime import timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_session
-from config import ACCESS_TOKEN_EXPIRE_MINUTES
+from core.rate_limit import RateLimit
+from config import ACCESS_TOKEN_EXPIRE_MINUTES, LOGIN_RATE_LIMIT
 
 router = APIRouter(tags=["Login"])
 
-@router.post("/login")
+# Protege o caminho do bcrypt contra rajadas de um mesmo cliente
+login_limit = RateLimit("login", LOGIN_RATE_LIMIT)
+
+@router.post("/login", dependencies=[Depends(login_limit)])
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: AsyncSession = Depends(get_session)) -> jwt_schema.Token:
 
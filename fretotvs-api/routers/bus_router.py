@@ -1,22 +1,124 @@
-from fastapi import APIRouter, Query, Depends
+import asyncio
+import json
+from fastapi import APIRouter, Query, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from repository import bus_repo
 from models import bus_model
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_session
-from typing import Optional
+from core.cache import cache
+from core.versions import Conditional
+from core import database, live
+from models.schedule_model import Line
+from sqlmodel import select
+from typing import List, Optional, Union
+from config import LIVE_HEARTBEAT_SECONDS
 
 router = APIRouter(prefix="/bus", tags=["bus"])
 
-@router.get("/", response_model=list[bus_model.Bus])
+bus_conditional = Conditional("bus")
+
+@router.get("/", response_model=Union[list[bus_model.Bus], bus_model.BusPage])
 async def read_buses(
     is_full: Optional[bool] = Query(None, description="Filter buses by occupancy status"), 
-    session: AsyncSession = Depends(get_session)
+    line_id: Optional[int] = Query(None, description="Filter buses assigned to this line"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; when set the response is {items, next_cursor}"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    session: AsyncSession = Depends(get_session),
+    validators: dict = Depends(bus_conditional),
 ):
-    if is_full is not None:
-        return await bus_repo.get_buses_by_occupancy_status(session, is_full)
-    return await bus_repo.get_all_buses(session)
-
-@router.get("/{bus_prefix}", response_model=bus_model.Bus)
+    key = f"buses:full={is_full}:line={line_id}:limit={limit}:cursor={cursor}"
+    return await cache.response(key, ("bus",), lambda: bus_repo.list_buses(session, is_full, line_id, limit, cursor), validators)
+
+async def _subscribe(line_ids: list[int] | None) -> live.Subscription | None:
+    """
+    Assina antes de ler o estado atual, para não perder alterações entre as duas coisas.
+    A sessão do snapshot é fechada aqui: a conexão volta ao pool antes do stream,
+    que depois só recebe do hub em memória.
+    """
+    subscription = live.hub.subscribe(set(line_ids) if line_ids else None)
+    if subscription is None:
+        return None
+    try:
+        async for session in database.get_session():
+            buses = await bus_repo.list_buses(session)
+            lines = await session.execute(select(Line).where(Line.id.in_(line_ids)) if line_ids else select(Line))
+            for line in lines.scalars().all():
+                subscription.put(live.line_event(line), replace=False)
+    except BaseException:
+        live.hub.unsubscribe(subscription)
+        raise
+    for bus in buses:
+        payload = live.bus_event(bus)
+        if subscription.matches(payload):
+            subscription.put(payload, replace=False)
+    return subscription
+
+
+def _public(payload: dict) -> dict:
+    return {key: value for key, value in payload.items() if key not in ("key", "lines")}
+
+
+@router.get("/stream")
+async def stream_occupancy(
+    request: Request,
+    line_id: Optional[List[int]] = Query(None, description="Only these lines (repeatable); default all"),
+):
+    """
+    Server-Sent Events: o estado atual dos ônibus/linhas e depois cada alteração
+    de ocupação ou status de linha. Cliente lento recebe só o último estado de cada ônibus.
+    """
+    subscription = await _subscribe(line_id)
+    if subscription is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many live subscribers", headers={"Retry-After": "5"})
+
+    async def events():
+        try:
+            while True:
+                try:
+                    batch = await asyncio.wait_for(subscription.get(), LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comentário SSE: mantém proxies e balanceadores com a conexão aberta
+                    yield ": keep-alive\n\n"
+                    continue
+                for payload in batch:
+                    yield f"event: {payload['type']}\ndata: {json.dumps(_public(payload), separators=(',', ':'))}\n\n"
+        finally:
+            live.hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/ws")
+async def websocket_occupancy(
+    websocket: WebSocket,
+    line_id: Optional[List[int]] = Query(None),
+):
+    """Mesmo conteúdo do /bus/stream, em mensagens JSON por WebSocket."""
+    subscription = await _subscribe(line_id)
+    if subscription is None:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+
+    async def send_events():
+        while True:
+            for payload in await subscription.get():
+                await websocket.send_json(_public(payload))
+
+    sender = asyncio.create_task(send_events())
+    try:
+        # Mensagens do cliente são ignoradas; o receive só serve para notar a desconexão
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        live.hub.unsubscribe(subscription)
+
+
+@router.get("/{bus_prefix}", response_model=bus_model.Bus, dependencies=[Depends(bus_conditional)])
 async def read_bus(bus_prefix: int, session: AsyncSession = Depends(get_session)):
     return await bus_repo.get_bus_by_prefix(session, bus_prefix)
 
@@ -36,13 +138,15 @@ async def delete_bus(bus_prefix: int, session: AsyncSession = Depends(get_sessio
     return await bus_repo.delete_bus(session, bus_prefix)
 
 
-@router.get("/{bus_prefix}/occupancy", response_model=bus_model.BusOccupancyInfo)
+@router.get("/{bus_prefix}/occupancy", response_model=bus_model.BusOccupancyInfo, dependencies=[Depends(bus_conditional)])
 async def get_bus_occupancy(bus_prefix: int, session: AsyncSession = Depends(get_session)):
     return await bus_repo.get_bus_occupancy_info(session, bus_prefix)
 
 
 @router.patch("/{bus_prefix}/occupancy", response_model=bus_model.Bus)
 async def update_bus_occupancy(bus_prefix: int, occupancy_update: bus_model.BusOccupancyUpdate, session: AsyncSession = Depends(get_session)):
+    if occupancy_update.delta is not None:
+        return await bus_repo.change_bus_occupancy(session, bus_prefix, occupancy_update.delta)
     return await bus_repo.update_bus_occupancy(session, bus_prefix, occupancy_update.occupied)
 
 
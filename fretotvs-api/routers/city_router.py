@@ -3,12 +3,16 @@ from repository import city_repo
 from models import schedule_model
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_session
+from core.cache import cache
+from core.versions import Conditional
 
 router = APIRouter(prefix="/city", tags=["city"])
 
+city_conditional = Conditional("city")
+
 @router.get("/")
-async def read_cities(session: AsyncSession = Depends(get_session)):
-    return await city_repo.get_all_cities(session)
+async def read_cities(session: AsyncSession = Depends(get_session), validators: dict = Depends(city_conditional)):
+    return await cache.response("cities:all", ("city",), lambda: city_repo.get_all_cities(session), validators)
 
 
 @router.post("/")
@@ -16,7 +20,7 @@ async def create_city(city: schedule_model.City, session: AsyncSession = Depends
     return await city_repo.create_city(city, session)
 
 
-@router.get("/{city_id}")
+@router.get("/{city_id}", dependencies=[Depends(city_conditional)])
 async def read_city(city_id: int, session: AsyncSession = Depends(get_session)):
     return await city_repo.get_city(city_id, session)
 
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Query, Depends
+from repository import device_repo
+from models import device_model
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_session
+from core import oauth2
+from core.versions import Conditional
+from typing import List
+
+router = APIRouter(prefix="/device", tags=["device"])
+
+# Os dispositivos consultam em intervalos fixos: sem mudança no cadastro a resposta é 304
+registry_conditional = Conditional("registry")
+
+@router.get("/registry", response_model=device_model.RegistryDelta)
+async def read_registry(
+    since: int = Query(0, ge=0, description="Registry version the device already has; 0 for the full registry"),
+    session: AsyncSession = Depends(get_session),
+    validators: dict = Depends(registry_conditional),
+):
+    return await device_repo.get_registry_delta(since, session)
+
+@router.put("/drivers", dependencies=[Depends(oauth2.require_admin)])
+async def upsert_drivers(drivers: List[device_model.DriverUpdate], session: AsyncSession = Depends(get_session)):
+    return await device_repo.upsert_drivers(drivers, session)
+
+@router.delete("/drivers/{badge_id}", dependencies=[Depends(oauth2.require_admin)])
+async def delete_driver(badge_id: str, session: AsyncSession = Depends(get_session)):
+    return await device_repo.delete_driver(badge_id, session)
+
+@router.put("/routes", dependencies=[Depends(oauth2.require_admin)])
+async def upsert_routes(routes: List[device_model.DeviceRouteUpdate], session: AsyncSession = Depends(get_session)):
+    return await device_repo.upsert_routes(routes, session)
+
+@router.delete("/routes/{name}", dependencies=[Depends(oauth2.require_admin)])
+async def delete_route(name: str, session: AsyncSession = Depends(get_session)):
+    return await device_repo.delete_route(name, session)
@@ -3,27 +3,40 @@ from repository import line_repo
 from models import schedule_model
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_session
-from typing import List, Optional
+from core.cache import cache
+from core.versions import Conditional
+from core import interest
+from typing import List, Optional, Union
 
 router = APIRouter(prefix="/lines", tags=["lines"])
 
-@router.get("/", response_model=List[schedule_model.LineRead])
+# GET condicional: ETag a partir das versões das tabelas de que cada resposta depende;
+# as que mostram o interesse dos horários incluem os votos ainda não gravados
+lines_conditional = Conditional("city", "line", "schedule", pending=interest.counter.validator)
+line_conditional = Conditional("line")
+line_schedules_conditional = Conditional("line", "schedule", pending=interest.counter.validator)
+line_buses_conditional = Conditional("line", "bus")
+
+@router.get("/", response_model=Union[List[schedule_model.LineRead], schedule_model.LinePage])
 async def read_lines(
     state: Optional[str] = Query(None, description="Filter lines by state (e.g., 'SP', 'RJ')"), 
     active: Optional[bool] = Query(None, description="Filter lines by active status"),
-    session: AsyncSession = Depends(get_session)
+    city_id: Optional[int] = Query(None, description="Filter lines by city"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; when set the response is {items, next_cursor}"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    session: AsyncSession = Depends(get_session),
+    validators: dict = Depends(lines_conditional),
 ):
-    if active is True:
-        return await line_repo.get_active_lines(session)
-    elif state:
-        return await line_repo.get_lines_by_state(state, session)
-    return await line_repo.get_all_lines(session)
+    state = state.upper() if state else None
+    tags = ("line", "schedule", "city") if state else ("line", "schedule")
+    key = f"lines:state={state}:active={active}:city={city_id}:limit={limit}:cursor={cursor}"
+    return await cache.response(key, tags, lambda: line_repo.list_lines(session, state, active, city_id, limit, cursor), validators)
 
 @router.post("/")
 async def create_line(line: schedule_model.Line, session: AsyncSession = Depends(get_session)):
     return await line_repo.create_line(line, session)
 
-@router.get("/{line_id}", response_model=schedule_model.LineRead)
+@router.get("/{line_id}", response_model=schedule_model.LineRead, dependencies=[Depends(line_schedules_conditional)])
 async def read_line(line_id: int, session: AsyncSession = Depends(get_session)):
     line = await line_repo.get_line(line_id, session)
     return schedule_model.LineRead.model_validate(line)
@@ -37,10 +50,10 @@ async def delete_line(line_id: int, session: AsyncSession = Depends(get_session)
     return await line_repo.delete_line(line_id, session)
 
 @router.get("/{line_id}/schedules", response_model=List[schedule_model.ScheduleRead])
-async def read_line_schedules(line_id: int, session: AsyncSession = Depends(get_session)):
-    return await line_repo.get_line_schedules(line_id, session)
+async def read_line_schedules(line_id: int, session: AsyncSession = Depends(get_session), validators: dict = Depends(line_schedules_conditional)):
+    return await cache.response(f"lines:{line_id}:schedules", ("line", "schedule"), lambda: line_repo.get_line_schedules(line_id, session), validators)
 
-@router.get("/{line_id}/status")
+@router.get("/{line_id}/status", dependencies=[Depends(line_conditional)])
 async def get_line_status(line_id: int, session: AsyncSession = Depends(get_session)):
     return await line_repo.get_line_status(line_id, session)
 
@@ -48,7 +61,7 @@ async def get_line_status(line_id: int, session: AsyncSession = Depends(get_sess
 async def update_line_status(line_id: int, status_update: schedule_model.LineStatusUpdate, session: AsyncSession = Depends(get_session)):
     return await line_repo.update_line_status(line_id, status_update.active, session)
 
-@router.get("/{line_id}/buses")
+@router.get("/{line_id}/buses", dependencies=[Depends(line_buses_conditional)])
 async def get_line_buses(line_id: int, session: AsyncSession = Depends(get_session)):
     from repository import bus_repo
     return await bus_repo.get_buses_by_line(session, line_id)
\ No newline at end of file
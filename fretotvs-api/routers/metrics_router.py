@@ -0,0 +1,48 @@
+from fastapi import APIRouter
+from core import database, pool, interest, live
+from core.auth_cache import user_cache
+from core.rate_limit import limiter
+from core.cache import cache
+from core.compression import compressor
+from repository import hashing_repo
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@router.get("/db-pool")
+async def read_db_pool_metrics():
+    return pool.pool_status(database.engine)
+
+
+@router.get("/auth-cache")
+async def read_auth_cache_metrics():
+    return user_cache.snapshot()
+
+
+@router.get("/hashing")
+async def read_hashing_metrics():
+    return hashing_repo.executor.snapshot()
+
+
+@router.get("/rate-limit")
+async def read_rate_limit_metrics():
+    return limiter.snapshot()
+
+
+@router.get("/cache")
+async def read_cache_metrics():
+    return cache.snapshot()
+
+
+@router.get("/compression")
+async def read_compression_metrics():
+    return compressor.snapshot()
+
+
+@router.get("/interest")
+async def read_interest_metrics():
+    return interest.counter.snapshot()
+
+
+@router.get("/live")
+async def read_live_metrics():
+    return live.hub.snapshot()
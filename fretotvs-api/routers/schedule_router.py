@@ -3,34 +3,87 @@ from repository import schedule_repo
 from models import schedule_model
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_session
-from typing import Optional
+from core.cache import cache
+from core.versions import Conditional
+from core import interest
+from typing import List, Optional, Union
+from datetime import datetime, time
 from pydantic import BaseModel
+from core.rate_limit import RateLimit, user_or_ip
+from config import INTEREST_RATE_LIMIT
 
 class InterestUpdate(BaseModel):
     interest: int
 
 router = APIRouter(prefix="/schedules", tags=["schedules"])
 
-@router.get("/")
+# Os votos de interesse ainda não gravados também mudam a resposta
+schedules_conditional = Conditional("line", "schedule", pending=interest.counter.validator)
+schedule_conditional = Conditional("schedule", pending=interest.counter.validator)
+
+interest_limit = RateLimit("schedule-interest", INTEREST_RATE_LIMIT, key=user_or_ip)
+
+@router.get("/", response_model=Union[list[schedule_model.Schedule], schedule_model.SchedulePage])
 async def read_schedules(
     active_lines_only: Optional[bool] = Query(False, description="Show only schedules from active lines"),
-    session: AsyncSession = Depends(get_session)
+    line_id: Optional[int] = Query(None, description="Filter schedules by line"),
+    day_week: Optional[int] = Query(None, ge=1, le=5, description="Filter schedules by weekday (1-5)"),
+    departure_from: Optional[time] = Query(None, description="Departure at or after (HH:MM)"),
+    departure_to: Optional[time] = Query(None, description="Departure at or before (HH:MM)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; when set the response is {items, next_cursor}"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    session: AsyncSession = Depends(get_session),
+    validators: dict = Depends(schedules_conditional),
+):
+    tags = ("schedule", "line") if active_lines_only else ("schedule",)
+    key = (
+        f"schedules:active={active_lines_only}:line={line_id}:day={day_week}"
+        f":from={departure_from}:to={departure_to}:limit={limit}:cursor={cursor}"
+    )
+    return await cache.response(
+        key, tags,
+        lambda: schedule_repo.list_schedules(session, line_id, day_week, departure_from, departure_to, active_lines_only, limit, cursor),
+        validators,
+    )
+
+
+def _local(at: Optional[datetime]) -> datetime:
+    # A grade é em hora local; horário com fuso é convertido
+    if at is None:
+        return datetime.now()
+    return at.astimezone().replace(tzinfo=None) if at.tzinfo else at
+
+
+# Depende do relógio: sem ETag nem cache de resposta, a consulta já sai da memória
+@router.get("/next", response_model=list[schedule_model.NextDeparture])
+async def read_next_departures(
+    line: int = Query(..., description="Line id"),
+    at: Optional[datetime] = Query(None, description="Reference time (ISO 8601); defaults to now"),
+    limit: int = Query(5, ge=1, le=100, description="Number of departures"),
+    session: AsyncSession = Depends(get_session),
+):
+    return await schedule_repo.next_departures(line, _local(at), limit, session)
+
+
+@router.get("/next/batch", response_model=list[schedule_model.NextOccurrence])
+async def read_next_occurrences(
+    ids: List[int] = Query(..., max_length=1000, description="Schedule ids"),
+    at: Optional[datetime] = Query(None, description="Reference time (ISO 8601); defaults to now"),
+    session: AsyncSession = Depends(get_session),
 ):
-    if active_lines_only:
-        return await schedule_repo.get_active_schedules(session)
-    return await schedule_repo.get_all_schedules(session)
+    return await schedule_repo.next_occurrences(ids, _local(at), session)
 
 
 @router.post("/create")
 async def create_schedule(schedule: schedule_model.ScheduleCreate, session: AsyncSession = Depends(get_session)):
     return await schedule_repo.create_schedule(schedule, session)
 
-@router.post("/{schedule_id}/interest")
+@router.post("/{schedule_id}/interest", dependencies=[Depends(interest_limit)])
 async def update_interest(schedule_id: int, session: AsyncSession = Depends(get_session)):
     return await schedule_repo.update_interest(schedule_id, session)
 
 
-@router.get("/{schedule_id}")
+@router.get("/{schedule_id}", dependencies=[Depends(schedule_conditional)])
 async def read_schedule(schedule_id: int, session: AsyncSession = Depends(get_session)):
     return await schedule_repo.get_schedule(schedule_id, session)
 
@@ -1,9 +1,10 @@
-from fastapi import status, APIRouter, Depends
+from fastapi import status, APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.database import get_session
 from repository import user_repo
 from models import user_model
 from core import oauth2
+from typing import Optional, Union
 
 router = APIRouter(prefix="/user", tags=["User"])
 
@@ -15,9 +16,14 @@ async def create_user(request: user_model.User, db: AsyncSession = Depends(get_s
 async def get_user_by_id(totvs_id: str, db: AsyncSession = Depends(get_session), current_user: user_model.User = Depends(oauth2.get_current_user)):
     return await user_repo.get_user_by_id(db, totvs_id)
         
-@router.get("/", response_model=list[user_model.User])
-async def get_all_users(db: AsyncSession = Depends(get_session), current_user: user_model.User = Depends(oauth2.get_current_user)):
-    return await user_repo.get_all_users(db)
+@router.get("/", response_model=Union[list[user_model.User], user_model.UserPage])
+async def get_all_users(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; when set the response is {items, next_cursor}"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_session),
+    current_user: user_model.User = Depends(oauth2.get_current_user),
+):
+    return await user_repo.get_all_users(db, limit, cursor)
 
 @router.delete("/{totvs_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(totvs_id: str, db: AsyncSession = Depends(get_session), current_user: user_model.User = Depends(oauth2.get_current_user)):
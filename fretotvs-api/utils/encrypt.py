@@ -1,11 +1,28 @@
+import hashlib
+import hmac
+from functools import lru_cache
 from cryptography.fernet import Fernet
 
+@lru_cache(maxsize=8)
+def get_fernet(key) -> Fernet:
+    # Fernet valida e decodifica a chave no construtor; reaproveita a instância
+    return Fernet(key)
+
 def encrypt_data(key, data: str) -> str:
-    f = Fernet(key)
+    f = get_fernet(key)
     encrypted_bytes = f.encrypt(data.encode())
     return encrypted_bytes.decode('utf-8')  # Converte bytes para string
 
 def decrypt_data(key, encrypted_data: str) -> str:
-    f = Fernet(key)
+    f = get_fernet(key)
     encrypted_bytes = encrypted_data.encode('utf-8')  # Converte string para bytes
-    return f.decrypt(encrypted_bytes).decode()
\ No newline at end of file
+    return f.decrypt(encrypted_bytes).decode()
+
+def blind_index(key, data: str) -> str:
+    """
+    HMAC-SHA256 determinístico do valor, para buscar por igualdade
+    em colunas criptografadas sem precisar descriptografar cada linha.
+    """
+    if isinstance(key, str):
+        key = key.encode()
+    return hmac.new(key, data.encode(), hashlib.sha256).hexdigest()
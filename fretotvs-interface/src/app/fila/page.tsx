@@ -174,26 +174,50 @@ function FilaPageContent() {
     }
   }, [searchParams]);
 
-  // Configurar atualização periódica dos ônibus da linha
+  // Ocupação dos ônibus da linha em tempo real (SSE); se o stream cair, volta a consultar a cada 5 segundos
   useEffect(() => {
     if (!lineId) return;
 
     // Buscar inicialmente
     fetchLineBuses(lineId);
 
-    // Configurar intervalo para atualizar a cada 5 segundos
-    const interval = setInterval(() => {
-      console.log('🔄 Atualizando dados dos ônibus...');
-      fetchLineBuses(lineId);
-    }, 5000); // 5 segundos
+    let interval: ReturnType<typeof setInterval> | null = null;
+    const unsubscribe = apiService.subscribeLineBuses(
+      parseInt(lineId),
+      (bus) => {
+        setLineBuses((current) => {
+          const others = current.filter((item) => item.prefix !== bus.prefix);
+          if (bus.deleted || bus.line_id !== parseInt(lineId)) return others;
+          return [...others, { ...bus, active_line_id: bus.line_id }].sort((a, b) => a.prefix - b.prefix);
+        });
+        setLastBusUpdate(new Date());
+      },
+      () => {
+        console.warn('⚠️ Stream de ocupação indisponível, voltando a consultar periodicamente');
+        interval = setInterval(() => {
+          console.log('🔄 Atualizando dados dos ônibus...');
+          fetchLineBuses(lineId);
+        }, 5000); // 5 segundos
+      },
+    );
 
     // Cleanup
     return () => {
-      console.log('🧹 Limpando intervalo de atualização dos ônibus');
-      clearInterval(interval);
+      console.log('🧹 Encerrando atualização dos ônibus');
+      unsubscribe();
+      if (interval) clearInterval(interval);
     };
   }, [lineId]);
 
+  // O primeiro ônibus da linha é o exibido em destaque
+  useEffect(() => {
+    if (lineBuses.length === 0) return;
+    const activeBus = lineBuses[0];
+    setBusCapacity(activeBus.capacity);
+    setBusOccupied(activeBus.occupied);
+    setBusPrefix(activeBus.prefix.toString());
+  }, [lineBuses]);
+
   // API integration removed
 
   const loadScheduleData = async (scheduleIdParam: string) => {
@@ -27,6 +27,14 @@ interface BusData {
   active_line_id: number;
 }
 
+interface BusEvent {
+  prefix: number;
+  line_id: number | null;
+  capacity: number;
+  occupied: number;
+  deleted?: boolean;
+}
+
 interface ApiResponse<T> {
   data: T;
   error?: string;
@@ -99,6 +107,17 @@ class ApiService {
     return this.makeRequest<BusData[]>(`/lines/${lineId}/buses`);
   }
 
+  // Stream (SSE) das alterações de ocupação dos ônibus da linha; retorna a função para encerrar
+  subscribeLineBuses(lineId: number, onBus: (bus: BusEvent) => void, onError?: () => void): () => void {
+    const source = new EventSource(`${this.baseUrl}/bus/stream?line_id=${lineId}`);
+    source.addEventListener('bus', (event) => onBus(JSON.parse((event as MessageEvent).data)));
+    source.onerror = () => {
+      source.close();
+      onError?.();
+    };
+    return () => source.close();
+  }
+
   // Método para verificar se a API está online
   async healthCheck(): Promise<boolean> {
     try {
@@ -132,4 +151,4 @@ class ApiService {
 export const apiService = new ApiService();
 
 // Exportar interfaces para uso em outros arquivos
-export type { BusData, LineData, CityData, Schedule, ApiResponse };
+export type { BusEvent, BusData, LineData, CityData, Schedule, ApiResponse };
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Carga de frota no broker MQTT: N ônibus simulados e um consumidor que mede a entrega.
+
+Cada ônibus é uma BusState com a mesma lógica do dispositivo (process_card,
+select_route, CardReadFilter, Queue): o motorista inicia a rota e, a cada
+paragem, alguns passageiros saem e outros entram, com rajadas de cartões
+segundo a hora do dia simulada (picos às 7-9h e 17-19h). O relógio simulado
+corre `--speed` vezes mais rápido que o real. As mensagens saem no formato
+wire com um número de sequência por ônibus.
+
+O consumidor (bus/#) mede por mensagem a latência ponta a ponta (agora - t
+do payload), as perdas e as trocas de ordem por ônibus, e no fim de cada
+etapa mostra vazão e percentis. Com várias etapas (--buses 100,500,2000) a
+tabela final mostra onde o broker satura. Para medir também a ingestão e o
+banco, corra o fretotvs-api/ingest.py no mesmo broker: o log dele mostra o
+atraso dos lotes aplicados (lag) e a fila pendente.
+
+Os ônibus simulados usam os prefixos a partir de --first-prefix: com a
+ingestão ligada, aponte-a para um banco de teste.
+
+Uso (dentro de iot-device/):
+    python benchmarks/fleet_load.py run --broker localhost:1883 --buses 100,500,1000,2000
+    python benchmarks/fleet_load.py consume --broker mqtt.local:1883          # numa máquina
+    python benchmarks/fleet_load.py publish --broker mqtt.local:1883 --buses 3000   # noutra
+"""
+
+import argparse
+import asyncio
+import bisect
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+IOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(IOT_DIR))
+
+import paho.mqtt.client as mqtt
+import wire
+from driver_logic import BusState, process_card, select_route
+from registry import Registry
+from drivers import load_drivers
+from routes import load_routes
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+parser.add_argument("mode", choices=("run", "publish", "consume"), help="run = gerador e consumidor no mesmo processo")
+parser.add_argument("--broker", default="localhost:1883", help="host:porta")
+parser.add_argument("--buses", default="100", help="Ônibus por etapa, separados por vírgula (ex: 100,500,2000)")
+parser.add_argument("--duration", type=float, default=30, help="Segundos reais por etapa")
+parser.add_argument("--speed", type=float, default=60, help="Segundos simulados por segundo real")
+parser.add_argument("--start-hour", type=float, default=7, help="Hora simulada no início (o pico muda a taxa)")
+parser.add_argument("--stop-interval", type=float, default=90, help="Segundos simulados entre paragens (média)")
+parser.add_argument("--boardings", type=float, default=2, help="Embarques por paragem fora do pico (média)")
+parser.add_argument("--exit-probability", type=float, default=0.25, help="Chance de cada passageiro sair numa paragem")
+parser.add_argument("--connections", type=int, default=16, help="Ligações MQTT do gerador (os ônibus são repartidos)")
+parser.add_argument("--qos", type=int, choices=(0, 1), default=1)
+parser.add_argument("--first-prefix", type=int, default=9000)
+parser.add_argument("--grace", type=float, default=15, help="Espera máxima pelas mensagens em trânsito no fim da etapa")
+parser.add_argument("--saturation-p99-ms", type=float, default=1000, help="p99 acima disto marca a etapa como saturada")
+parser.add_argument("--output", type=Path, help="Grava o relatório das etapas em JSON")
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+HOST, _, PORT = args.broker.partition(":")
+PORT = int(PORT or 1883)
+CONTROL_TOPIC = "loadtest/stage"
+
+# Multiplicador da taxa de embarques por hora do dia
+HOURLY_DEMAND = {5: 0.5, 6: 1.5, 7: 3, 8: 3, 9: 1.5, 12: 1.5, 16: 1.5, 17: 3, 18: 3, 19: 1.5, 22: 0.5, 23: 0.3}
+
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+def demand(sim_hour: float) -> float:
+    return HOURLY_DEMAND.get(int(sim_hour) % 24, 1)
+
+
+def poisson(rng: random.Random, mean: float) -> int:
+    # Knuth: médias pequenas (alguns passageiros por paragem)
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+class FleetPublisher:
+    """Ligações MQTT partilhadas pelos ônibus simulados; números de sequência por ônibus."""
+    def __init__(self, connections: int, client_prefix: str):
+        self.clients = []
+        for i in range(connections):
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"{client_prefix}-{i}")
+            client.connect(HOST, PORT, 60)
+            client.loop_start()
+            self.clients.append(client)
+        self.seqs: Counter = Counter()
+        self.sent = 0
+
+    def for_bus(self, index: int, bus_prefix: str) -> "BusPublisher":
+        return BusPublisher(self, self.clients[index % len(self.clients)], bus_prefix)
+
+    def publish(self, client, bus_prefix: str, topic: str, action: str, fields: dict):
+        self.seqs[bus_prefix] += 1
+        client.publish(topic, wire.encode(action, seq=self.seqs[bus_prefix], **fields), qos=args.qos)
+        self.sent += 1
+
+    def control(self, message: dict):
+        self.clients[0].publish(CONTROL_TOPIC, json.dumps(message), qos=1).wait_for_publish(10)
+
+    def close(self):
+        for client in self.clients:
+            client.disconnect()
+            client.loop_stop()
+
+
+class BusPublisher:
+    """Interface publish_event do EventPublisher, sem o diário (o gerador não simula quedas de sinal)."""
+    def __init__(self, fleet: FleetPublisher, client, bus_prefix: str):
+        self.fleet = fleet
+        self.client = client
+        self.bus_prefix = bus_prefix
+
+    def publish_event(self, topic: str, action: str, **fields):
+        self.fleet.publish(self.client, self.bus_prefix, topic, action, fields)
+
+
+class SimClock:
+    def __init__(self, start_hour: float):
+        self.started = time.monotonic()
+        self.start_ms = int(start_hour * 3600 * 1000)
+
+    def now_ms(self) -> int:
+        return self.start_ms + int((time.monotonic() - self.started) * args.speed * 1000)
+
+    def hour(self) -> float:
+        return self.now_ms() / 3_600_000
+
+    async def sleep(self, sim_seconds: float):
+        await asyncio.sleep(sim_seconds / args.speed)
+
+
+async def simulate_bus(index: int, fleet: FleetPublisher, registry: Registry, clock: SimClock,
+                       until: float, rng: random.Random):
+    bus_prefix = f"BUS-{args.first_prefix + index}"
+    state = BusState(bus_prefix)
+    publisher = fleet.for_bus(index, bus_prefix)
+    driver = rng.choice(list(registry.index.drivers.values()))["id"]
+    route = rng.choice(list(registry.index.routes.values()))
+
+    # Partidas espalhadas: nem todos os ônibus arrancam no mesmo instante
+    await clock.sleep(rng.uniform(0, args.stop_interval))
+    process_card(driver, registry, state, publisher, clock.now_ms())
+    select_route(route["name"], state, publisher, registry)
+
+    onboard: list[str] = []
+    next_passenger = 0
+    while time.monotonic() < until:
+        await clock.sleep(rng.expovariate(1 / args.stop_interval))
+        swipes = [card for card in onboard if rng.random() < args.exit_probability]
+        for _ in range(poisson(rng, args.boardings * demand(clock.hour()))):
+            swipes.append(f"{bus_prefix}-P{next_passenger}")
+            next_passenger += 1
+        rng.shuffle(swipes)
+        for card in swipes:
+            # Um cartão a cada 1-4 s simulados na porta
+            await clock.sleep(rng.uniform(1, 4))
+            before = state.queue.count()
+            process_card(card, registry, state, publisher, clock.now_ms())
+            if state.queue.count() > before:
+                onboard.append(card)
+            elif state.queue.count() < before:
+                onboard.remove(card)
+    process_card(driver, registry, state, publisher, clock.now_ms())
+
+
+async def publish_stage(buses: int, fleet: FleetPublisher, registry: Registry, rng: random.Random) -> dict:
+    clock = SimClock(args.start_hour)
+    fleet.seqs.clear()
+    sent_before = fleet.sent
+    fleet.control({"event": "start", "buses": buses})
+    started = time.monotonic()
+    until = started + args.duration
+    # A lógica do dispositivo imprime cada cartão: milhares de ônibus no terminal mediriam o terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        await asyncio.gather(*(simulate_bus(i, fleet, registry, clock, until, random.Random(rng.random()))
+                               for i in range(buses)))
+    elapsed = time.monotonic() - started
+    sent = fleet.sent - sent_before
+    fleet.control({"event": "end", "buses": buses, "sent": sent, "last_seq": dict(fleet.seqs)})
+    return {"buses": buses, "sent": sent, "publish_seconds": elapsed, "sent_per_second": sent / elapsed}
+
+
+class Consumer:
+    """Assina bus/# e o tópico de controlo; mede latência, perdas e ordem por etapa."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stage_done = threading.Event()
+        self.reports: list[dict] = []
+        self._reset()
+        self.subscribed = threading.Event()
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"fleet-load-consumer-{os.getpid()}")
+        self.client.on_connect = lambda client, *_: client.subscribe([("bus/#", args.qos), (CONTROL_TOPIC, 1)])
+        self.client.on_subscribe = lambda *_: self.subscribed.set()
+        self.client.on_message = self._on_message
+        self.client.connect(HOST, PORT, 60)
+        self.client.loop_start()
+        if not self.subscribed.wait(10):
+            raise RuntimeError(f"no SUBACK from {args.broker}")
+
+    def _reset(self):
+        self.latencies: list[float] = []
+        self.arrivals: Counter = Counter()  # segundo -> mensagens
+        self.last_seq: dict[str, int] = {}
+        self.seen: dict[str, set] = {}
+        self.reordered = 0
+        self.duplicates = 0
+        self.expected: dict | None = None
+        self.stage: dict | None = None
+
+    def _on_message(self, client, userdata, message):
+        now_ms = time.time_ns() / 1_000_000
+        if message.topic == CONTROL_TOPIC:
+            control = json.loads(message.payload)
+            with self.lock:
+                if control["event"] == "start":
+                    self._reset()
+                    self.stage = control
+                else:
+                    self.expected = control
+            return
+        try:
+            data = wire.decode(message.payload)
+        except ValueError:
+            return
+        bus = message.topic.split("/")[1]
+        seq = data.get("seq")
+        with self.lock:
+            self.latencies.append(now_ms - data["timestamp_ms"])
+            self.arrivals[int(now_ms // 1000)] += 1
+            if seq is None:
+                return
+            seen = self.seen.setdefault(bus, set())
+            if seq in seen:
+                self.duplicates += 1
+                return
+            seen.add(seq)
+            if seq < self.last_seq.get(bus, 0):
+                self.reordered += 1
+            else:
+                self.last_seq[bus] = seq
+            if self.expected and self._received() >= self.expected["sent"]:
+                self.stage_done.set()
+
+    def _received(self) -> int:
+        return sum(len(seen) for seen in self.seen.values())
+
+    def wait_stage(self, timeout: float) -> dict:
+        """Espera o fim da etapa (todas as mensagens anunciadas, ou `timeout` depois do anúncio) e faz o relatório."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if self.expected and self._received() >= self.expected["sent"]:
+                    break
+                if self.expected is None:
+                    deadline = time.monotonic() + timeout
+            self.stage_done.wait(0.2)
+        with self.lock:
+            report = self._report()
+            self.stage_done.clear()
+        self.reports.append(report)
+        return report
+
+    def _report(self) -> dict:
+        latencies = sorted(self.latencies)
+        received = self._received()
+        report = {"buses": (self.stage or {}).get("buses"), "received": received,
+                  "duplicates": self.duplicates, "reordered": self.reordered}
+        if self.expected:
+            expected_seqs = self.expected["last_seq"]
+            report["sent"] = self.expected["sent"]
+            report["lost"] = sum(expected_seqs.values()) - sum(
+                len(self.seen.get(bus, ())) for bus in expected_seqs)
+        if self.arrivals:
+            seconds = sorted(self.arrivals)
+            span = seconds[-1] - seconds[0] + 1
+            report["received_per_second"] = received / span
+            report["peak_per_second"] = max(self.arrivals.values())
+        if latencies:
+            for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p999", 0.999)):
+                report[f"{name}_ms"] = latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+            report["max_ms"] = latencies[-1]
+            counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            for latency in latencies:
+                counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency)] += 1
+            report["histogram"] = counts
+        return report
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+def print_report(report: dict):
+    sent = report.get("sent", "?")
+    print(f"\n== {report['buses']} ônibus: {report['received']}/{sent} mensagens recebidas, "
+          f"perdidas {report.get('lost', '?')}, fora de ordem {report['reordered']}, duplicadas {report['duplicates']}")
+    if "p50_ms" not in report:
+        return
+    print(f"   vazão {report['received_per_second']:,.0f} msg/s (pico {report['peak_per_second']:,}/s); "
+          f"latência p50 {report['p50_ms']:.1f} ms, p90 {report['p90_ms']:.1f}, p99 {report['p99_ms']:.1f}, "
+          f"p99.9 {report['p999_ms']:.1f}, máx {report['max_ms']:.1f}")
+    total = sum(report["histogram"])
+    labels = [f"< {bound} ms" for bound in LATENCY_BUCKETS_MS] + [f">= {LATENCY_BUCKETS_MS[-1]} ms"]
+    for label, count in zip(labels, report["histogram"]):
+        if count:
+            print(f"   {label:>11} {count:>9} {'#' * max(1, round(40 * count / total))}")
+
+
+def print_summary(reports: list[dict]):
+    print("\nônibus   enviadas/s  recebidas/s     p50 ms     p99 ms   perdidas  fora de ordem")
+    for report in reports:
+        saturated = report.get("lost") or report.get("p99_ms", 0) > args.saturation_p99_ms
+        print(f"{report['buses']:>6} {report.get('sent_per_second', 0):>12,.0f} {report.get('received_per_second', 0):>12,.0f} "
+              f"{report.get('p50_ms', 0):>10.1f} {report.get('p99_ms', 0):>10.1f} {report.get('lost', '?'):>10} "
+              f"{report['reordered']:>14}{'   <- saturado' if saturated else ''}")
+
+
+def stage_sizes() -> list[int]:
+    return [int(size) for size in args.buses.split(",")]
+
+
+def load_registry() -> Registry:
+    drivers_path, routes_path = str(IOT_DIR / "drivers.json"), str(IOT_DIR / "routes.json")
+    registry = Registry(drivers_path, routes_path)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # A lotação do routes.json (3 a 45) enche depressa numa simulação longa: pelo menos 80 lugares
+        routes = [{**route, "capacity": max(route["capacity"], 80)} for route in load_routes(routes_path)]
+        registry.load(load_drivers(drivers_path), routes)
+    return registry
+
+
+async def publish_all(consumer: Consumer | None) -> list[dict]:
+    rng = random.Random(args.seed)
+    registry = load_registry()
+    fleet = FleetPublisher(args.connections, f"fleet-load-{os.getpid()}")
+    reports = []
+    try:
+        for buses in stage_sizes():
+            stage = await publish_stage(buses, fleet, registry, rng)
+            print(f"{buses} ônibus: {stage['sent']} mensagens publicadas em {stage['publish_seconds']:.1f}s "
+                  f"({stage['sent_per_second']:,.0f}/s)")
+            if consumer is not None:
+                report = {**stage, **await asyncio.to_thread(consumer.wait_stage, args.grace)}
+                print_report(report)
+                reports.append(report)
+    finally:
+        fleet.close()
+    return reports
+
+
+def main() -> int:
+    if args.mode == "consume":
+        consumer = Consumer()
+        print(f"A escutar bus/# em {args.broker}; Ctrl+C para terminar.")
+        try:
+            while True:
+                print_report(consumer.wait_stage(args.grace))
+        except KeyboardInterrupt:
+            reports = consumer.reports
+        finally:
+            consumer.close()
+    else:
+        consumer = Consumer() if args.mode == "run" else None
+        try:
+            reports = asyncio.run(publish_all(consumer))
+        finally:
+            if consumer is not None:
+                consumer.close()
+    if reports:
+        print_summary(reports)
+    if args.output:
+        args.output.write_text(json.dumps(reports, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Replay de leituras RFID pelo filtro de repetições (CardReadFilter) e pela Queue.
+
+Lê um fluxo gravado (CSV "ms,cartão", uma leitura por linha, em ordem de
+tempo) ou gera um sintético: toques de passageiros a chegar a uma taxa fixa,
+cada um com uma rajada de leituras repetidas e, às vezes, o cartão encostado
+durante segundos ou um segundo toque nervoso antes do tempo mínimo. Mede a
+vazão do filtro sozinho e com a Queue, compara os toques aceites com os reais
+(no sintético) e com o que a Queue faria sem filtro, e confere que a memória
+fica constante.
+
+Uso (dentro de iot-device/):
+    python benchmarks/replay_reads.py
+    python benchmarks/replay_reads.py --reads 1000000 --taps-per-second 50
+    python benchmarks/replay_reads.py --record /tmp/leituras.csv     # grava o fluxo sintético
+    python benchmarks/replay_reads.py --file /tmp/leituras.csv       # reproduz um fluxo gravado
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from queue_func import Queue, CardReadFilter
+from config import RFID_REPEAT_WINDOW_MS, RFID_MIN_DWELL_MS, RFID_BUFFER_SIZE
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+parser.add_argument("--file", type=Path, help="CSV gravado (ms,cartão); padrão: fluxo sintético")
+parser.add_argument("--record", type=Path, help="Grava o fluxo sintético neste CSV e sai")
+parser.add_argument("--reads", type=int, default=200000, help="Leituras do fluxo sintético")
+parser.add_argument("--cards", type=int, default=2000, help="Cartões distintos no fluxo sintético")
+parser.add_argument("--taps-per-second", type=float, default=20)
+parser.add_argument("--held", type=float, default=0.05, help="Fração de toques com o cartão encostado 1-3 s")
+parser.add_argument("--retap", type=float, default=0.05, help="Fração de toques repetidos antes do tempo mínimo")
+parser.add_argument("--window-ms", type=int, default=RFID_REPEAT_WINDOW_MS)
+parser.add_argument("--min-dwell-ms", type=int, default=RFID_MIN_DWELL_MS)
+parser.add_argument("--capacity", type=int, default=RFID_BUFFER_SIZE)
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+
+def synthetic_reads(rng: random.Random) -> tuple[list[tuple[int, str]], int]:
+    """(leituras em ordem de tempo, número de toques reais)."""
+    reads = []
+    last_tap: dict[str, int] = {}
+    now = 0.0
+    taps = 0
+    while len(reads) < args.reads:
+        now += rng.expovariate(args.taps_per_second) * 1000
+        tap_ms = int(now)
+        # Um toque real do mesmo cartão nunca vem antes do tempo mínimo (entrar e sair leva minutos)
+        card = f"P{rng.randrange(args.cards)}"
+        if tap_ms - last_tap.get(card, -10**9) < 2 * args.min_dwell_ms:
+            continue
+        last_tap[card] = tap_ms
+        taps += 1
+        held = rng.random() < args.held
+        if held:
+            count, gap = rng.randint(10, 30), (90, 110)
+        else:
+            count, gap = rng.randint(2, 8), (30, 150)
+        at = tap_ms
+        for _ in range(count):
+            reads.append((at, card))
+            last_read = at
+            at += rng.randint(*gap)
+        # Segundo toque logo a seguir: não é um toque novo, o filtro deve ignorá-lo pelo tempo mínimo
+        earliest, latest = last_read + args.window_ms, tap_ms + args.min_dwell_ms - 100
+        if not held and earliest < latest and rng.random() < args.retap:
+            at = rng.randint(earliest, latest)
+            for _ in range(rng.randint(1, 3)):
+                if at >= tap_ms + args.min_dwell_ms:
+                    break
+                reads.append((at, card))
+                at += rng.randint(*gap)
+    reads.sort()
+    return reads, taps
+
+
+def load_reads(path: Path) -> list[tuple[int, str]]:
+    with open(path, newline="") as f:
+        return [(int(ms), card) for ms, card in csv.reader(f)]
+
+
+def run_filter(reads: list[tuple[int, str]]) -> CardReadFilter:
+    reads_filter = CardReadFilter(args.window_ms, args.min_dwell_ms, args.capacity)
+    started = time.perf_counter()
+    for ms, card in reads:
+        reads_filter.accept(card, ms)
+    elapsed = time.perf_counter() - started
+
+    # Segunda passagem só para a memória (o tracemalloc distorce o tempo)
+    measured = CardReadFilter(args.window_ms, args.min_dwell_ms, args.capacity)
+    tracemalloc.start()
+    max_index = 0
+    for i, (ms, card) in enumerate(reads):
+        measured.accept(card, ms)
+        if i % 1000 == 0:
+            max_index = max(max_index, len(measured.index))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"filtro:        {len(reads) / elapsed:>12,.0f} leituras/s   pico de memória {peak / 1024:,.0f} KiB, "
+          f"índice com até {max_index} cartões (buffer {args.capacity})")
+    return reads_filter
+
+
+def run_queue(reads: list[tuple[int, str]], with_filter: bool) -> tuple[int, float]:
+    queue = Queue(max_capacity=10**9)
+    reads_filter = CardReadFilter(args.window_ms, args.min_dwell_ms, args.capacity)
+    toggles = 0
+    started = time.perf_counter()
+    # Os beeps da Queue são prints: fora da medição do terminal
+    with contextlib.redirect_stdout(io.StringIO()):
+        for ms, card in reads:
+            if with_filter and not reads_filter.accept(card, ms):
+                continue
+            if queue.process_passenger(card):
+                toggles += 1
+    return toggles, time.perf_counter() - started
+
+
+def main() -> int:
+    rng = random.Random(args.seed)
+    taps = None
+    if args.file:
+        reads = load_reads(args.file)
+    else:
+        reads, taps = synthetic_reads(rng)
+    if args.record:
+        with open(args.record, "w", newline="") as f:
+            csv.writer(f).writerows(reads)
+        print(f"{len(reads)} leituras ({taps} toques) gravadas em {args.record}")
+        return 0
+
+    span_s = (reads[-1][0] - reads[0][0]) / 1000 if reads else 0
+    print(f"{len(reads)} leituras em {span_s:,.0f} s de gravação"
+          + (f", {taps} toques reais" if taps is not None else ""))
+
+    reads_filter = run_filter(reads)
+    toggles, elapsed = run_queue(reads, with_filter=True)
+    naive, _ = run_queue(reads, with_filter=False)
+    print(f"filtro+Queue:  {len(reads) / elapsed:>12,.0f} leituras/s")
+    print(f"alternâncias:  {toggles} com filtro, {naive} sem filtro")
+    print(reads_filter.stats)
+
+    failures = []
+    if taps is not None and toggles != taps:
+        failures.append(f"{toggles} alternâncias para {taps} toques reais")
+    if reads_filter.stats["overrun"]:
+        failures.append(f"{reads_filter.stats['overrun']} leituras sobrescritas antes de expirar; aumente --capacity")
+    for failure in failures:
+        print(f"FALHA: {failure}")
+    print("OK" if not failures else f"{len(failures)} falha(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
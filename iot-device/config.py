@@ -6,4 +6,24 @@ ROUTES_JSON = "routes.json"
 MQTT_BROKER = "test.mosquitto.org"
 MQTT_PORT = 1883
 MQTT_TOPIC_QUEUE = f"bus/{BUS_PREFIX}/queue"
-MQTT_TOPIC_DRIVER = f"bus/{BUS_PREFIX}/driver_event"
\ No newline at end of file
+MQTT_TOPIC_DRIVER = f"bus/{BUS_PREFIX}/driver_event"
+
+# Diário local dos eventos (store-and-forward enquanto não há sinal)
+JOURNAL_PATH = "journal.db"
+JOURNAL_MAX_EVENTS = 200000
+JOURNAL_MAX_INFLIGHT = 100
+
+# Tarefas periódicas do runtime (segundos)
+HEARTBEAT_INTERVAL = 30
+JOURNAL_COMPACT_INTERVAL = 60
+
+# Leitor RFID: leituras repetidas do mesmo cartão (ms)
+RFID_REPEAT_WINDOW_MS = 500
+RFID_MIN_DWELL_MS = 5000
+RFID_BUFFER_SIZE = 4096
+
+# Cadastro de motoristas e rotas: ficheiros relidos quando mudam e, com a URL
+# da API definida, mudanças puxadas de GET /device/registry
+REGISTRY_API_URL = None  # ex: "https://api.fretotvs.com"
+REGISTRY_CACHE = "registry_cache.json"
+REGISTRY_REFRESH_INTERVAL = 30
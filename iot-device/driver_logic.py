@@ -1,83 +1,94 @@
-import threading
-from utils import intermittent_beep, current_timestamp
-from queue_func import Queue
-from routes import get_route_by_name
+from utils import intermittent_beep
+from queue_func import Queue, CardReadFilter
+from config import RFID_REPEAT_WINDOW_MS, RFID_MIN_DWELL_MS, RFID_BUFFER_SIZE
 
-# As variáveis de estado permanecem as mesmas
-route_confirmed = False
-current_line = None
-current_driver = None
 
-def request_driver_route_and_set_capacity(card_id, mqtt_client, bus_prefix, queue: Queue, routes: list):
+class BusState:
     """
-    Função SIMPLIFICADA que agora corre no fluxo principal.
-    Pede a rota, valida-a e define a capacidade da fila.
+    Estado de um ônibus: viagem em curso e fila de passageiros.
+
+    Só é alterado pela tarefa que processa os cartões (runtime.py), por isso
+    não precisa de trinco.
+    """
+    def __init__(self, bus_prefix: str):
+        self.bus_prefix = bus_prefix
+        self.queue = Queue()
+        self.reads = CardReadFilter(RFID_REPEAT_WINDOW_MS, RFID_MIN_DWELL_MS, RFID_BUFFER_SIZE)
+        self.route_confirmed = False
+        self.current_line = None
+        self.current_driver = None
+        # Motorista que passou o cartão e ainda não escolheu a rota
+        self.awaiting_route_driver = None
+
+    def reset(self):
+        self.queue.reset()
+        self.route_confirmed = False
+        self.current_line = None
+        self.current_driver = None
+        self.awaiting_route_driver = None
+
+
+def select_route(chosen_line, state: BusState, publisher, registry) -> bool:
+    """
+    Rota escolhida pelo motorista que está à espera: valida-a, define a
+    capacidade da fila e inicia a viagem.
     """
-    global route_confirmed, current_line
-    
-    print(f"[APP] Motorista {card_id} deve selecionar uma rota válida.")
-    
-    selected_route_data = None
-    while not selected_route_data:
-        # O input agora acontece aqui, de forma direta.
-        chosen_line = input("Digite a linha escolhida: ").strip()
-        selected_route_data = get_route_by_name(chosen_line, routes)
-        if not selected_route_data:
-            print(f"[AVISO] Rota '{chosen_line}' não encontrada. Tente novamente (Ex: LINHA-CENTRO).")
+    if state.awaiting_route_driver is None:
+        print(f"[AVISO] Linha '{chosen_line}' ignorada: nenhum motorista está a escolher rota.")
+        return False
 
-    current_line = selected_route_data["name"]
+    selected_route_data = registry.get_route(chosen_line)
+    if not selected_route_data:
+        print(f"[AVISO] Rota '{chosen_line}' não encontrada. Tente novamente (Ex: LINHA-CENTRO).")
+        return False
+
+    state.current_driver = state.awaiting_route_driver
+    state.awaiting_route_driver = None
+    state.current_line = selected_route_data["name"]
     route_capacity = selected_route_data["capacity"]
-    
-    queue.update_capacity(route_capacity)
-    route_confirmed = True
-    print(f"[APP] Rota confirmada: {current_line}")
-    
-    payload = {
-        "action": "start_route",
-        "bus_prefix": bus_prefix,
-        "driver_id": card_id,
-        "line": current_line,
-        "capacity": route_capacity,
-        "timestamp": current_timestamp()
-    }
-    mqtt_client.publish(f"bus/{bus_prefix}/driver_event", payload=str(payload), qos=1)
 
-def process_card(card_id, driver_ids, queue: Queue, mqtt_client, bus_prefix, routes: list):
+    state.queue.update_capacity(route_capacity)
+    state.route_confirmed = True
+    print(f"[APP] Rota confirmada: {state.current_line}")
+
+    publisher.publish_event(f"bus/{state.bus_prefix}/driver_event", "start_route", bus_prefix=state.bus_prefix, driver_id=state.current_driver, line=state.current_line, capacity=route_capacity)
+    return True
+
+
+def process_card(card_id, registry, state: BusState, publisher, read_ms: int | None = None):
     """
-    Função principal de processamento, agora sem threading para pedir a rota.
+    Processa um cartão passado no leitor. Não bloqueia: a escolha da rota
+    chega depois, por select_route. Leituras repetidas do mesmo toque são
+    descartadas antes de chegar à fila (CardReadFilter).
     """
-    global route_confirmed, current_line, current_driver
+    if not state.reads.accept(card_id, read_ms):
+        return
+    bus_prefix = state.bus_prefix
 
-    if card_id in driver_ids:
-        current_driver = card_id
-        if not route_confirmed:
-            
-            # O programa  espera que a rota seja inserida.
-            request_driver_route_and_set_capacity(card_id, mqtt_client, bus_prefix, queue, routes)
+    driver = registry.get_driver(card_id)
+    if driver:
+        # Id como está no cadastro, não como o leitor o devolveu
+        card_id = driver["id"]
+        if not state.route_confirmed:
+            state.awaiting_route_driver = card_id
+            print(f"[APP] Motorista {card_id} deve selecionar uma rota válida (digite o nome da linha).")
         else:
-            #  lógica para terminar a rota 
-            payload = { "action": "end_route", "bus_prefix": bus_prefix, "driver_id": card_id, "line": current_line, "queue_count": queue.count(), "timestamp": current_timestamp() }
-            mqtt_client.publish(f"bus/{bus_prefix}/driver_event", payload=str(payload), qos=1)
+            #  lógica para terminar a rota
+            publisher.publish_event(f"bus/{bus_prefix}/driver_event", "end_route", bus_prefix=bus_prefix, driver_id=card_id, line=state.current_line, queue_count=state.queue.count())
             print(f"[AÇÃO] Rota encerrada pelo motorista {card_id}.")
-            queue.reset()
-            route_confirmed = False
-            current_line = None
-            current_driver = None
+            state.reset()
     else:
         # lógica do passageiro .
-        if not route_confirmed:
+        if not state.route_confirmed:
             print("[AVISO] A viagem ainda não foi iniciada. Embarque não permitido.")
             intermittent_beep()
             return
-        
-        action_result = queue.process_passenger(card_id)
+
+        action_result = state.queue.process_passenger(card_id)
 
         if action_result == "CHECKIN":
-            payload = { "action": "passenger_entry", "line": current_line, "passenger_id": card_id, "queue_count": queue.count(), "timestamp": current_timestamp() }
-            mqtt_client.publish(f"bus/{bus_prefix}/queue", payload=str(payload), qos=1)
+            publisher.publish_event(f"bus/{bus_prefix}/queue", "passenger_entry", line=state.current_line, passenger_id=card_id, queue_count=state.queue.count())
             print(f"[AÇÃO] Passageiro {card_id} entrou (Check-in).")
         elif action_result == "CHECKOUT":
-            payload = { "action": "passenger_exit", "line": current_line, "passenger_id": card_id, "queue_count": queue.count(), "timestamp": current_timestamp() }
-            mqtt_client.publish(f"bus/{bus_prefix}/queue", payload=str(payload), qos=1)
+            publisher.publish_event(f"bus/{bus_prefix}/queue", "passenger_exit", line=state.current_line, passenger_id=card_id, queue_count=state.queue.count())
             print(f"[AÇÃO] Passageiro {card_id} saiu (Check-out).")
-
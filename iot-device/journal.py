@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+import time
+
+
+class Journal:
+    """
+    Diário local (SQLite em modo WAL) de todos os eventos publicados pelo dispositivo.
+
+    Cada evento recebe um número de sequência crescente (nunca reutilizado, mesmo
+    depois de apagado) e fica pendente até o broker confirmar a entrega (PUBACK).
+    Os confirmados são apagados em lote pela compactação; acima de `max_events`
+    os mais antigos saem primeiro, para o ficheiro nunca crescer sem limite.
+    """
+    def __init__(self, path: str, max_events: int = 200000, compact_every: int = 100):
+        self.path = path
+        self.max_events = max_events
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        # Usado pela thread principal (leitor RFID) e pela thread do cliente MQTT
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # FULL: um evento gravado sobrevive a um corte de energia
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " topic TEXT NOT NULL,"
+            " payload BLOB,"
+            " created_ms INTEGER NOT NULL,"
+            " acked INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS ix_events_pending ON events (acked, seq)")
+        self.acked_since_compact = 0
+
+    def append(self, topic: str, build_payload) -> int:
+        """Grava o evento; `build_payload(seq)` monta a mensagem já com o número de sequência."""
+        return self.append_many([(topic, build_payload)])[0]
+
+    def append_many(self, events: list[tuple[str, object]]) -> list[int]:
+        """Vários eventos numa transação só (um fsync): rajadas de cartões não esperam o disco um a um."""
+        with self.lock:
+            seqs = []
+            created_ms = time.time_ns() // 1_000_000
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for topic, build_payload in events:
+                    seq = self.db.execute(
+                        "INSERT INTO events (topic, created_ms) VALUES (?, ?)", (topic, created_ms)
+                    ).lastrowid
+                    self.db.execute("UPDATE events SET payload = ? WHERE seq = ?", (build_payload(seq), seq))
+                    seqs.append(seq)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            if seqs:
+                self._enforce_limit(seqs[-1])
+            return seqs
+
+    def pending(self, after_seq: int = 0, limit: int = 100) -> list[tuple[int, str, bytes]]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT seq, topic, payload FROM events WHERE acked = 0 AND seq > ? ORDER BY seq LIMIT ?",
+                (after_seq, limit),
+            ).fetchall()
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM events WHERE acked = 0").fetchone()[0]
+
+    def ack(self, seq: int):
+        with self.lock:
+            self.db.execute("UPDATE events SET acked = 1 WHERE seq = ?", (seq,))
+            self.acked_since_compact += 1
+            if self.acked_since_compact >= self.compact_every:
+                self._compact()
+
+    def compact(self):
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        self.db.execute("DELETE FROM events WHERE acked = 1")
+        self.db.execute("PRAGMA incremental_vacuum")
+        # Devolve o WAL ao tamanho zero; só funciona sem leitores abertos, senão fica para a próxima
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.acked_since_compact = 0
+
+    def _enforce_limit(self, last_seq: int):
+        # Limite superior barato (o índice da chave): só conta de verdade quando pode ter estourado
+        first_seq = self.db.execute("SELECT MIN(seq) FROM events").fetchone()[0]
+        if last_seq - first_seq + 1 <= self.max_events:
+            return
+        self._compact()
+        excess = self.db.execute("SELECT COUNT(*) FROM events").fetchone()[0] - self.max_events
+        if excess > 0:
+            print(f"[AVISO] Diário cheio: {excess} evento(s) mais antigo(s) não enviado(s) descartado(s).")
+            self.db.execute("DELETE FROM events WHERE seq IN (SELECT seq FROM events ORDER BY seq LIMIT ?)", (excess,))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
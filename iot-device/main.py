@@ -1,30 +1,31 @@
-from config import BUS_PREFIX, DRIVERS_JSON, ROUTES_JSON
+import asyncio
+from config import BUS_PREFIX, DRIVERS_JSON, ROUTES_JSON, REGISTRY_API_URL, REGISTRY_CACHE
 from drivers import load_drivers
 from routes import load_routes
-from queue_func import Queue
-from driver_logic import process_card
-from mqtt_client import create_mqtt_client
+from registry import Registry
+from runtime import run
+from mqtt_client import create_event_publisher
 
 def main():
     print("=== Raspberry Queue Simulator ===")
     print(f"Bus prefix: {BUS_PREFIX}")
 
-    # Carrega os dados de motoristas e rotas no início
-    drivers = load_drivers(DRIVERS_JSON)
-    routes = load_routes(ROUTES_JSON)
-    driver_ids = {d["id"] for d in drivers}
+    # Carrega os dados de motoristas e rotas no início; depois o runtime mantém-nos atualizados
+    registry = Registry(DRIVERS_JSON, ROUTES_JSON, api_url=REGISTRY_API_URL, cache_path=REGISTRY_CACHE)
+    registry.load(load_drivers(DRIVERS_JSON), load_routes(ROUTES_JSON))
+    if REGISTRY_API_URL:
+        registry.pull_delta()
 
-    # A fila começa sem uma capacidade máxima definida.
-    
-    queue = Queue() 
-    mqtt_client = create_mqtt_client()
+    publisher = create_event_publisher()
 
-    while True:
-        card_id = input("Swipe card (enter ID): ").strip()
-        if card_id:
-            # Passa a lista de rotas para o processador de cartões
-            process_card(card_id, driver_ids, queue, mqtt_client, BUS_PREFIX, routes)
+    # Cartões e nomes de linha chegam pela mesma entrada, um por linha
+    print("Swipe card (enter ID) or type the chosen line:")
+    try:
+        asyncio.run(run(registry, publisher, BUS_PREFIX))
+    except KeyboardInterrupt:
+        print("\n[INFO] A encerrar; eventos não confirmados ficam no diário.")
+    finally:
+        publisher.stop()
 
 if __name__ == "__main__":
     main()
-
@@ -1,10 +1,135 @@
+import threading
 import paho.mqtt.client as mqtt
-from config import MQTT_BROKER, MQTT_PORT
-
-def create_mqtt_client(on_connect=None):
-    client = mqtt.Client()
-    if on_connect:
-        client.on_connect = on_connect
-    client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    client.loop_start()
-    return client
+import wire
+from journal import Journal
+from config import MQTT_BROKER, MQTT_PORT, JOURNAL_PATH, JOURNAL_MAX_EVENTS, JOURNAL_MAX_INFLIGHT
+
+class EventPublisher:
+    """
+    Publica os eventos do ônibus sem perdê-los quando o sinal cai.
+
+    Todo evento vai primeiro para o diário local (journal.py) com um número de
+    sequência e só sai de lá depois do PUBACK do broker. Uma thread própria
+    envia em ordem de sequência, no máximo `max_inflight` por vez; ao
+    reconectar, o que ficou sem confirmação é reenviado (o backend descarta as
+    repetidas).
+    """
+    def __init__(self, journal: Journal, max_inflight: int = 100):
+        self.journal = journal
+        self.max_inflight = max_inflight
+        # Nunca segurado durante chamadas ao paho: os callbacks dele também o usam
+        self.lock = threading.Lock()
+        self.inflight: dict[int, int] = {}  # mid -> seq
+        self.early_acks: set[int] = set()   # PUBACK que chegou antes de publish() retornar
+        self.last_sent_seq = 0
+        self.wakeup = threading.Event()
+        self.running = False
+        self.sender: threading.Thread | None = None
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+
+    def start(self):
+        pending = self.journal.pending_count()
+        if pending:
+            print(f"[INFO] {pending} evento(s) pendente(s) no diário serão reenviados ao conectar.")
+        self.running = True
+        self.sender = threading.Thread(target=self._send_loop, name="journal-sender", daemon=True)
+        self.sender.start()
+        # connect_async: o dispositivo pode ligar sem sinal; o loop reconecta sozinho
+        self.client.connect_async(MQTT_BROKER, MQTT_PORT, 60)
+        self.client.loop_start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.sender is not None:
+            self.sender.join()
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.journal.compact()
+        self.journal.close()
+
+    def publish_event(self, topic: str, action: str, **fields) -> int:
+        """Grava o evento no diário e envia assim que possível. Retorna o número de sequência."""
+        return self.publish_events([(topic, action, fields)])[0]
+
+    def publish_events(self, events: list[tuple[str, str, dict]]) -> list[int]:
+        """Como publish_event, para um lote de (tópico, ação, campos) gravado de uma vez."""
+        seqs = self.journal.append_many([
+            (topic, lambda seq, action=action, fields=fields: wire.encode(action, seq=seq, **fields))
+            for topic, action, fields in events
+        ])
+        self.wakeup.set()
+        return seqs
+
+    def publish_transient(self, topic: str, action: str, **fields) -> bool:
+        """Envia fora do diário (QoS 0), para o que só vale no momento, como o heartbeat. False sem ligação."""
+        if not self.client.is_connected():
+            return False
+        return self.client.publish(topic, payload=wire.encode(action, **fields), qos=0).rc == mqtt.MQTT_ERR_SUCCESS
+
+    def _send_loop(self):
+        while self.running:
+            # O timeout cobre um wakeup perdido; o normal é acordar por evento
+            self.wakeup.wait(1)
+            self.wakeup.clear()
+            if self.running:
+                self._pump()
+
+    def _pump(self):
+        if not self.client.is_connected():
+            return
+        with self.lock:
+            room = self.max_inflight - len(self.inflight)
+            after_seq = self.last_sent_seq
+        if room <= 0:
+            return
+        for seq, topic, payload in self.journal.pending(after_seq, room):
+            info = self.client.publish(topic, payload=payload, qos=1)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                # Conexão caiu no meio: o resto sai na reconexão
+                break
+            with self.lock:
+                self.last_sent_seq = seq
+                if info.mid in self.early_acks:
+                    self.early_acks.discard(info.mid)
+                    acked = True
+                else:
+                    self.inflight[info.mid] = seq
+                    acked = False
+            if acked:
+                self.journal.ack(seq)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            print(f"[ERRO] Falha na conexão MQTT: {reason_code}")
+            return
+        with self.lock:
+            # Sem confirmação até aqui: tudo o que não foi confirmado volta a ser enviado
+            self.inflight.clear()
+            self.early_acks.clear()
+            self.last_sent_seq = 0
+        pending = self.journal.pending_count()
+        if pending:
+            print(f"[INFO] Ligado ao broker; a reenviar {pending} evento(s) pendente(s).")
+        self.wakeup.set()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        print(f"[AVISO] Ligação MQTT perdida ({reason_code}); eventos ficam no diário até voltar.")
+
+    def _on_publish(self, client, userdata, mid, reason_code, properties):
+        with self.lock:
+            seq = self.inflight.pop(mid, None)
+            if seq is None:
+                self.early_acks.add(mid)
+        if seq is not None:
+            self.journal.ack(seq)
+        self.wakeup.set()
+
+
+def create_event_publisher():
+    publisher = EventPublisher(Journal(JOURNAL_PATH, max_events=JOURNAL_MAX_EVENTS), max_inflight=JOURNAL_MAX_INFLIGHT)
+    publisher.start()
+    return publisher
@@ -1,5 +1,87 @@
+import time
 from utils import single_beep, double_beep
 
+
+class CardReadFilter:
+    """
+    Etapa entre o leitor RFID e a Queue: decide que leituras são um toque novo.
+
+    O leitor repete o mesmo cartão várias vezes em poucas centenas de ms (e sem
+    parar enquanto o cartão fica encostado). Uma leitura é descartada se o
+    mesmo cartão foi lido há menos de `window_ms` (janela deslizante) ou se a
+    última alternância entrada/saída dele foi há menos de `min_dwell_ms`.
+
+    As leituras ficam num buffer circular de tamanho fixo, com um índice
+    cartão -> posição da leitura mais recente; o que sai da janela (ou é
+    sobrescrito) sai do índice. Memória constante, O(1) por leitura. O buffer
+    deve comportar as leituras de uma janela inteira (taxa x horizonte);
+    leituras sobrescritas antes do tempo contam em stats["overrun"].
+    """
+    def __init__(self, window_ms: int = 500, min_dwell_ms: int = 5000, capacity: int = 4096):
+        self.window_ms = window_ms
+        self.min_dwell_ms = min_dwell_ms
+        # Depois disto uma entrada não influencia mais nenhuma decisão
+        self.horizon_ms = max(window_ms, min_dwell_ms)
+        self.capacity = capacity
+        self.cards = [None] * capacity
+        self.seen_ms = [0] * capacity
+        self.toggled_ms = [0] * capacity
+        self.head = 0    # próxima posição a escrever
+        self.size = 0
+        self.index: dict[str, int] = {}
+        self.stats = {"reads": 0, "accepted": 0, "repeats": 0, "dwell": 0, "overrun": 0}
+
+    def accept(self, card_id: str, now_ms: int | None = None) -> bool:
+        """True se a leitura é um toque novo (deve ir para a Queue)."""
+        if now_ms is None:
+            now_ms = time.monotonic_ns() // 1_000_000
+        self.stats["reads"] += 1
+        self._expire(now_ms)
+
+        slot = self.index.get(card_id)
+        toggled_ms = None
+        accepted = True
+        if slot is not None:
+            toggled_ms = self.toggled_ms[slot]
+            if now_ms - self.seen_ms[slot] < self.window_ms:
+                self.stats["repeats"] += 1
+                accepted = False
+            elif toggled_ms is not None and now_ms - toggled_ms < self.min_dwell_ms:
+                self.stats["dwell"] += 1
+                accepted = False
+        if accepted:
+            self.stats["accepted"] += 1
+            toggled_ms = now_ms
+        self._push(card_id, now_ms, toggled_ms)
+        return accepted
+
+    def _push(self, card_id: str, now_ms: int, toggled_ms: int | None):
+        slot = self.head
+        if self.size == self.capacity:
+            # Buffer cheio: a leitura mais antiga é sobrescrita antes de expirar
+            old = self.cards[slot]
+            if self.index.get(old) == slot:
+                del self.index[old]
+                self.stats["overrun"] += 1
+        else:
+            self.size += 1
+        self.cards[slot] = card_id
+        self.seen_ms[slot] = now_ms
+        self.toggled_ms[slot] = toggled_ms
+        self.index[card_id] = slot
+        self.head = (slot + 1) % self.capacity
+
+    def _expire(self, now_ms: int):
+        tail = (self.head - self.size) % self.capacity
+        while self.size and now_ms - self.seen_ms[tail] >= self.horizon_ms:
+            card = self.cards[tail]
+            if self.index.get(card) == tail:
+                del self.index[card]
+            self.cards[tail] = None
+            tail = (tail + 1) % self.capacity
+            self.size -= 1
+
+
 class Queue:
     """
     Classe que gere o estado da fila de passageiros.
@@ -0,0 +1,170 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+
+class RegistryIndex:
+    """Índices imutáveis (chave case-folded -> registo); trocados inteiros, nunca alterados."""
+    def __init__(self, drivers: dict[str, dict], routes: dict[str, dict]):
+        self.drivers = drivers
+        self.routes = routes
+
+
+class Registry:
+    """
+    Motoristas e rotas aceites pelo dispositivo, com procura O(1) por cartão ou nome.
+
+    A base vem de drivers.json e routes.json; por cima dela aplicam-se as
+    mudanças puxadas da API (GET /device/registry?since=versão), guardadas em
+    `cache_path` para valerem também depois de reiniciar sem rede. refresh()
+    relê os ficheiros quando o mtime muda e puxa o delta; corre fora do event
+    loop e só no fim troca `self.index` (uma atribuição), por isso quem
+    processa cartões nunca espera nem vê um índice a meio.
+    """
+    def __init__(self, drivers_path: str, routes_path: str, api_url: str | None = None,
+                 cache_path: str | None = None, timeout: float = 10):
+        self.drivers_path = drivers_path
+        self.routes_path = routes_path
+        self.api_url = api_url.rstrip("/") if api_url else None
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.file_stamps = {}
+        self.base_drivers: dict[str, dict] = {}
+        self.base_routes: dict[str, dict] = {}
+        # Mudanças da API: chave -> registo, ou None para remoção
+        self.remote_drivers: dict[str, dict | None] = {}
+        self.remote_routes: dict[str, dict | None] = {}
+        self.version = 0
+        self.etag = None
+        self.index = RegistryIndex({}, {})
+        self._load_cache()
+
+    @staticmethod
+    def key(value: str) -> str:
+        return value.strip().casefold()
+
+    def is_driver(self, card_id: str) -> bool:
+        return self.key(card_id) in self.index.drivers
+
+    def get_driver(self, card_id: str) -> dict | None:
+        return self.index.drivers.get(self.key(card_id))
+
+    def get_route(self, name: str) -> dict | None:
+        return self.index.routes.get(self.key(name))
+
+    def load(self, drivers: list, routes: list):
+        """Base inicial já lida (load_drivers/load_routes, que param o programa se faltar ficheiro)."""
+        self.file_stamps = {path: self._stamp(path) for path in (self.drivers_path, self.routes_path)}
+        self.base_drivers = {self.key(d["id"]): d for d in drivers}
+        self.base_routes = {self.key(r["name"]): r for r in routes}
+        self._rebuild()
+
+    def refresh(self) -> bool:
+        changed = self.reload_files()
+        if self.api_url:
+            changed = self.pull_delta() or changed
+        return changed
+
+    def reload_files(self) -> bool:
+        """Relê os ficheiros cujo mtime mudou. Um ficheiro inválido (ex: a meio de ser escrito) fica para a próxima."""
+        changed = False
+        for path in (self.drivers_path, self.routes_path):
+            stamp = self._stamp(path)
+            if stamp is None or stamp == self.file_stamps.get(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if path == self.drivers_path:
+                    base = {self.key(d["id"]): d for d in data}
+                else:
+                    base = {self.key(r["name"]): r for r in data}
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"[AVISO] Ficheiro '{path}' inválido, mantida a versão anterior: {e}")
+                continue
+            if path == self.drivers_path:
+                self.base_drivers = base
+            else:
+                self.base_routes = base
+            self.file_stamps[path] = stamp
+            print(f"[INFO] Ficheiro '{path}' recarregado ({len(base)} registos).")
+            changed = True
+        if changed:
+            self._rebuild()
+        return changed
+
+    def pull_delta(self) -> bool:
+        """Aplica as mudanças da API desde a última versão. Sem rede ou sem mudanças, nada muda."""
+        request = urllib.request.Request(f"{self.api_url}/device/registry?since={self.version}")
+        if self.etag and self.version:
+            request.add_header("If-None-Match", self.etag)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                delta = json.load(response)
+                etag = response.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                print(f"[AVISO] Falha ao atualizar o cadastro pela API: {e}")
+            return False
+        except (OSError, ValueError) as e:
+            print(f"[AVISO] Falha ao atualizar o cadastro pela API: {e}")
+            return False
+
+        if delta["full"]:
+            # Cadastro inteiro: substitui o que veio da API antes (os ficheiros locais continuam como base)
+            self.remote_drivers, self.remote_routes = {}, {}
+        for driver in delta["drivers"]:
+            record = {"id": driver["badge_id"], "name": driver["name"]}
+            self.remote_drivers[self.key(driver["badge_id"])] = record if driver["active"] else None
+        for route in delta["routes"]:
+            record = {"name": route["name"], "capacity": route["capacity"]}
+            self.remote_routes[self.key(route["name"])] = record if route["active"] else None
+        self.version, self.etag = delta["version"], etag
+        self._save_cache()
+        self._rebuild()
+        print(f"[INFO] Cadastro atualizado pela API (versão {self.version}): "
+              f"{len(delta['drivers'])} motorista(s), {len(delta['routes'])} rota(s).")
+        return True
+
+    def _rebuild(self):
+        drivers = dict(self.base_drivers)
+        routes = dict(self.base_routes)
+        for index, remote in ((drivers, self.remote_drivers), (routes, self.remote_routes)):
+            for key, record in remote.items():
+                if record is None:
+                    index.pop(key, None)
+                else:
+                    index[key] = record
+        self.index = RegistryIndex(drivers, routes)
+
+    @staticmethod
+    def _stamp(path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            self.version = cache["version"]
+            self.remote_drivers = cache["drivers"]
+            self.remote_routes = cache["routes"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[AVISO] Cache do cadastro '{self.cache_path}' ignorado: {e}")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        # Escreve ao lado e troca: um corte de energia nunca deixa o cache a meio
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "drivers": self.remote_drivers, "routes": self.remote_routes}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.cache_path)
@@ -10,10 +10,3 @@ def load_routes(path):
     except FileNotFoundError:
         print(f"[ERRO CRÍTICO] O ficheiro de rotas '{path}' não foi encontrado!")
         sys.exit(1)
-
-def get_route_by_name(route_name, routes):
-    """Procura uma rota pelo nome e retorna os seus dados."""
-    for route in routes:
-        if route["name"].lower() == route_name.lower():
-            return route
-    return None
\ No newline at end of file
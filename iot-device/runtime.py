@@ -0,0 +1,142 @@
+import asyncio
+import sys
+import threading
+import time
+from driver_logic import BusState, process_card, select_route
+from config import HEARTBEAT_INTERVAL, JOURNAL_COMPACT_INTERVAL, REGISTRY_REFRESH_INTERVAL
+
+
+class Outbox:
+    """
+    Fila entre a lógica dos cartões e o EventPublisher, com a mesma interface
+    publish_event. A lógica nunca espera pelo disco nem pela rede.
+    """
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def publish_event(self, topic: str, action: str, **fields):
+        self.queue.put_nowait((topic, action, fields))
+
+    def drain(self) -> list:
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+
+def start_input_reader(loop: asyncio.AbstractEventLoop, lines: asyncio.Queue, stream=sys.stdin):
+    """
+    Lê o leitor de cartões (aqui, o teclado/stdin) numa thread daemon e entrega
+    cada linha ao event loop com o instante da leitura (ms, relógio monotónico),
+    para o filtro de repetições não depender do atraso da fila. None marca o
+    fim da entrada.
+    """
+    def read():
+        for line in stream:
+            loop.call_soon_threadsafe(lines.put_nowait, (line.strip(), time.monotonic_ns() // 1_000_000))
+        loop.call_soon_threadsafe(lines.put_nowait, None)
+
+    threading.Thread(target=read, name="card-reader", daemon=True).start()
+
+
+async def handle_input(lines: asyncio.Queue, cards: asyncio.Queue, route_choices: asyncio.Queue, registry):
+    """Separa o que chega do leitor: nome de linha vai para a escolha de rota, o resto é cartão."""
+    while True:
+        read = await lines.get()
+        if read is None:
+            await cards.put(None)
+            await route_choices.put(None)
+            return
+        line, read_ms = read
+        if not line:
+            continue
+        if registry.get_route(line):
+            await route_choices.put(line)
+        else:
+            await cards.put((line, read_ms))
+
+
+async def handle_cards(cards: asyncio.Queue, registry, state: BusState, outbox: Outbox):
+    while True:
+        read = await cards.get()
+        if read is None:
+            return
+        card_id, read_ms = read
+        process_card(card_id, registry, state, outbox, read_ms)
+
+
+async def handle_route_choices(route_choices: asyncio.Queue, state: BusState, outbox: Outbox, registry):
+    while True:
+        chosen_line = await route_choices.get()
+        if chosen_line is None:
+            return
+        select_route(chosen_line, state, outbox, registry)
+
+
+async def publish_outbox(outbox: Outbox, publisher):
+    """
+    Grava no diário tudo o que se juntou desde a última volta, numa transação
+    só. None na fila encerra a tarefa depois de gravar o que veio antes dele.
+    """
+    while True:
+        events = [await outbox.queue.get()] + outbox.drain()
+        done = None in events
+        events = [event for event in events if event is not None]
+        if events:
+            await asyncio.to_thread(publisher.publish_events, events)
+        if done:
+            return
+
+
+async def heartbeat(state: BusState, publisher):
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        publisher.publish_transient(
+            f"bus/{state.bus_prefix}/heartbeat", "heartbeat",
+            bus_prefix=state.bus_prefix, line=state.current_line, queue_count=state.queue.count(),
+        )
+
+
+async def compact_journal(publisher):
+    while True:
+        await asyncio.sleep(JOURNAL_COMPACT_INTERVAL)
+        await asyncio.to_thread(publisher.journal.compact)
+
+
+async def refresh_registry(registry):
+    # Ficheiros e API lidos fora do loop; o índice novo entra inteiro, de uma vez
+    while True:
+        await asyncio.sleep(REGISTRY_REFRESH_INTERVAL)
+        await asyncio.to_thread(registry.refresh)
+
+
+async def run(registry, publisher, bus_prefix: str, stream=sys.stdin):
+    """
+    Runtime do dispositivo: leitor de cartões, escolha de rota, publicação e
+    tarefas periódicas em corrotinas separadas, ligadas por filas. Termina no
+    fim da entrada, depois de gravar no diário todos os eventos gerados.
+    """
+    state = BusState(bus_prefix)
+    outbox = Outbox()
+    lines, cards, route_choices = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+    start_input_reader(asyncio.get_running_loop(), lines, stream)
+
+    publishing = asyncio.create_task(publish_outbox(outbox, publisher), name="publish-outbox")
+    periodic = [
+        asyncio.create_task(heartbeat(state, publisher), name="heartbeat"),
+        asyncio.create_task(compact_journal(publisher), name="compact-journal"),
+        asyncio.create_task(refresh_registry(registry), name="refresh-registry"),
+    ]
+    try:
+        await asyncio.gather(
+            handle_input(lines, cards, route_choices, registry),
+            handle_cards(cards, registry, state, outbox),
+            handle_route_choices(route_choices, state, outbox, registry),
+        )
+    finally:
+        for task in periodic:
+            task.cancel()
+        # Eventos ainda na fila (ex: Ctrl+C a meio de uma rajada) não se perdem
+        outbox.queue.put_nowait(None)
+        await publishing
+    return state
@@ -1,5 +1,5 @@
 import paho.mqtt.client as mqtt
-import time
+import wire
 
 
 # Apontando para o  broker de teste público
@@ -7,12 +7,26 @@ MQTT_BROKER = "test.mosquitto.org"
 MQTT_PORT = 1883
 MQTT_TOPIC = "bus/#"
 
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, reason_code, properties):
     """Função chamada quando a conexão é estabelecida."""
-    if rc == 0:
+    if not reason_code.is_failure:
         print("Ouvinte conectado ao Broker MQTT público com sucesso!")
         client.subscribe(MQTT_TOPIC)
         print(f"A escutar no tópico: '{MQTT_TOPIC}'")
     else:
 
-        print(f"Falha na conexão, código de retorno: {rc}")
\ No newline at end of file
+        print(f"Falha na conexão, código de retorno: {reason_code}")
+
+def on_message(client, userdata, message):
+    try:
+        print(f"{message.topic}: {wire.decode(message.payload)}")
+    except ValueError:
+        print(f"{message.topic}: {message.payload!r}")
+
+if __name__ == "__main__":
+    # Para medir latência e perdas com muitos ônibus: benchmarks/fleet_load.py
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_forever()
@@ -0,0 +1,89 @@
+"""
+Formato das mensagens MQTT dos dispositivos (bus/{prefixo}/queue, /driver_event e /heartbeat).
+
+Cópia idêntica em iot-device/wire.py e fretotvs-api/utils/wire.py: alterações
+valem para os dois lados e entram nos dois arquivos (benchmarks/check_ingest.py
+falha se as cópias divergirem).
+
+Versão 1 — um mapa com chaves de uma letra:
+
+    v  versão do formato (1)          a  ação (código numérico, ACTIONS)
+    t  instante em ms desde a época   b  prefixo do ônibus (opcional; também está no tópico)
+    d  id do motorista                l  linha
+    c  lotação da rota                p  id do passageiro
+    q  passageiros a bordo            s  sequência do evento no diário do dispositivo
+
+Codificado em MessagePack quando a biblioteca está instalada, senão em JSON
+compacto. O decodificador aceita os dois (um mapa MessagePack nunca começa com
+"{") e devolve os nomes longos: action, timestamp_ms, bus_prefix, driver_id,
+line, capacity, passenger_id, queue_count, seq.
+"""
+
+import json
+import time
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+VERSION = 1
+
+ACTIONS = {
+    "start_route": 1,
+    "end_route": 2,
+    "passenger_entry": 3,
+    "passenger_exit": 4,
+    "heartbeat": 5,
+}
+ACTION_NAMES = {code: name for name, code in ACTIONS.items()}
+
+FIELDS = {
+    "bus_prefix": "b",
+    "driver_id": "d",
+    "line": "l",
+    "capacity": "c",
+    "passenger_id": "p",
+    "queue_count": "q",
+    "seq": "s",
+}
+FIELD_NAMES = {short: name for name, short in FIELDS.items()}
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def encode(action: str, timestamp_ms: int | None = None, binary: bool = True, **fields) -> bytes:
+    """encode("passenger_entry", line="ROTA-2", passenger_id="123", queue_count=4)"""
+    message = {"v": VERSION, "a": ACTIONS[action], "t": now_ms() if timestamp_ms is None else timestamp_ms}
+    for name, value in fields.items():
+        if value is not None:
+            message[FIELDS[name]] = value
+    if binary and msgpack is not None:
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message, separators=(",", ":")).encode()
+
+
+def decode(payload: bytes) -> dict:
+    """Mensagem v1 (MessagePack ou JSON) -> dict com nomes longos. ValueError se inválida."""
+    if payload[:1] == b"{":
+        message = json.loads(payload)
+    elif msgpack is not None:
+        try:
+            message = msgpack.unpackb(payload, raw=False)
+        except Exception as e:
+            raise ValueError(f"invalid MessagePack payload: {e}")
+    else:
+        raise ValueError("binary payload but msgpack is not installed")
+    if not isinstance(message, dict) or "a" not in message:
+        raise ValueError("not a wire message")
+    if message.get("v") != VERSION:
+        raise ValueError(f"unsupported wire version {message.get('v')!r}")
+    if message["a"] not in ACTION_NAMES:
+        raise ValueError(f"unknown action code {message['a']!r}")
+    data = {"version": message["v"], "action": ACTION_NAMES[message["a"]], "timestamp_ms": message.get("t")}
+    for short, name in FIELD_NAMES.items():
+        if short in message:
+            data[name] = message[short]
+    return data
@@ -161,7 +161,7 @@ export default function TurnstileSimulator() {
       // Atualiza ocupação do ônibus
       try {
         const occupancyUpdate = {
-          occupied: 1 // Valor não importa, backend sempre incrementa +1
+          delta: 1 // Embarque: backend soma +1 de forma atômica, respeitando a capacidade
         }
         const res = await fetch(`${API_BASE_URL}/bus/${busData.prefixo}/occupancy`, {
           method: 'PATCH',